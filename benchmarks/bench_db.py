@@ -0,0 +1,189 @@
+"""Benchmarks for the database.py hot paths at 10k / 100k / 1M payments.
+
+Each size gets a seeded synthetic database (benchmarks/datagen.py, cached under
+benchmarks/.data/) and runs in its own interpreter, so module-level state and
+connection caches from one size can't leak into the next. Queries run against
+the biggest guild (Zipf head), which is where latency hurts first.
+
+    python benchmarks/bench_db.py                          # all sizes, save results
+    python benchmarks/bench_db.py --sizes 10k,100k         # skip 1M
+    python benchmarks/bench_db.py --compare benchmarks/results/abc1234.json
+    python benchmarks/bench_db.py --compare old.json new.json   # compare two saved runs
+
+Results are saved as benchmarks/results/<commit>.json. --compare prints the
+per-call ratio (new / old) for every benchmark and size.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+DATA_DIR = os.path.join(HERE, ".data")
+RESULTS_DIR = os.path.join(HERE, "results")
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def _benchmarks(db, hot_guild):
+    plan_id = db.list_role_plans(hot_guild, only_active=False)[0][0]
+    counter = iter(range(10**9))
+
+    def grant():
+        # Mix of renewals (existing members) and brand-new members
+        n = next(counter)
+        db.grant_membership(hot_guild, str(100_000 + n % 5000), plan_id, 30, f"BENCH_{n}")
+
+    return {
+        "list_expired": lambda: db.list_expired(hot_guild),
+        "grant_membership": grant,
+        "get_growth_stats": lambda: db.get_growth_stats(hot_guild),
+        "get_top_members": lambda: db.get_top_members(hot_guild),
+        "get_plans_breakdown": lambda: db.get_plans_breakdown(hot_guild),
+        "available_to_collect": lambda: db.available_to_collect(hot_guild),
+        "get_platform_analytics": db.get_platform_analytics,
+    }
+
+
+def run_worker(db_path, hot_guild, repeat, only):
+    """Runs inside the per-size subprocess; prints one JSON line with the results"""
+    os.environ["DB_NAME"] = db_path
+    os.environ["DATABASE_URL"] = ""
+    sys.path.insert(0, ROOT)
+    import database as db
+
+    results = {}
+    for name, fn in _benchmarks(db, hot_guild).items():
+        if only and name not in only:
+            continue
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        per_call = [t / number * 1000 for t in timer.repeat(repeat=repeat, number=number)]
+        results[name] = {"min_ms": min(per_call), "median_ms": statistics.median(per_call), "number": number}
+    print(json.dumps(results))
+
+
+def _dataset(size_label, seed, regen):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # Data is anchored to "today", so cache per day
+    path = os.path.join(DATA_DIR, f"bench_{size_label}_s{seed}_{datetime.utcnow():%Y%m%d}.db")
+    meta_path = path + ".json"
+    if regen or not (os.path.exists(path) and os.path.exists(meta_path)):
+        out = subprocess.run([sys.executable, "-c",
+                              "import json, sys; sys.path.insert(0, %r); import datagen; "
+                              "print(json.dumps(datagen.generate(%r, %d, %d, quiet=True)))"
+                              % (HERE, path, SIZES[size_label], seed)],
+                             capture_output=True, text=True, check=True)
+        with open(meta_path, "w") as f:
+            f.write(out.stdout.strip().splitlines()[-1])
+    with open(meta_path) as f:
+        return path, json.load(f)
+
+
+def _commit():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_all(args):
+    run = {
+        "commit": _commit(),
+        "date": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "seed": args.seed,
+        "results": {},
+    }
+    for label in args.sizes.split(","):
+        label = label.strip().lower()
+        if label not in SIZES:
+            raise SystemExit(f"Unknown size {label!r} (choose from {', '.join(SIZES)})")
+        print(f"🧪 {label}: preparing data...", flush=True)
+        # A copy per run: grant_membership writes, and the cached dataset must stay pristine
+        src, meta = _dataset(label, args.seed, args.regen)
+        work = src.replace(".db", ".run.db")
+        with sqlite3.connect(src) as s, sqlite3.connect(work) as d:
+            s.backup(d)
+
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", work, meta["hot_guild"],
+               "--repeat", str(args.repeat)]
+        if args.only:
+            cmd += ["--only", args.only]
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise SystemExit(f"❌ {label} benchmark failed:\n{out.stderr}")
+        results = json.loads(out.stdout.strip().splitlines()[-1])
+        run["results"][label] = results
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work + suffix):
+                os.remove(work + suffix)
+
+        for name, r in results.items():
+            print(f"   {name:<24} median {r['median_ms']:9.3f} ms   min {r['min_ms']:9.3f} ms")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{run['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"\n💾 Saved {path}")
+    return run
+
+
+def compare(old, new):
+    print(f"\n📊 {old['commit']} → {new['commit']} (median per call)")
+    print(f"   {'benchmark':<24} {'size':>5} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for size, benches in new["results"].items():
+        for name, r in benches.items():
+            before = old["results"].get(size, {}).get(name)
+            if not before:
+                print(f"   {name:<24} {size:>5} {'-':>10} {r['median_ms']:10.3f}")
+                continue
+            ratio = r["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            # >10% either way is worth a look; smaller moves are mostly noise
+            flag = "🔺" if ratio > 1.10 else ("🟢" if ratio < 0.90 else "")
+            print(f"   {name:<24} {size:>5} {before['median_ms']:10.3f} {r['median_ms']:10.3f} {ratio:6.2f}x {flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,100k,1m")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="comma-separated benchmark names")
+    parser.add_argument("--regen", action="store_true", help="rebuild cached datasets")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS_JSON",
+                        help="OLD [NEW]: compare a saved run with this run (or with NEW)")
+    parser.add_argument("--worker", nargs=2, metavar=("DB", "GUILD"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    only = {n.strip() for n in args.only.split(",") if n.strip()}
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.repeat, only)
+        return
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            compare(json.load(f_old), json.load(f_new))
+        return
+
+    new = run_all(args)
+    if args.compare:
+        with open(args.compare[0]) as f:
+            compare(json.load(f), new)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Uniqueness and throughput check for utils.ids snowflake IDs.
+
+Generates --count IDs from many threads sharing one generator (the in-process case:
+concurrent purchases), then --count IDs from several processes with different
+ID_NODE values (the multi-process deployment case), and fails on any duplicate
+or on an ID that isn't larger than the previous one from the same thread.
+
+    python benchmarks/bench_ids.py                          # 1M IDs, 8 threads, 4 processes
+    python benchmarks/bench_ids.py --count 5000000 --threads 16
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.ids import SnowflakeGenerator, parse_id  # noqa: E402
+
+
+def _generate(gen, count, out, errors):
+    ids = [0] * count
+    last = -1
+    for i in range(count):
+        value = gen.next_id()
+        if value <= last:
+            errors.append((last, value))
+        ids[i] = last = value
+    out.extend(ids)
+
+
+def run_threads(count, threads):
+    gen = SnowflakeGenerator(node=1)
+    per_thread = count // threads
+    results, errors = [], []
+    workers = [threading.Thread(target=_generate, args=(gen, per_thread, results, errors)) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return results, errors, time.perf_counter() - started
+
+
+def _process_worker(node, count, queue):
+    results, errors = [], []
+    _generate(SnowflakeGenerator(node=node), count, results, errors)
+    queue.put((results, errors))
+
+
+def run_processes(count, processes):
+    queue = multiprocessing.Queue()
+    per_process = count // processes
+    workers = [multiprocessing.Process(target=_process_worker, args=(node, per_process, queue))
+               for node in range(processes)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    results, errors = [], []
+    for _ in workers:
+        ids, errs = queue.get()
+        results.extend(ids)
+        errors.extend(errs)
+    for w in workers:
+        w.join()
+    return results, errors, time.perf_counter() - started
+
+
+def report(name, ids, errors, elapsed):
+    duplicates = len(ids) - len(set(ids))
+    ok = duplicates == 0 and not errors
+    print(f"{'✅' if ok else '❌'} {name}: {len(ids):,} IDs in {elapsed:.2f}s "
+          f"({len(ids) / elapsed:,.0f}/s) | duplicates {duplicates} | out of order {len(errors)}")
+    if ids:
+        first_ms, _, _ = parse_id(min(ids))
+        last_ms, _, _ = parse_id(max(ids))
+        print(f"   spans {last_ms - first_ms} ms of ID time")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    ok = report(f"{args.threads} threads, one node", *run_threads(args.count, args.threads))
+    ok &= report(f"{args.processes} processes, one node each", *run_processes(args.count, args.processes))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
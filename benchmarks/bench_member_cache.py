@@ -0,0 +1,115 @@
+"""Member cache memory: default (every member chunked and cached) vs SLIM_MEMBER_CACHE.
+
+Builds discord.py Guild/Member objects from gateway-shaped payloads, without
+connecting. Default mode caches --members members per guild; slim mode caches
+none and keeps only the utils.members LRU (--lru members, e.g. the ones expiry
+and role operations touched) plus a few admins per guild.
+
+Building 100 x 50k members needs several GB, so by default --sample-guilds guilds
+are built for real and the total is extrapolated (--sample-guilds 100 to build all).
+
+    python benchmarks/bench_member_cache.py                       # 100 guilds x 50k
+    python benchmarks/bench_member_cache.py --guilds 10 --members 20000 --sample-guilds 10
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import discord  # noqa: E402
+from discord.state import ConnectionState  # noqa: E402
+
+from utils.members import MemberResolver  # noqa: E402
+
+ADMINS_PER_GUILD = 5
+
+
+def _state(flags):
+    intents = discord.Intents.default()
+    intents.members = True
+    return ConnectionState(dispatch=lambda *args, **kwargs: None, handlers={}, hooks={}, http=None,
+                           intents=intents, member_cache_flags=flags)
+
+
+def _guild(state, guild_id):
+    everyone = {"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                "hoist": False, "managed": False, "mentionable": False}
+    roles = [everyone] + [dict(everyone, id=str(guild_id * 100 + i), name=f"Plan {i}", position=i)
+                          for i in range(1, 6)]
+    return discord.Guild(data={"id": str(guild_id), "name": f"Guild {guild_id}", "roles": roles,
+                               "owner_id": str(guild_id * 10**7), "emojis": [], "stickers": [], "features": []},
+                         state=state)
+
+
+def _member(state, guild, user_id):
+    role = str(guild.id * 100 + 1 + user_id % 5)
+    return discord.Member(data={"user": {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0",
+                                         "avatar": "a" * 32, "global_name": f"User {user_id}"},
+                                "roles": [role] if user_id % 3 == 0 else [],
+                                "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False,
+                                "flags": 0, "nick": None},
+                          guild=guild, state=state)
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    kept = build()
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return used, time.perf_counter() - started, kept
+
+
+def full_cache(guilds, members):
+    state = _state(discord.MemberCacheFlags.all())
+    built = []
+    for g in range(1, guilds + 1):
+        guild = _guild(state, g)
+        for i in range(members):
+            guild._add_member(_member(state, guild, g * 10**7 + i))
+        built.append(guild)
+    return state, built
+
+
+def slim_cache(guilds, lru_size):
+    state = _state(discord.MemberCacheFlags.none())
+    resolver = MemberResolver(maxsize=lru_size)
+    built = [_guild(state, g) for g in range(1, guilds + 1)]
+    per_guild = max(lru_size // guilds, ADMINS_PER_GUILD)
+    for guild in built:
+        for i in range(per_guild):
+            resolver.put(_member(state, guild, guild.id * 10**7 + i))
+    return state, built, resolver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--members", type=int, default=50_000)
+    parser.add_argument("--sample-guilds", type=int, default=2)
+    parser.add_argument("--lru", type=int, default=10_000, help="slim mode LRU size (MEMBER_LRU_SIZE)")
+    args = parser.parse_args()
+    sample = min(args.sample_guilds, args.guilds)
+
+    used, elapsed, _ = _measure(lambda: full_cache(sample, args.members))
+    per_member = used / (sample * args.members)
+    total = per_member * args.guilds * args.members
+    note = "" if sample == args.guilds else f" (measured {sample} guilds, extrapolated)"
+    print(f"🐘 full cache: {args.guilds} guilds x {args.members:,} members = {total / 2**20:,.0f} MiB{note} | "
+          f"{per_member:,.0f} B/member | built in {elapsed:.1f}s")
+
+    used_slim, elapsed, (_, _, resolver) = _measure(lambda: slim_cache(args.guilds, args.lru))
+    print(f"🪶 slim cache: {args.guilds} guilds, {len(resolver):,} members in the LRU = "
+          f"{used_slim / 2**20:,.1f} MiB | built in {elapsed:.1f}s")
+    print(f"   {total / max(used_slim, 1):,.0f}x less member memory")
+
+
+if __name__ == "__main__":
+    main()
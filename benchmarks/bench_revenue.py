@@ -0,0 +1,56 @@
+"""Timing for the utils.revenue engine.
+
+Times the vectorized pass alone on a synthetic (guilds x 90 days) revenue matrix,
+and, with --db, the full weekly-report load (queries + pass) on a datagen database.
+
+    python benchmarks/bench_revenue.py --guilds 10000
+    python benchmarks/bench_revenue.py --db /tmp/bench_1m.db
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", help="datagen database to run revenue_forecasts against")
+    args = parser.parse_args()
+    if args.db:
+        os.environ["DB_NAME"] = args.db
+
+    import numpy as np
+    from utils.revenue import compute, revenue_forecasts  # noqa: E402 - after DB_NAME is set
+
+    rng = np.random.default_rng(42)
+    matrix = rng.gamma(2.0, 5000.0, size=(args.guilds, args.days)) * (rng.random((args.guilds, args.days)) < 0.6)
+    mrr = rng.gamma(2.0, 50000.0, size=args.guilds)
+    best = min(_timed(compute, matrix, mrr) for _ in range(args.repeat))
+    print(f"⚡ compute: {args.guilds:,} guilds x {args.days} days in {best * 1000:.1f} ms "
+          f"({best / args.guilds * 1e6:.2f} µs per guild)")
+
+    if args.db:
+        import database
+        conn = database._conn()
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT guild_id FROM role_plans")
+        guild_ids = [row[0] for row in c.fetchall()]
+        conn.close()
+        elapsed = _timed(revenue_forecasts, guild_ids)
+        print(f"🗄️ revenue_forecasts: {len(guild_ids):,} guilds from {args.db} in {elapsed * 1000:.0f} ms")
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    main()
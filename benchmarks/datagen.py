@@ -0,0 +1,189 @@
+"""Seeded synthetic data generator for database.py benchmarks.
+
+Builds a realistic database with the schema from database.init_db():
+  - N guilds (about one per 1,000 payments), 1-5 role plans each
+  - guild sizes and per-user payment counts are Zipf-distributed, so a few
+    big guilds and "whales" dominate, like real traffic
+  - payments spread over the last 120 days (mostly paid, some pending/refunded)
+  - memberships with a spread of expiries: long expired, expired but not yet
+    processed (what list_expired finds), expiring soon and far in the future
+  - subscriptions and done/pending payouts per guild
+
+    python benchmarks/datagen.py --payments 100000 --out /tmp/bench_100k.db
+    python benchmarks/datagen.py --payments 1000000 --seed 7 --out /tmp/bench_1m.db
+
+Same seed + size = same data relative to today, so results are comparable between commits.
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Anchored to today's midnight (the helpers compare against utcnow), so the same
+# seed gives the same data relative to "now" on any given day
+NOW = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+HISTORY_DAYS = 120
+PRICES = [5000, 10000, 15000, 20000, 30000, 50000]
+DURATIONS = [7, 30, 30, 30, 90, 365]
+PAYMENT_INSERT = """INSERT INTO payments (payment_id, guild_id, user_id, plan_id, amount_mnt, status,
+                                          short_url, created_at, paid_at, sender_invoice_no)
+                    VALUES (?,?,?,?,?,?,?,?,?,?)"""
+
+
+class Zipf:
+    """Draw ranks 0..n-1 with P(k) proportional to 1/(k+1)^s"""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.rng = rng
+        self.cum = list(itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+
+    def draw(self) -> int:
+        return bisect.bisect_left(self.cum, self.rng.random() * self.cum[-1])
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat()
+
+
+def generate(path: str, payments: int, seed: int = 42, guilds: int = None, quiet: bool = False):
+    """Create a fresh database at `path` with `payments` payment rows"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    # Schema comes from the real init_db, so it always matches the code under test
+    os.environ["DB_NAME"] = path
+    os.environ["DATABASE_URL"] = ""
+    sys.path.insert(0, ROOT)
+    import database
+    database.DB_NAME = path
+    database.init_db()
+
+    rng = random.Random(seed)
+    guilds = guilds or max(10, payments // 1000)
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = OFF")
+    c = conn.cursor()
+
+    # Guild sizes follow Zipf: guild 0 is the biggest
+    guild_ids = [str(900_000_000_000_000_000 + g) for g in range(guilds)]
+    guild_pick = Zipf(guilds, 1.1, rng)
+
+    plans = {}  # guild_id -> [(plan_id, price, duration)]
+    plan_rows = []
+    plan_id = 0
+    for g in guild_ids:
+        plans[g] = []
+        for _ in range(rng.randint(1, 5)):
+            plan_id += 1
+            i = rng.randrange(len(PRICES))
+            active = 1 if rng.random() < 0.9 else 0
+            plan_rows.append((plan_id, g, str(rng.getrandbits(60)), f"Role {plan_id}", PRICES[i], DURATIONS[i], active, ""))
+            plans[g].append((plan_id, PRICES[i], DURATIONS[i]))
+    c.executemany("""INSERT INTO role_plans (plan_id, guild_id, role_id, role_name, price_mnt, duration_days, active, description)
+                     VALUES (?,?,?,?,?,?,?,?)""", plan_rows)
+
+    # Users per guild scale with the guild's share of traffic; Zipf again inside the guild
+    # (roughly three payments per user on average)
+    total_weight = guild_pick.cum[-1]
+    users_per_guild = {
+        g: max(5, int(payments * (1 / (rank + 1) ** 1.1) / total_weight / 3))
+        for rank, g in enumerate(guild_ids)
+    }
+    user_pickers = {}
+
+    pay_rows = []
+    latest = {}  # (guild, user, plan) -> (paid_at, duration, payment_id)
+    for n in range(payments):
+        g = guild_ids[guild_pick.draw()]
+        picker = user_pickers.get(g)
+        if picker is None:
+            picker = user_pickers[g] = Zipf(users_per_guild[g], 1.05, rng)
+        user = str(100_000 + picker.draw())
+        pid, price, duration = rng.choice(plans[g])
+        created = NOW - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+        r = rng.random()
+        status = "paid" if r < 0.85 else ("pending" if r < 0.95 else "refunded")
+        paid_at = _iso(created + timedelta(minutes=rng.randint(1, 30))) if status == "paid" else None
+        payment_id = f"INV_{seed}_{n}"
+        pay_rows.append((payment_id, g, user, pid, price, status, f"https://qpay.example/{n}", _iso(created), paid_at,
+                         f"DISC_{seed}_{n}"))
+        if status == "paid":
+            key = (g, user, pid)
+            prev = latest.get(key)
+            if prev is None or paid_at > prev[0]:
+                latest[key] = (paid_at, duration, payment_id)
+        if len(pay_rows) >= 50_000:
+            c.executemany(PAYMENT_INSERT, pay_rows)
+            pay_rows.clear()
+    c.executemany(PAYMENT_INSERT, pay_rows)
+
+    c.executemany("INSERT INTO users (user_id, guild_id, username) VALUES (?,?,?) ON CONFLICT DO NOTHING",
+                  ((u, g, f"user{u}") for g, u, _ in latest))
+
+    # Memberships: access ends duration days after the last payment. Most rows whose
+    # access ended have been processed (active=0); a few are still waiting for the
+    # expiry loop, which is exactly what list_expired/claim_expired_memberships scan for.
+    mem_rows = []
+    for (g, u, pid), (paid_at, duration, payment_id) in latest.items():
+        ends = datetime.fromisoformat(paid_at) + timedelta(days=duration)
+        if ends > NOW:
+            active = 1
+        else:
+            active = 1 if rng.random() < 0.03 else 0
+        mem_rows.append((g, u, pid, active, _iso(ends), payment_id))
+    c.executemany("""INSERT INTO memberships (guild_id, user_id, plan_id, active, access_ends_at, last_payment_id)
+                     VALUES (?,?,?,?,?,?)""", mem_rows)
+
+    sub_rows, payout_rows = [], []
+    for g in guild_ids:
+        r = rng.random()
+        status = "active" if r < 0.7 else ("expired" if r < 0.9 else "pending")
+        expires = NOW + timedelta(days=rng.randint(-30, 60))
+        sub_rows.append((g, "Pro", 49000, f"SUB_{g}", _iso(expires), status))
+        for _ in range(rng.randint(0, 4)):
+            net = rng.randint(10_000, 500_000)
+            payout_rows.append((g, net + 200, 200, net, "000000", "Bench", "",
+                                _iso(NOW - timedelta(days=rng.randint(0, HISTORY_DAYS))),
+                                "done" if rng.random() < 0.8 else "pending"))
+    c.executemany("INSERT INTO subscriptions VALUES (?,?,?,?,?,?)", sub_rows)
+    c.executemany("""INSERT INTO payouts (guild_id, gross_mnt, fee_mnt, net_mnt, account_number, account_name, note, created_at, status)
+                     VALUES (?,?,?,?,?,?,?,?,?)""", payout_rows)
+
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+    if not quiet:
+        print(f"🧪 {path}: {payments:,} payments, {guilds:,} guilds, {plan_id:,} plans, "
+              f"{len(mem_rows):,} memberships in {time.perf_counter() - started:.1f}s")
+    return {
+        "payments": payments,
+        "guilds": guilds,
+        "hot_guild": guild_ids[0],
+        "median_guild": guild_ids[guilds // 2],
+        "now": _iso(NOW),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=10_000)
+    parser.add_argument("--guilds", type=int, default=None, help="default: payments / 1000 (min 10)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", required=True, help="database file to (re)create")
+    args = parser.parse_args()
+    generate(args.out, args.payments, args.seed, args.guilds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""End-to-end interaction load harness - no Discord connection needed.
+
+Drives the real cog code (/buy -> PayPlanButton -> PayNowButton -> CheckPaymentButton,
+then /myplan, plus /status from admins) with fake Interaction/Guild/Member objects,
+against the bundled QPay simulator (utils/qpay_simulator.py), and reports:
+  - purchases per second
+  - latency percentiles per step
+  - event-loop lag (how long the loop was blocked while handling interactions)
+
+    python benchmarks/load_harness.py                        # 50 users x 5 purchases
+    python benchmarks/load_harness.py --users 200 --purchases 3 --qpay-latency 150
+    python benchmarks/load_harness.py --qpay-error-rate 0.05 --qpay-throttle-rate 0.05 --qpay-script "PENDING*2,PAID"
+
+Runs against a throwaway database file, never the real database.db.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GUILD_ID = 424242424242424242
+ROLE_IDS = [515151515151515151, 515151515151515152, 515151515151515153]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+# ---------- FAKE DISCORD OBJECTS ----------
+class FakePermissions:
+    def __init__(self, administrator=False):
+        self.administrator = administrator
+
+
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+        self.name = f"role-{role_id}"
+
+
+class FakeMember:
+    def __init__(self, user_id, guild, admin=False):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.display_name = self.name
+        self.bot = False
+        self.guild = guild
+        self.guild_permissions = FakePermissions(admin)
+        self.roles = []
+        self.mention = f"<@{user_id}>"
+
+    async def add_roles(self, *roles, reason=None):
+        await asyncio.sleep(0.02)  # a REST round-trip
+        self.roles.extend(roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        await asyncio.sleep(0.02)
+        self.roles = [r for r in self.roles if r not in roles]
+
+    async def send(self, *args, **kwargs):
+        await asyncio.sleep(0.02)
+
+
+class FakeGuild:
+    def __init__(self, guild_id, name="Load Test Guild"):
+        self.id = guild_id
+        self.name = name
+        self._members = {}
+        self._roles = {rid: FakeRole(rid) for rid in ROLE_IDS}
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def add_member(self, member):
+        self._members[member.id] = member
+
+    def get_member(self, user_id):
+        return self._members.get(user_id)
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+
+class FakeClient:
+    def __init__(self, guilds):
+        self._guilds = {g.id: g for g in guilds}
+        self.guilds = list(guilds)
+
+    def get_guild(self, guild_id):
+        return self._guilds.get(guild_id)
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, ephemeral=False, thinking=False):
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+        self._interaction.sent.append((content, kwargs))
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        self._interaction.sent.append((content, kwargs))
+
+
+class FakeInteraction:
+    def __init__(self, client, guild, user):
+        self.client = client
+        self.guild = guild
+        self.user = user
+        self.channel = None
+        self.created_at = datetime.now(timezone.utc)
+        self.sent = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    def last_view(self):
+        for content, kwargs in reversed(self.sent):
+            if kwargs.get("view") is not None:
+                return kwargs["view"]
+        return None
+
+    def last_text(self):
+        content, kwargs = self.sent[-1] if self.sent else (None, {})
+        embed = kwargs.get("embed")
+        return content or (embed.title if embed else "")
+
+
+# ---------- HARNESS ----------
+class LoadHarness:
+    def __init__(self, users, purchases, admins, max_checks=5, check_interval=0.2, double_click=False):
+        import discord
+        from cogs.payment import PaymentsCog, PayPlanButton, PayNowButton, CheckPaymentButton
+        from cogs.membership import MembershipCog
+        from cogs.status import StatusCog
+
+        self.discord = discord
+        self.PayPlanButton, self.PayNowButton, self.CheckPaymentButton = PayPlanButton, PayNowButton, CheckPaymentButton
+        self.guild = FakeGuild(GUILD_ID)
+        self.client = FakeClient([self.guild])
+        self.users = [FakeMember(700_000_000_000_000_000 + i, self.guild) for i in range(users)]
+        self.admins = [FakeMember(800_000_000_000_000_000 + i, self.guild, admin=True) for i in range(admins)]
+        for m in self.users + self.admins:
+            self.guild.add_member(m)
+        self.purchases = purchases
+        self.max_checks = max_checks
+        self.check_interval = check_interval
+        self.double_click = double_click
+
+        # Cog instances without running __init__ (which would start the background loops)
+        self.payments = PaymentsCog.__new__(PaymentsCog)
+        self.membership = MembershipCog.__new__(MembershipCog)
+        self.status = StatusCog.__new__(StatusCog)
+        for cog in (self.payments, self.membership, self.status):
+            cog.bot = self.client
+        self.buy_cmd = PaymentsCog.buy_cmd.callback
+        self.myplan_cmd = MembershipCog.myplan_cmd.callback
+        self.status_cmd = StatusCog.status_cmd.callback
+
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.completed = 0
+
+    def interaction(self, user):
+        return FakeInteraction(self.client, self.guild, user)
+
+    def _find(self, view, cls):
+        if view is None:
+            return None
+        return next((item for item in view.children if isinstance(item, cls)), None)
+
+    async def step(self, name, coro_fn, user):
+        inter = self.interaction(user)
+        started = time.perf_counter()
+        try:
+            await coro_fn(inter)
+        except Exception as e:
+            self.failures[name] += 1
+            print(f"❌ {name}: {e!r}", file=sys.stderr)
+            return None
+        self.latencies[name].append(time.perf_counter() - started)
+        return inter
+
+    async def purchase(self, user):
+        inter = await self.step("/buy", lambda i: self.buy_cmd(self.payments, i), user)
+        plan_button = self._find(inter and inter.last_view(), self.PayPlanButton)
+        if not plan_button:
+            self.failures["/buy"] += inter is not None
+            return
+
+        if self.double_click:
+            # Impatient user: a second click on the same plan while the first is in flight
+            inter, _ = await asyncio.gather(self.step("PayPlanButton", plan_button.callback, user),
+                                            self.step("PayPlanButton", plan_button.callback, user))
+        else:
+            inter = await self.step("PayPlanButton", plan_button.callback, user)
+        pay_now = self._find(inter and inter.last_view(), self.PayNowButton)
+        if not pay_now:
+            self.failures["PayPlanButton"] += inter is not None
+            return
+
+        inter = await self.step("PayNowButton", pay_now.callback, user)
+        check = self._find(inter and inter.last_view(), self.CheckPaymentButton)
+        if not check:
+            self.failures["PayNowButton"] += inter is not None
+            return
+
+        # Users keep pressing "Check Payment" until QPay reports the invoice paid
+        for _ in range(self.max_checks):
+            inter = await self.step("CheckPaymentButton", check.callback, user)
+            if inter and "Payment Complete" in (inter.last_text() or ""):
+                self.completed += 1
+                break
+            await asyncio.sleep(self.check_interval)
+        else:
+            self.failures["CheckPaymentButton"] += 1
+
+        await self.step("/myplan", lambda i: self.myplan_cmd(self.membership, i), user)
+
+    async def user_session(self, user):
+        for _ in range(self.purchases):
+            await self.purchase(user)
+
+    async def admin_session(self, admin, stop):
+        while not stop.is_set():
+            await self.step("/status", lambda i: self.status_cmd(self.status, i), admin)
+            await asyncio.sleep(0.25)
+
+
+async def monitor_loop_lag(samples, stop, interval=0.01):
+    """Sleep `interval` repeatedly; anything beyond it is time the loop was blocked"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+def seed_database(db):
+    db.init_db()
+    gid = str(GUILD_ID)
+    expires = (datetime.utcnow() + timedelta(days=30)).isoformat()
+    db.create_subscription(gid, "Pro", 49000, "LOAD_SUB", expires)
+    db.mark_subscription_paid("LOAD_SUB")
+    for i, rid in enumerate(ROLE_IDS):
+        db.add_role_plan(gid, str(rid), f"Tier {i + 1}", 10000 * (i + 1), 30, "Load test plan")
+
+
+async def run(args):
+    sys.path.insert(0, ROOT)
+    from utils.qpay_simulator import SimulatorConfig, start_in_thread
+    simulator, os.environ["QPAY_BASE_URL"] = start_in_thread(SimulatorConfig(
+        latency_ms=args.qpay_latency,
+        jitter_ms=args.qpay_jitter,
+        error_rate=args.qpay_error_rate,
+        throttle_rate=args.qpay_throttle_rate,
+        rate_limit=args.qpay_rate_limit,
+        script=args.qpay_script,
+        seed=args.seed,
+    ))
+    os.environ.setdefault("QPAY_USERNAME", "load")
+    os.environ.setdefault("QPAY_PASSWORD", "load")
+    os.environ.setdefault("QPAY_INVOICE_CODE", "LOAD_INVOICE")
+
+    import database as db
+    seed_database(db)
+
+    harness = LoadHarness(args.users, args.purchases, args.admins, args.max_checks,
+                          double_click=args.double_click)
+    lag, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lag, stop))
+    admin_tasks = [asyncio.create_task(harness.admin_session(a, stop)) for a in harness.admins]
+
+    wall = time.perf_counter()
+    # The cogs and QPay client print per request; keep the report readable
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+        await asyncio.gather(*(harness.user_session(u) for u in harness.users))
+    wall = time.perf_counter() - wall
+
+    stop.set()
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+        await asyncio.gather(monitor, *admin_tasks)
+
+    print(f"\n📊 {args.users} users x {args.purchases} purchases | QPay latency {args.qpay_latency:.0f} ms "
+          f"(+{args.qpay_jitter:.0f} jitter), errors {args.qpay_error_rate:.0%}, 429s {args.qpay_throttle_rate:.0%}, "
+          f"script {args.qpay_script}")
+    print(f"   completed purchases: {harness.completed} in {wall:.2f}s "
+          f"→ {harness.completed / wall:.1f} purchases/s")
+    print(f"   {'step':<20} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'fail':>5}")
+    for name in ("/buy", "PayPlanButton", "PayNowButton", "CheckPaymentButton", "/myplan", "/status"):
+        ms = [x * 1000 for x in harness.latencies.get(name, [])]
+        if not ms:
+            continue
+        print(f"   {name:<20} {len(ms):>6} {statistics.median(ms):9.1f} {percentile(ms, 95):9.1f} "
+              f"{percentile(ms, 99):9.1f} {max(ms):9.1f} {harness.failures.get(name, 0):>5}")
+    if lag:
+        ms = [x * 1000 for x in lag]
+        print(f"   event-loop lag: p50 {statistics.median(ms):.1f} ms | p99 {percentile(ms, 99):.1f} ms | "
+              f"max {max(ms):.1f} ms | blocked {sum(ms) / 1000 / wall:.0%} of wall time")
+    injected = {k: v for k, v in simulator.stats.items() if not k.endswith((".requests", ".200"))}
+    if injected:
+        print("   QPay injected: " + ", ".join(f"{k} x{v}" for k, v in sorted(injected.items())))
+    from utils.metrics import QPAY_REJECTED, QPAY_INVOICES
+    invoices = {key[0]: int(v) for key, v in QPAY_INVOICES._values.items()}
+    if invoices:
+        print("   invoices: " + ", ".join(f"{k} x{v}" for k, v in sorted(invoices.items())))
+    rejected = {key[0]: int(v) for key, v in QPAY_REJECTED._values.items()}
+    if rejected:
+        print("   QPay fail-fast: " + ", ".join(f"{k} x{v}" for k, v in sorted(rejected.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--purchases", type=int, default=5, help="purchases per user")
+    parser.add_argument("--admins", type=int, default=2, help="admins polling /status during the run")
+    parser.add_argument("--qpay-latency", type=float, default=50, help="simulated QPay latency per call (ms)")
+    parser.add_argument("--qpay-jitter", type=float, default=0, help="extra random latency, 0..N ms")
+    parser.add_argument("--qpay-error-rate", type=float, default=0.0, help="share of QPay calls answered with 5xx")
+    parser.add_argument("--qpay-throttle-rate", type=float, default=0.0, help="share of QPay calls answered with 429")
+    parser.add_argument("--qpay-rate-limit", type=float, default=0.0, help="QPay requests/second cap, 0 = unlimited")
+    parser.add_argument("--qpay-script", default="PAID", help='payment states per check, e.g. "PENDING*2,PAID"')
+    parser.add_argument("--double-click", action="store_true", help="click each plan button twice at once")
+    parser.add_argument("--max-checks", type=int, default=5, help="Check Payment presses before giving up")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the simulator's fault injection")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own log output")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="load_harness_")
+    os.environ["DB_NAME"] = os.path.join(tmpdir, "load.db")
+    os.environ["DATABASE_URL"] = ""
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Concurrency benchmark for payment confirmations against SQLite.
+
+Fires N concurrent confirmations (mark_payment_paid + grant_membership, the writes a
+Check Payment click does) from a thread pool and reports write latency percentiles.
+
+    python benchmarks/write_concurrency.py                 # writer queue (default)
+    python benchmarks/write_concurrency.py --direct        # one connection per write (old path)
+    python benchmarks/write_concurrency.py --concurrency 200 --rounds 5
+
+Runs against a throwaway database file, never the real database.db.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--direct", action="store_true", help="bypass the writer queue (DB_WRITE_QUEUE=0)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_writes_")
+    os.environ["DB_NAME"] = os.path.join(tmpdir, "bench.db")
+    os.environ["DATABASE_URL"] = ""
+    os.environ["DB_WRITE_QUEUE"] = "0" if args.direct else "1"
+    sys.path.insert(0, ROOT)
+    import database as db
+
+    db.init_db()
+    plan_id = db.add_role_plan("bench_guild", "1", "Bench", 1000, 30)
+
+    latencies = []
+    errors = 0
+
+    def confirm(i):
+        invoice = f"INV_{i}"
+        started = time.perf_counter()
+        db.mark_payment_paid(invoice)
+        db.grant_membership("bench_guild", str(i), plan_id, 30, invoice)
+        return time.perf_counter() - started
+
+    for r in range(args.rounds):
+        ids = range(r * args.concurrency, (r + 1) * args.concurrency)
+        for i in ids:
+            db.create_payment(f"INV_{i}", "bench_guild", str(i), plan_id, 1000, "")
+
+        wall = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(confirm, i) for i in ids]
+            for f in futures:
+                try:
+                    latencies.append(f.result())
+                except Exception as e:
+                    errors += 1
+                    print(f"❌ {e}")
+        wall = time.perf_counter() - wall
+        print(f"round {r + 1}: {args.concurrency} confirmations in {wall * 1000:.1f} ms")
+
+    mode = "direct connections" if args.direct else "writer queue + group commit"
+    ms = [x * 1000 for x in latencies]
+    print(f"\n📊 {mode} | {args.concurrency} concurrent x {args.rounds} rounds")
+    if ms:
+        print(f"   p50 {statistics.median(ms):.1f} ms | p95 {percentile(ms, 95):.1f} ms | "
+              f"p99 {percentile(ms, 99):.1f} ms | max {max(ms):.1f} ms")
+    print(f"   errors: {errors}")
+
+
+if __name__ == "__main__":
+    main()
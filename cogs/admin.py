@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import asyncio
 import discord
 from discord import app_commands
 from discord.ext import commands
@@ -297,7 +298,7 @@ class SubscribeButton(discord.ui.Button):
         self.base_amount = base_amount
 
     async def callback(self, interaction: discord.Interaction):
-        from utils.qpay import create_qpay_invoice
+        from utils.qpay import create_qpay_invoice, QPayUnavailable, QPAY_BUSY_MESSAGE
         from database import create_subscription
 
         if not interaction.guild:
@@ -311,7 +312,12 @@ class SubscribeButton(discord.ui.Button):
         amount = int(self.base_amount)
 
         # Create QPay invoice
-        invoice_id, qr_text, payment_url = create_qpay_invoice(amount, f"{self.plan_name} Plan")
+        try:
+            invoice_id, qr_text, payment_url = await asyncio.to_thread(
+                create_qpay_invoice, amount, f"{self.plan_name} Plan")
+        except QPayUnavailable:
+            await interaction.followup.send(QPAY_BUSY_MESSAGE, ephemeral=True)
+            return
         if not invoice_id:
             await interaction.followup.send("❌ Failed to create QPay invoice.", ephemeral=True)
             return
@@ -362,13 +368,17 @@ class CheckPaymentButton(discord.ui.Button):
         self.expires_at = expires_at
 
     async def callback(self, interaction: discord.Interaction):
-        from utils.qpay import check_qpay_payment_status
+        from utils.qpay import check_qpay_payment_status, QPayUnavailable, QPAY_BUSY_MESSAGE
         from database import mark_subscription_paid
 
         await interaction.response.defer(ephemeral=True)
         
         print(f"🔍 Admin checking subscription payment for invoice: {self.invoice_id}")
-        status = check_qpay_payment_status(self.invoice_id)
+        try:
+            status = await asyncio.to_thread(check_qpay_payment_status, self.invoice_id)
+        except QPayUnavailable:
+            await interaction.followup.send(QPAY_BUSY_MESSAGE, ephemeral=True)
+            return
         print(f"📊 Subscription payment status: {status}")
         
         if status == "PAID":
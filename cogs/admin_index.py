@@ -0,0 +1,54 @@
+import discord
+from discord.ext import commands
+from utils.admin_index import admin_index, is_admin_role
+from utils.members import members
+
+
+class AdminIndexCog(commands.Cog):
+    """Keeps utils.admin_index current from gateway events"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.roles != after.roles:
+            admin_index.member_changed(after)
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        # Raw: dispatched whether or not the member was cached
+        admin_index.member_removed(payload.guild_id, payload.user.id)
+        members.forget(payload.guild_id, payload.user.id)
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        # Interactions carry the member's current roles, cached or not
+        if interaction.guild and isinstance(interaction.user, discord.Member):
+            admin_index.member_seen(interaction.user)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if is_admin_role(before) != is_admin_role(after):
+            admin_index.role_changed(after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        if is_admin_role(role):
+            admin_index.role_changed(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        admin_index.role_changed(role)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        admin_index.owner_changed(after)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        admin_index.forget(guild.id)
+
+
+async def setup(bot):
+    await bot.add_cog(AdminIndexCog(bot))
@@ -1,14 +1,15 @@
+import asyncio
 import discord
 from discord import app_commands
 from discord.ext import commands
 from datetime import datetime
 import os
-from openai import OpenAI
+from utils.lazy import get_openai_client
+from utils.metrics import observe_openai
 
 class AnalyticsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.openai = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
     
     async def get_comprehensive_ai_advice(self, guild_name: str, analytics_data: dict) -> str:
         """Generate comprehensive AI advice using ALL server data"""
@@ -26,7 +27,9 @@ Be brief and specific."""
 
         try:
             # Using GPT-4o for faster, more cost-effective advice
-            response = self.openai.chat.completions.create(
+            response = observe_openai(
+                "growth_advice",
+                get_openai_client().chat.completions.create,
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": "Business advisor. Give 2-3 bullet points, 1 sentence each. Be brief."},
@@ -62,6 +65,8 @@ Be brief and specific."""
             total_guild_revenue, available_to_collect, get_subscription, list_role_plans
         )
         from utils.charts import generate_revenue_growth_chart, generate_role_breakdown_chart
+        from utils.revenue import revenue_forecasts, format_forecast
+        from utils.cohorts import cohort_report, format_retention
         
         if not interaction.guild:
             await interaction.response.send_message("❌ This must be used in a server.", ephemeral=True)
@@ -81,6 +86,9 @@ Be brief and specific."""
         growth_stats = get_growth_stats(guild_id)
         daily_revenue = get_revenue_by_day(guild_id, days=30)
         role_breakdown = get_role_revenue_breakdown(guild_id)
+        forecast = (await asyncio.to_thread(revenue_forecasts, [guild_id]))[guild_id]
+        cohorts = await asyncio.to_thread(cohort_report, guild_id)
+        plan_names = {p[0]: p[2] for p in list_role_plans(guild_id, only_active=False, include_deleted=True)}
         
         total_revenue = total_guild_revenue(guild_id)
         available = available_to_collect(guild_id)
@@ -135,6 +143,18 @@ Be brief and specific."""
             inline=False
         )
         
+        embed.add_field(
+            name="📊 MRR & Forecast",
+            value=format_forecast(forecast),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="🔁 Retention by First-Purchase Month",
+            value=format_retention(cohorts, plan_names),
+            inline=False
+        )
+        
         if role_breakdown:
             top_role = role_breakdown[0]
             role_revenue_text = "\n".join([
@@ -0,0 +1,45 @@
+import asyncio
+from discord.ext import commands, tasks
+from database import archive_old_records, acquire_lease, ARCHIVE_AFTER_DAYS
+from utils.cluster import CLUSTER_MODE, NODE_ID
+
+# The archive covers the whole database, not just one shard range, so it takes a
+# cluster-wide lease rather than the per-shard-range leader lease (lease_name).
+# Held for most of the 24h loop and never released early: whichever process gets
+# it runs the day's archive. _archive_month's advisory lock covers any overlap.
+ARCHIVE_LEASE = "job:archive"
+ARCHIVE_LEASE_TTL_SECONDS = 23 * 3600
+
+
+class ArchiveCog(commands.Cog):
+    """Moves old closed payments and ended memberships into monthly archive tables"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.archive_loop.start()
+
+    async def cog_unload(self):
+        self.archive_loop.cancel()
+
+    @tasks.loop(hours=24)
+    async def archive_loop(self):
+        if CLUSTER_MODE:
+            token = await asyncio.to_thread(acquire_lease, ARCHIVE_LEASE, NODE_ID, ARCHIVE_LEASE_TTL_SECONDS)
+            if token is None:
+                return
+        try:
+            moved = await asyncio.to_thread(archive_old_records, ARCHIVE_AFTER_DAYS)
+        except Exception as e:
+            print(f"❌ Archive job failed: {e}")
+            return
+        if moved:
+            print(f"🗃️ Archived {sum(moved.values()):,} rows older than {ARCHIVE_AFTER_DAYS} days: "
+                  + ", ".join(f"{table} +{n:,}" for table, n in moved.items()))
+
+    @archive_loop.before_loop
+    async def before_archive(self):
+        await self.bot.wait_until_ready()
+
+
+async def setup(bot):
+    await bot.add_cog(ArchiveCog(bot))
@@ -0,0 +1,282 @@
+import asyncio
+import csv
+import os
+import time
+from datetime import datetime, timezone
+import aiohttp
+import discord
+from discord import app_commands
+from discord.ext import commands
+from database import bulk_upsert_memberships, list_role_plans, has_active_subscription
+from cogs.admin import admin_or_manager_check
+from utils.members import members
+
+# Hard cap per file; bigger migrations can be split into several files
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "50000"))
+# Rows per DB transaction
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+# Role grants per second across all imports (add_roles is one API call per member)
+ROLE_GRANTS_PER_SECOND = float(os.getenv("ROLE_GRANTS_PER_SECOND", "5"))
+# Edit the progress message at most this often
+PROGRESS_EVERY_SECONDS = 2.0
+MAX_REPORTED_ERRORS = 10
+
+CSV_HELP = ("CSV with a header row: `user_id,plan_id,days` (adds days like a purchase) "
+            "and/or `expires_at` (ISO date, sets the exact end). One row per line.")
+
+
+class RateLimiter:
+    """Async token bucket shared by every import's role-grant worker"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ImportJob:
+    """Counters for one import, rendered into the progress message"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.read = 0
+        self.valid = 0
+        self.invalid = 0
+        self.applied = 0
+        self.roles_queued = 0
+        self.roles_granted = 0
+        self.roles_missing = 0
+        self.roles_failed = 0
+        self.errors = []
+        self.stage = "Reading"
+        self.started = time.monotonic()
+
+    def error(self, line: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Line {line}: {message}")
+
+    def embed(self) -> discord.Embed:
+        elapsed = time.monotonic() - self.started
+        icon, color = {"Done": ("✅", 0x00ff88), "Failed": ("❌", 0xff0000)}.get(self.stage, ("⏳", 0x3498db))
+        embed = discord.Embed(
+            title=f"{icon} Member import — {self.stage}",
+            description=f"📄 `{self.filename}` • {elapsed:.0f}s",
+            color=color
+        )
+        embed.add_field(name="Rows", value=f"Read: {self.read:,}\nValid: {self.valid:,}\n"
+                                           f"Invalid: {self.invalid:,}\nSaved: {self.applied:,}", inline=True)
+        embed.add_field(name="Roles", value=f"Granted: {self.roles_granted:,} / {self.roles_queued:,}\n"
+                                            f"Not in server: {self.roles_missing:,}\n"
+                                            f"Failed: {self.roles_failed:,}", inline=True)
+        if self.errors:
+            more = f"\n…and {self.invalid - len(self.errors):,} more" if self.invalid > len(self.errors) else ""
+            embed.add_field(name="⚠️ Errors", value="\n".join(self.errors)[:950] + more, inline=False)
+        return embed
+
+
+def parse_row(row: dict, plans: dict):
+    """(user_id, plan_id, days, ends_at) from one CSV row, or raise ValueError"""
+    user_id = (row.get("user_id") or "").strip()
+    if not user_id.isdigit():
+        raise ValueError(f"bad user_id {user_id!r}")
+    try:
+        plan_id = int((row.get("plan_id") or "").strip())
+    except ValueError:
+        raise ValueError(f"bad plan_id {row.get('plan_id')!r}")
+    if plan_id not in plans:
+        raise ValueError(f"plan {plan_id} is not a plan of this server")
+
+    expires_at = (row.get("expires_at") or "").strip()
+    days = (row.get("days") or "").strip()
+    if expires_at:
+        try:
+            ends = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"bad expires_at {expires_at!r}")
+        if ends.tzinfo is not None:
+            # Stored and compared as naive UTC
+            ends = ends.astimezone(timezone.utc).replace(tzinfo=None)
+        if ends <= datetime.utcnow():
+            raise ValueError("expires_at is in the past")
+        return user_id, plan_id, None, ends.isoformat()
+    if days:
+        if not days.isdigit() or not 1 <= int(days) <= 3650:
+            raise ValueError(f"bad days {days!r} (1-3650)")
+        return user_id, plan_id, int(days), None
+    # Neither given: one period of the plan
+    return user_id, plan_id, plans[plan_id]["duration_days"], None
+
+
+async def stream_csv_rows(url: str):
+    """Yield (line number, dict) per CSV line while the attachment downloads"""
+    header = None
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            line_no = 0
+            async for raw in resp.content:
+                line_no += 1
+                line = raw.decode("utf-8-sig" if line_no == 1 else "utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = [h.strip().lower() for h in values]
+                    if "user_id" not in header or "plan_id" not in header:
+                        raise ValueError("header must include user_id and plan_id")
+                    continue
+                yield line_no, dict(zip(header, values))
+
+
+class BulkImportCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.role_limiter = RateLimiter(ROLE_GRANTS_PER_SECOND)
+
+    async def _grant_roles(self, guild: discord.Guild, queue: asyncio.Queue, job: ImportJob):
+        """Drain queued (user_id, role_id) grants at the shared rate"""
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            user_id, role_id = item
+            role = guild.get_role(role_id)
+            if role is None:
+                job.roles_failed += 1
+                continue
+            member = members.cached(guild, user_id)
+            try:
+                if member is None:
+                    await self.role_limiter.acquire()
+                    member = await members.get(guild, user_id)
+                    if member is None:
+                        job.roles_missing += 1
+                        continue
+                if role in member.roles:
+                    job.roles_granted += 1
+                    continue
+                await self.role_limiter.acquire()
+                await member.add_roles(role, reason="Bulk membership import")
+                job.roles_granted += 1
+            except discord.NotFound:
+                job.roles_missing += 1
+            except discord.HTTPException as e:
+                job.roles_failed += 1
+                print(f"❌ Import role grant failed for {user_id}: {e}")
+
+    @app_commands.command(name="import_members", description="Bulk import/extend memberships from a CSV (Admin or manager)")
+    @app_commands.describe(file="CSV with user_id, plan_id and days or expires_at columns")
+    @admin_or_manager_check()
+    async def import_members_cmd(self, interaction: discord.Interaction, file: discord.Attachment):
+        if not interaction.guild:
+            await interaction.response.send_message("❌ This must be used in a server.", ephemeral=True)
+            return
+        guild = interaction.guild
+        guild_id = str(guild.id)
+
+        if not has_active_subscription(guild_id):
+            await interaction.response.send_message(
+                "❌ Your bot subscription has expired or not paid. Run `/setup` to renew.",
+                ephemeral=True
+            )
+            return
+        if not file.filename.lower().endswith(".csv"):
+            await interaction.response.send_message(f"❌ Please attach a `.csv` file.\n\n{CSV_HELP}", ephemeral=True)
+            return
+
+        plans = {p[0]: {"role_id": int(p[1]), "duration_days": p[4]}
+                 for p in list_role_plans(guild_id, only_active=False)}
+        if not plans:
+            await interaction.response.send_message("❌ Add a plan with `/plan_add` first.", ephemeral=True)
+            return
+
+        job = ImportJob(file.filename)
+        # A channel message, not the interaction response: interaction tokens expire after
+        # 15 minutes, and role grants for a big import take longer than that
+        await interaction.response.send_message("📥 Import started - progress is posted below.", ephemeral=True)
+        try:
+            message = await interaction.channel.send(embed=job.embed())
+        except discord.HTTPException:
+            message = await interaction.followup.send(embed=job.embed(), ephemeral=True, wait=True)
+        last_edit = time.monotonic()
+
+        async def progress(force=False):
+            nonlocal last_edit
+            if force or time.monotonic() - last_edit >= PROGRESS_EVERY_SECONDS:
+                last_edit = time.monotonic()
+                try:
+                    await message.edit(embed=job.embed())
+                except discord.HTTPException as e:
+                    print(f"Failed to update import progress: {e}")
+
+        queue = asyncio.Queue()
+        worker = asyncio.create_task(self._grant_roles(guild, queue, job))
+        source = f"IMPORT_{interaction.id}"
+        batch = []
+
+        async def flush():
+            rows = batch[:]
+            batch.clear()
+            job.applied += await asyncio.to_thread(bulk_upsert_memberships, guild_id, rows, source,
+                                                   IMPORT_CHUNK_SIZE)
+            for user_id, plan_id, _, _ in rows:
+                queue.put_nowait((int(user_id), plans[plan_id]["role_id"]))
+                job.roles_queued += 1
+
+        try:
+            async for line_no, row in stream_csv_rows(file.url):
+                job.read += 1
+                if job.read > IMPORT_MAX_ROWS:
+                    job.error(line_no, f"file has more than {IMPORT_MAX_ROWS:,} rows - stopped here")
+                    break
+                try:
+                    batch.append(parse_row(row, plans))
+                    job.valid += 1
+                except ValueError as e:
+                    job.error(line_no, str(e))
+                if len(batch) >= IMPORT_CHUNK_SIZE:
+                    job.stage = "Saving"
+                    await flush()
+                    await progress()
+            if batch:
+                await flush()
+
+            job.stage = "Granting roles"
+            await progress(force=True)
+            queue.put_nowait(None)
+            while not worker.done():
+                await asyncio.wait({worker}, timeout=PROGRESS_EVERY_SECONDS)
+                await progress()
+            job.stage = "Done"
+        except (ValueError, aiohttp.ClientError) as e:
+            job.stage = "Failed"
+            job.errors.insert(0, f"❌ {e}")
+        except Exception as e:
+            # e.g. a database error while saving - don't leave the message stuck on "Saving"
+            job.stage = "Failed"
+            job.errors.insert(0, f"❌ Import stopped: {type(e).__name__}")
+            print(f"❌ Import in {guild.name} failed at row {job.read}: {e!r}")
+        finally:
+            if not worker.done():
+                queue.put_nowait(None)
+                await worker
+        await progress(force=True)
+        print(f"📥 Import in {guild.name}: {job.applied} memberships saved, {job.roles_granted} roles granted, "
+              f"{job.invalid} invalid rows")
+
+
+async def setup(bot):
+    await bot.add_cog(BulkImportCog(bot))
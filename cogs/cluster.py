@@ -0,0 +1,65 @@
+import asyncio
+import time
+from discord.ext import commands, tasks
+from database import acquire_lease, lease_is_held, release_lease
+from utils.cluster import CLUSTER_MODE, NODE_ID, LEASE_TTL_SECONDS, HEARTBEAT_SECONDS, lease_name
+
+
+class ClusterCog(commands.Cog):
+    """Leader election heartbeat (only active when CLUSTER_MODE=1)"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.token = None            # fencing token while we are leader
+        self.lease_valid_until = 0   # monotonic deadline, renewed by heartbeat
+        if CLUSTER_MODE:
+            self.heartbeat.start()
+
+    async def cog_unload(self):
+        self.heartbeat.cancel()
+        if self.token is not None:
+            release_lease(lease_name(self.bot), NODE_ID)
+            self.token = None
+
+    def is_leader(self) -> bool:
+        # Stop acting as leader a bit before the lease could expire in the DB
+        return self.token is not None and time.monotonic() < self.lease_valid_until
+
+    def still_leader(self) -> bool:
+        if not self.is_leader():
+            return False
+        if not lease_is_held(lease_name(self.bot), NODE_ID, self.token):
+            print(f"⚠️ Lost leadership (token {self.token}) - another node took over")
+            self.token = None
+            return False
+        return True
+
+    @tasks.loop(seconds=HEARTBEAT_SECONDS)
+    async def heartbeat(self):
+        started = time.monotonic()
+        try:
+            token = await asyncio.to_thread(acquire_lease, lease_name(self.bot), NODE_ID, LEASE_TTL_SECONDS)
+        except Exception as e:
+            # "database is locked", a dropped Postgres connection, ... An exception would
+            # stop tasks.loop for good, so log and retry next beat. Keep the token:
+            # is_leader() turns False by itself once lease_valid_until passes.
+            print(f"⚠️ Lease heartbeat failed for {lease_name(self.bot)}: {e}")
+            return
+
+        if token is not None and self.token != token:
+            print(f"👑 {NODE_ID} is now leader for {lease_name(self.bot)} (token {token})")
+        elif token is None and self.token is not None:
+            print(f"⚠️ {NODE_ID} is no longer leader for {lease_name(self.bot)}")
+
+        self.token = token
+        if token is not None:
+            # One heartbeat of safety margin
+            self.lease_valid_until = started + LEASE_TTL_SECONDS - HEARTBEAT_SECONDS
+
+    @heartbeat.before_loop
+    async def before_heartbeat(self):
+        await self.bot.wait_until_ready()
+
+
+async def setup(bot):
+    await bot.add_cog(ClusterCog(bot))
@@ -2,7 +2,8 @@ import os
 import discord
 from discord import app_commands
 from discord.ext import commands
-from openai import OpenAI
+from utils.lazy import get_openai_client
+from utils.metrics import observe_openai
 
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_KEY:
@@ -13,8 +14,6 @@ if not OWNER_ID_STR:
     raise RuntimeError("OWNER_ID not set in Replit Secrets.")
 OWNER_ID = int(OWNER_ID_STR)
 
-client_ai = OpenAI(api_key=OPENAI_KEY)
-
 class DevChatCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -139,7 +138,9 @@ Be specific and reference actual files/functions from the codebase.
 
         try:
             # Send request to OpenAI GPT-4o
-            response = client_ai.chat.completions.create(
+            response = observe_openai(
+                "devchat",
+                get_openai_client().chat.completions.create,
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import shutil
+import discord
+from discord import app_commands
+from discord.ext import commands
+from database import has_active_subscription
+from utils.export import export_guild, ExportUnavailable
+
+TABLE_CHOICES = [
+    app_commands.Choice(name="Payments", value="payments"),
+    app_commands.Choice(name="Memberships", value="memberships"),
+    app_commands.Choice(name="Payouts", value="payouts"),
+]
+FORMAT_CHOICES = [
+    app_commands.Choice(name="CSV", value="csv"),
+    app_commands.Choice(name="Parquet", value="parquet"),
+]
+
+
+class ExportCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="export", description="Download this server's payments, memberships or payouts (Admin only)")
+    @app_commands.describe(table="What to export", format="File format (CSV by default)")
+    @app_commands.choices(table=TABLE_CHOICES, format=FORMAT_CHOICES)
+    # Administrator only, unlike /import_members (admin_or_manager_check): managers manage
+    # plans and memberships, but financial data - payments, payout account numbers - stays
+    # with admins, the same line /status, /topmembers and /growth draw
+    @app_commands.checks.has_permissions(administrator=True)
+    async def export_cmd(self, interaction: discord.Interaction, table: app_commands.Choice[str],
+                         format: app_commands.Choice[str] = None):
+        if not interaction.guild:
+            await interaction.response.send_message("❌ This must be used in a server.", ephemeral=True)
+            return
+        guild_id = str(interaction.guild.id)
+        if not has_active_subscription(guild_id):
+            await interaction.response.send_message(
+                "❌ Your bot subscription has expired or not paid. Run `/setup` to renew.",
+                ephemeral=True
+            )
+            return
+
+        fmt = format.value if format else "csv"
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            path, rows = await asyncio.to_thread(export_guild, guild_id, table.value, fmt)
+        except ExportUnavailable as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+
+        out_dir = os.path.dirname(path)
+        try:
+            size = os.path.getsize(path)
+            if size > interaction.guild.filesize_limit:
+                await interaction.followup.send(
+                    f"❌ The export is {size / 1024 / 1024:.1f} MB ({rows:,} rows), over this server's "
+                    f"{interaction.guild.filesize_limit / 1024 / 1024:.0f} MB upload limit. "
+                    f"Ask the bot owner to run `python -m utils.export --guild {guild_id} --table {table.value}`.",
+                    ephemeral=True
+                )
+                return
+            await interaction.followup.send(
+                f"📦 **{table.name}** — {rows:,} rows",
+                file=discord.File(path, filename=os.path.basename(path)),
+                ephemeral=True
+            )
+            print(f"📦 Export in {interaction.guild.name}: {table.value} ({rows} rows, {size} bytes)")
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+async def setup(bot):
+    await bot.add_cog(ExportCog(bot))
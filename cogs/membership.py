@@ -1,9 +1,15 @@
+import asyncio
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
-from database import list_expired, get_plan, deactivate_membership, get_user_active_membership, create_payment, list_role_plans
+from database import claim_expired_memberships, get_plan, deactivate_membership, get_user_active_membership, create_payment, list_role_plans
 from datetime import datetime, timedelta
 from utils.qpay import create_qpay_invoice
+from utils.sharding import owned_guild_ids
+from utils.cluster import NODE_ID, ROW_CLAIM_TTL_SECONDS
+from utils.metrics import EXPIRY_PROCESSED, DM_FAILURES
+from utils.notifications import notifications, MEMBERSHIP_EXPIRED
+from utils.members import members
 
 class SeeOtherPlansView(discord.ui.View):
     """View with only 'See Other Plans' button (for deleted plans)"""
@@ -111,146 +117,160 @@ class MembershipCog(commands.Cog):
 
     @tasks.loop(minutes=30)
     async def expire_watcher(self):
-        for guild in self.bot.guilds:
-            expired = list_expired(str(guild.id))
-            for user_id, plan_id in expired:
-                member = guild.get_member(int(user_id))
-                plan = get_plan(int(plan_id))
-                # Deactivate only THIS specific membership (supports multiple roles)
-                deactivate_membership(str(guild.id), user_id, int(plan_id))
-                if member and plan:
-                    role = guild.get_role(int(plan["role_id"]))
-                    if role:
+        notifications.prune()
+        # One batched query for every guild owned by this shard; rows are claimed
+        # so other processes (and check_membership_expiry) skip the ones we're handling
+        expired = claim_expired_memberships(owned_guild_ids(self.bot), NODE_ID, ROW_CLAIM_TTL_SECONDS)
+        for guild_id, user_id, plan_id, access_ends_at in expired:
+            guild = self.bot.get_guild(int(guild_id))
+            if not guild:
+                continue
+            member = await members.get(guild, int(user_id))
+            plan = get_plan(int(plan_id))
+            # Deactivate only THIS specific membership (supports multiple roles)
+            deactivate_membership(guild_id, user_id, int(plan_id))
+            EXPIRY_PROCESSED.inc(loop="expire_watcher")
+            if member and plan:
+                role = guild.get_role(int(plan["role_id"]))
+                if role:
+                    try:
                         await member.remove_roles(role, reason="Membership expired")
+                    except Exception as e:
+                        print(f"❌ Failed to remove role: {e}")
+                
+                # Once per membership period, whichever expiry loop gets there
+                if not notifications.claim(MEMBERSHIP_EXPIRED, f"{guild_id}:{user_id}:{plan_id}", access_ends_at):
+                    continue
+                
+                # Send DM based on plan availability
+                try:
+                    # Check if plan is deleted
+                    is_deleted = plan.get("deleted_at") is not None
+                    is_active = plan.get("active") == 1
                     
-                    # Send DM based on plan availability
-                    try:
-                        # Check if plan is deleted
-                        is_deleted = plan.get("deleted_at") is not None
-                        is_active = plan.get("active") == 1
+                    if is_active and not is_deleted:
+                        # Plan is active and not deleted - offer renewal with both buttons
+                        embed = discord.Embed(
+                            title="⏰ Your Membership Has Expired!",
+                            description=f"Your **{plan['role_name']}** membership in **{guild.name}** has ended.",
+                            color=0xe74c3c
+                        )
                         
-                        if is_active and not is_deleted:
-                            # Plan is active and not deleted - offer renewal with both buttons
-                            embed = discord.Embed(
-                                title="⏰ Your Membership Has Expired!",
-                                description=f"Your **{plan['role_name']}** membership in **{guild.name}** has ended.",
-                                color=0xe74c3c
-                            )
-                            
-                            embed.add_field(
-                                name="📦 Expired Plan",
-                                value=f"**{plan['role_name']}**",
-                                inline=True
-                            )
-                            
-                            embed.add_field(
-                                name="💰 Renewal Price",
-                                value=f"**{plan['price_mnt']:,}₮**",
-                                inline=True
-                            )
-                            
-                            embed.add_field(
-                                name="⏱️ Duration",
-                                value=f"**{plan['duration_days']} days**",
-                                inline=True
-                            )
-                            
-                            # Add description if available
-                            desc = plan.get('description', '')
-                            if desc:
-                                embed.add_field(
-                                    name="✨ What You'll Get",
-                                    value=desc,
-                                    inline=False
-                                )
-                            
-                            embed.add_field(
-                                name="🔄 Choose Your Next Step",
-                                value="**🔄 Renew Same Plan** - Quick renewal of your previous plan\n"
-                                      "**🛍️ See Other Plans** - Browse all available plans\n\n"
-                                      "Click a button below to continue!",
-                                inline=False
-                            )
-                            
-                            embed.set_footer(text=f"Server: {guild.name}")
-                            
-                            # Create renewal choice view with two buttons
-                            view = RenewalChoiceView(
-                                str(guild.id), 
-                                guild.name, 
-                                plan_id, 
-                                plan["role_name"]
-                            )
-                            
-                            await member.send(embed=embed, view=view)
+                        embed.add_field(
+                            name="📦 Expired Plan",
+                            value=f"**{plan['role_name']}**",
+                            inline=True
+                        )
                         
-                        elif is_deleted:
-                            # Plan is deleted - show only "See Other Plans" button
-                            embed = discord.Embed(
-                                title="⏰ Your Membership Has Expired!",
-                                description=f"Your **{plan['role_name']}** membership in **{guild.name}** has ended.",
-                                color=0xe67e22
-                            )
-                            
-                            embed.add_field(
-                                name="📦 Expired Plan",
-                                value=f"**{plan['role_name']}**",
-                                inline=True
-                            )
-                            
-                            embed.add_field(
-                                name="⚠️ Plan Removed",
-                                value="This plan has been removed by the admin.",
-                                inline=True
-                            )
-                            
-                            embed.add_field(
-                                name="🛍️ Next Steps",
-                                value="Browse other available plans to continue enjoying server perks!",
-                                inline=False
-                            )
-                            
-                            embed.set_footer(text=f"Server: {guild.name}")
-                            
-                            # Create view with only "See Other Plans" button
-                            view = SeeOtherPlansView(str(guild.id), guild.name)
-                            
-                            await member.send(embed=embed, view=view)
+                        embed.add_field(
+                            name="💰 Renewal Price",
+                            value=f"**{plan['price_mnt']:,}₮**",
+                            inline=True
+                        )
                         
-                        else:
-                            # Plan is deactivated (not deleted) - show only "See Other Plans" button
-                            embed = discord.Embed(
-                                title="⏰ Your Membership Has Expired!",
-                                description=f"Your **{plan['role_name']}** membership in **{guild.name}** has ended.",
-                                color=0x95a5a6
-                            )
-                            
-                            embed.add_field(
-                                name="📦 Expired Plan",
-                                value=f"**{plan['role_name']}**",
-                                inline=True
-                            )
-                            
-                            embed.add_field(
-                                name="⚠️ Plan Temporarily Disabled",
-                                value="This plan has been temporarily disabled.",
-                                inline=True
-                            )
-                            
+                        embed.add_field(
+                            name="⏱️ Duration",
+                            value=f"**{plan['duration_days']} days**",
+                            inline=True
+                        )
+                        
+                        # Add description if available
+                        desc = plan.get('description', '')
+                        if desc:
                             embed.add_field(
-                                name="🛍️ Next Steps",
-                                value="Browse other available plans to continue enjoying server perks!",
+                                name="✨ What You'll Get",
+                                value=desc,
                                 inline=False
                             )
-                            
-                            embed.set_footer(text=f"Server: {guild.name}")
-                            
-                            # Create view with only "See Other Plans" button
-                            view = SeeOtherPlansView(str(guild.id), guild.name)
-                            
-                            await member.send(embed=embed, view=view)
-                    except Exception as e:
-                        print(f"Failed to send renewal DM: {e}")
+                        
+                        embed.add_field(
+                            name="🔄 Choose Your Next Step",
+                            value="**🔄 Renew Same Plan** - Quick renewal of your previous plan\n"
+                                  "**🛍️ See Other Plans** - Browse all available plans\n\n"
+                                  "Click a button below to continue!",
+                            inline=False
+                        )
+                        
+                        embed.set_footer(text=f"Server: {guild.name}")
+                        
+                        # Create renewal choice view with two buttons
+                        view = RenewalChoiceView(
+                            str(guild.id), 
+                            guild.name, 
+                            plan_id, 
+                            plan["role_name"]
+                        )
+                        
+                        await member.send(embed=embed, view=view)
+                    
+                    elif is_deleted:
+                        # Plan is deleted - show only "See Other Plans" button
+                        embed = discord.Embed(
+                            title="⏰ Your Membership Has Expired!",
+                            description=f"Your **{plan['role_name']}** membership in **{guild.name}** has ended.",
+                            color=0xe67e22
+                        )
+                        
+                        embed.add_field(
+                            name="📦 Expired Plan",
+                            value=f"**{plan['role_name']}**",
+                            inline=True
+                        )
+                        
+                        embed.add_field(
+                            name="⚠️ Plan Removed",
+                            value="This plan has been removed by the admin.",
+                            inline=True
+                        )
+                        
+                        embed.add_field(
+                            name="🛍️ Next Steps",
+                            value="Browse other available plans to continue enjoying server perks!",
+                            inline=False
+                        )
+                        
+                        embed.set_footer(text=f"Server: {guild.name}")
+                        
+                        # Create view with only "See Other Plans" button
+                        view = SeeOtherPlansView(str(guild.id), guild.name)
+                        
+                        await member.send(embed=embed, view=view)
+                    
+                    else:
+                        # Plan is deactivated (not deleted) - show only "See Other Plans" button
+                        embed = discord.Embed(
+                            title="⏰ Your Membership Has Expired!",
+                            description=f"Your **{plan['role_name']}** membership in **{guild.name}** has ended.",
+                            color=0x95a5a6
+                        )
+                        
+                        embed.add_field(
+                            name="📦 Expired Plan",
+                            value=f"**{plan['role_name']}**",
+                            inline=True
+                        )
+                        
+                        embed.add_field(
+                            name="⚠️ Plan Temporarily Disabled",
+                            value="This plan has been temporarily disabled.",
+                            inline=True
+                        )
+                        
+                        embed.add_field(
+                            name="🛍️ Next Steps",
+                            value="Browse other available plans to continue enjoying server perks!",
+                            inline=False
+                        )
+                        
+                        embed.set_footer(text=f"Server: {guild.name}")
+                        
+                        # Create view with only "See Other Plans" button
+                        view = SeeOtherPlansView(str(guild.id), guild.name)
+                        
+                        await member.send(embed=embed, view=view)
+                except Exception as e:
+                    DM_FAILURES.inc(kind="membership_renewal")
+                    print(f"Failed to send renewal DM: {e}")
 
     @expire_watcher.before_loop
     async def before_watcher(self):
@@ -259,8 +279,8 @@ class MembershipCog(commands.Cog):
     @app_commands.command(name="verifypayment", description="🔄 Backup: Verify payment if Check Payment button doesn't work")
     async def verify_payment_cmd(self, interaction: discord.Interaction):
         """Allow users to manually verify their payment if buttons fail (e.g. after bot restart)"""
-        from database import get_payment_by_user, mark_payment_paid, grant_membership, get_plan
-        from utils.qpay import check_qpay_payment_status
+        from database import get_payment_by_user, confirm_payment
+        from utils.qpay import check_qpay_payment_status, QPayUnavailable, QPAY_BUSY_MESSAGE
         
         if not interaction.guild:
             await interaction.response.send_message("❌ This must be used in a server.", ephemeral=True)
@@ -283,29 +303,32 @@ class MembershipCog(commands.Cog):
         invoice_id, guild_id, user_id, plan_id, amount, status, payment_url = payment
         
         # Check QPay status
-        qpay_status = check_qpay_payment_status(invoice_id)
+        try:
+            qpay_status = await asyncio.to_thread(check_qpay_payment_status, invoice_id)
+        except QPayUnavailable:
+            await interaction.followup.send(QPAY_BUSY_MESSAGE, ephemeral=True)
+            return
         
         if qpay_status == "PAID":
-            # Get plan details
-            plan = get_plan(int(plan_id))
+            # Atomic pending -> paid + grant (safe against a parallel Check Payment click)
+            result = confirm_payment(invoice_id)
+            plan = result["plan"] if result else None
             if not plan:
                 await interaction.followup.send("❌ Plan not found.", ephemeral=True)
                 return
             
             # Already marked paid?
-            if status == "paid":
+            if not result["confirmed"]:
                 await interaction.followup.send(
                     f"✅ Payment already confirmed!\n\nYou already have the **{plan['role_name']}** role.",
                     ephemeral=True
                 )
                 return
             
-            # First time confirmation - grant membership
-            mark_payment_paid(invoice_id)
-            ends_at = grant_membership(guild_id, user_id, plan_id, plan["duration_days"], invoice_id)
+            ends_at = result["access_ends_at"]
             
             # Add role
-            member = interaction.guild.get_member(int(user_id))
+            member = await members.get(interaction.guild, int(user_id))
             role = interaction.guild.get_role(int(plan["role_id"]))
             
             if member and role:
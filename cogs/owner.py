@@ -2,7 +2,10 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import os
-from database import _conn
+from database import get_platform_analytics
+import asyncio
+from utils.startup import remember_synced_tree, profile_imports
+from utils import dbprofile
 
 class OwnerCog(commands.Cog):
     def __init__(self, bot):
@@ -24,46 +27,21 @@ class OwnerCog(commands.Cog):
         await interaction.response.defer(ephemeral=not is_dm)
         
         # Get all analytics data
-        conn = _conn()
-        c = conn.cursor()
-        
-        # === SERVERS & SUBSCRIPTIONS ===
-        c.execute("SELECT COUNT(DISTINCT guild_id) FROM subscriptions")
-        total_servers = c.fetchone()[0] or 0
-        
-        c.execute("SELECT COUNT(*) FROM subscriptions WHERE status='active'")
-        active_subs = c.fetchone()[0] or 0
-        
-        c.execute("SELECT COUNT(*) FROM subscriptions WHERE status='expired'")
-        expired_subs = c.fetchone()[0] or 0
-        
-        c.execute("SELECT COUNT(*) FROM subscriptions WHERE status='pending'")
-        pending_subs = c.fetchone()[0] or 0
-        
-        # Subscription revenue
-        c.execute("SELECT COALESCE(SUM(amount_mnt), 0) FROM subscriptions WHERE status='active'")
-        subscription_revenue = c.fetchone()[0] or 0
-        
-        # === ROLE PLANS ===
-        c.execute("SELECT COUNT(*) FROM role_plans")
-        total_plans = c.fetchone()[0] or 0
-        
-        c.execute("SELECT COUNT(*) FROM role_plans WHERE active=1")
-        active_plans = c.fetchone()[0] or 0
-        
-        # === MEMBERSHIPS ===
-        c.execute("SELECT COUNT(*) FROM memberships WHERE active=1")
-        active_memberships = c.fetchone()[0] or 0
-        
-        c.execute("SELECT COUNT(DISTINCT user_id) FROM memberships WHERE active=1")
-        unique_members = c.fetchone()[0] or 0
-        
-        # === PAYMENTS & REVENUE ===
-        c.execute("SELECT COUNT(*) FROM payments WHERE status='paid'")
-        total_payments = c.fetchone()[0] or 0
-        
-        c.execute("SELECT COALESCE(SUM(amount_mnt), 0) FROM payments WHERE status='paid'")
-        total_role_revenue = c.fetchone()[0] or 0
+        stats = get_platform_analytics()
+        total_servers = stats["total_servers"]
+        active_subs = stats["active_subs"]
+        expired_subs = stats["expired_subs"]
+        pending_subs = stats["pending_subs"]
+        subscription_revenue = stats["subscription_revenue"]
+        total_plans = stats["total_plans"]
+        active_plans = stats["active_plans"]
+        active_memberships = stats["active_memberships"]
+        unique_members = stats["unique_members"]
+        total_payments = stats["total_payments"]
+        total_role_revenue = stats["total_role_revenue"]
+        total_collected = stats["total_collected"]
+        completed_payouts = stats["completed_payouts"]
+        top_servers = stats["top_servers"]
         
         # === MONEY FLOW ===
         # Total revenue from role sales
@@ -78,34 +56,12 @@ class OwnerCog(commands.Cog):
         # Net revenue for admins (gross - 1% QPay - 2% service fee = 97%)
         net_revenue = gross_revenue - qpay_fee - service_fee
         
-        # Calculate total collected from completed payouts
-        c.execute("SELECT COALESCE(SUM(net_mnt), 0) FROM payouts WHERE status='done'")
-        total_collected = c.fetchone()[0] or 0
-        
         # Pending = net revenue - collected
         total_pending = net_revenue - total_collected
         
-        # Count number of actual completed payouts for bank transfer fee calculation
-        # Each payout request (each /collect command) costs 200₮ in bank transfer fees
-        c.execute("SELECT COUNT(*) FROM payouts WHERE status='done'")
-        completed_payouts = c.fetchone()[0] or 0
-        
         # Bank transfer fees (200₮ per payout transaction)
         bank_transfer_fees = completed_payouts * 200
         
-        # === TOP PERFORMING SERVERS ===
-        c.execute("""SELECT s.guild_id, s.plan_name, 
-                            COALESCE(SUM(p.amount_mnt), 0) as revenue
-                     FROM subscriptions s
-                     LEFT JOIN payments p ON s.guild_id = p.guild_id AND p.status='paid'
-                     WHERE s.status='active'
-                     GROUP BY s.guild_id
-                     ORDER BY revenue DESC
-                     LIMIT 5""")
-        top_servers = c.fetchall()
-        
-        conn.close()
-        
         # === CREATE EMBEDS ===
         embeds = []
         
@@ -260,6 +216,7 @@ class OwnerCog(commands.Cog):
             # Clear existing commands and re-sync
             self.bot.tree.clear_commands(guild=None)
             await self.bot.tree.sync()
+            remember_synced_tree(self.bot)
             
             await interaction.followup.send(
                 "✅ **Commands synced successfully!**\n\n"
@@ -273,6 +230,93 @@ class OwnerCog(commands.Cog):
         except Exception as e:
             await interaction.followup.send(f"❌ Sync failed: {str(e)}", ephemeral=True)
 
+    @app_commands.command(name="startup", description="[OWNER ONLY] Startup timings and import-time profile")
+    async def startup_cmd(self, interaction: discord.Interaction):
+        owner_id = int(os.getenv("OWNER_DISCORD_ID", "0"))
+        
+        # Check if user is owner
+        if owner_id == 0 or interaction.user.id != owner_id:
+            await interaction.response.send_message("❌ This command is owner-only.", ephemeral=True)
+            return
+        
+        await interaction.response.defer(ephemeral=True)
+        
+        timings = getattr(self.bot, "startup_timings", {})
+        cogs = timings.get("cogs", {})
+        
+        embed = discord.Embed(title="⏱️ Startup Profile", color=discord.Color.blurple())
+        
+        phases = "\n".join(f"**{phase}**: {ms:.0f} ms" for phase, ms in timings.items() if phase != "cogs")
+        embed.add_field(name="Phases (last start)", value=phases or "No timings recorded", inline=False)
+        
+        cog_lines = "\n".join(f"`{ext}`: {ms:.0f} ms" for ext, ms in sorted(cogs.items(), key=lambda kv: kv[1], reverse=True))
+        embed.add_field(name="Per cog (load_extension)", value=cog_lines or "No cogs recorded", inline=False)
+        
+        # Fresh interpreter, so already-imported modules in this process don't hide the cost
+        modules = list(self.bot.extensions.keys()) or list(cogs.keys())
+        try:
+            total_ms, rows = await asyncio.to_thread(profile_imports, modules)
+            import_lines = "\n".join(f"`{name}`: {ms:.0f} ms" for name, ms in rows)
+            embed.add_field(name=f"python -X importtime (total {total_ms:.0f} ms)", value=import_lines or "No data", inline=False)
+        except Exception as e:
+            embed.add_field(name="python -X importtime", value=f"❌ Profiling failed: {e}", inline=False)
+        
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="dbprofile", description="[OWNER ONLY] Database profiler: slowest helpers, queries and slow-query log")
+    @app_commands.describe(action="show (default), on, off or reset")
+    @app_commands.choices(action=[
+        app_commands.Choice(name="show", value="show"),
+        app_commands.Choice(name="on", value="on"),
+        app_commands.Choice(name="off", value="off"),
+        app_commands.Choice(name="reset", value="reset"),
+    ])
+    async def dbprofile_cmd(self, interaction: discord.Interaction, action: str = "show"):
+        owner_id = int(os.getenv("OWNER_DISCORD_ID", "0"))
+        
+        # Check if user is owner
+        if owner_id == 0 or interaction.user.id != owner_id:
+            await interaction.response.send_message("❌ This command is owner-only.", ephemeral=True)
+            return
+        
+        if action in ("on", "off"):
+            dbprofile.set_enabled(action == "on")
+            await interaction.response.send_message(f"✅ DB profiler turned **{action}**.", ephemeral=True)
+            return
+        if action == "reset":
+            dbprofile.reset()
+            await interaction.response.send_message("✅ DB profiler stats cleared.", ephemeral=True)
+            return
+        
+        functions, statements, slow = dbprofile.snapshot(top=8)
+        state = "on" if dbprofile.is_enabled() else "off"
+        
+        embed = discord.Embed(
+            title="🗄️ DB Profile",
+            description=f"Profiler is **{state}** • slow-query threshold {dbprofile.SLOW_QUERY_MS:.0f} ms",
+            color=discord.Color.dark_teal()
+        )
+        
+        lines = [
+            f"`{name}` {calls}× • total {total * 1000:.0f} ms • max {mx * 1000:.1f} ms • {rows} rows"
+            for name, (calls, total, mx, rows) in functions
+        ]
+        embed.add_field(name="Helpers by total time", value="\n".join(lines)[:1024] or "No data yet", inline=False)
+        
+        lines = [
+            f"**{func}** {calls}× • {total * 1000:.0f} ms • {rows} rows\n`{sql[:120]}`"
+            for (func, sql), (calls, total, mx, rows) in statements[:5]
+        ]
+        embed.add_field(name="Statements by total time", value="\n".join(lines)[:1024] or "No data yet", inline=False)
+        
+        lines = [
+            f"{ms:.0f} ms in **{func}**: `{sql[:80]}`" + (f"\n↳ {plan[0][:80]}" if plan else "")
+            for when, ms, func, sql, plan in reversed(slow[-5:])
+        ]
+        embed.add_field(name="Recent slow queries", value="\n".join(lines)[:1024] or "None", inline=False)
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 
 async def setup(bot):
     await bot.add_cog(OwnerCog(bot))
@@ -1,10 +1,22 @@
+import asyncio
+import os
 import discord
 from discord import app_commands
 from discord.ext import commands
-from database import get_plan, create_payment, get_payment, mark_payment_paid, grant_membership
-from utils.qpay import create_qpay_invoice, check_qpay_payment_status
+from database import get_plan, create_payment, confirm_payment, get_reusable_payment
+from utils.qpay import create_qpay_invoice, check_qpay_payment_status, QPayUnavailable, QPAY_BUSY_MESSAGE
+from utils.ids import new_invoice_no
+from utils.metrics import QPAY_INVOICES
+from utils.singleflight import KeyedLock
+from utils.members import members
 from cogs.admin import admin_or_manager_check
 
+# A pending invoice for the same user+plan+price younger than this is shown again
+# instead of creating a new one
+INVOICE_REUSE_MINUTES = int(os.getenv("INVOICE_REUSE_MINUTES", "30"))
+
+_invoice_locks = KeyedLock()
+
 
 class PayPlanButton(discord.ui.Button):
     def __init__(self, plan_id: int, label: str, guild_id: str = None):
@@ -27,15 +39,33 @@ class PayPlanButton(discord.ui.Button):
 
         await interaction.response.defer(ephemeral=True)
 
-        # Create invoice
-        invoice_id, qr_text, payment_url = create_qpay_invoice(plan["price_mnt"], plan["role_name"])
-        if not invoice_id:
-            await interaction.followup.send("❌ Failed to create QPay invoice.", ephemeral=True)
-            return
+        user_id = str(interaction.user.id)
+        # One click at a time per user+plan: a double click waits here, then reuses
+        # the invoice the first click created instead of asking QPay for another
+        async with _invoice_locks.hold((guild_id, user_id, self.plan_id)):
+            reusable = get_reusable_payment(guild_id, user_id, self.plan_id, plan["price_mnt"],
+                                            INVOICE_REUSE_MINUTES)
+            if reusable:
+                invoice_id, short_url, _ = reusable
+                payment_url = "" if short_url.startswith("qr:") else short_url
+                QPAY_INVOICES.inc(result="reused")
+            else:
+                # Create invoice (off the event loop; fails fast while QPay is degraded)
+                invoice_no = new_invoice_no()
+                try:
+                    invoice_id, qr_text, payment_url = await asyncio.to_thread(
+                        create_qpay_invoice, plan["price_mnt"], plan["role_name"], invoice_no)
+                except QPayUnavailable:
+                    await interaction.followup.send(QPAY_BUSY_MESSAGE, ephemeral=True)
+                    return
+                if not invoice_id:
+                    await interaction.followup.send("❌ Failed to create QPay invoice.", ephemeral=True)
+                    return
 
-        # Save payment with guild_id
-        create_payment(invoice_id, guild_id, str(interaction.user.id),
-                       self.plan_id, plan["price_mnt"], payment_url or f"qr:{qr_text}")
+                # Save payment with guild_id
+                create_payment(invoice_id, guild_id, user_id,
+                               self.plan_id, plan["price_mnt"], payment_url or f"qr:{qr_text}", invoice_no)
+                QPAY_INVOICES.inc(result="created")
 
         # Build payment view with Pay Now button (pass guild_id for DM support)
         view = discord.ui.View(timeout=None)
@@ -101,31 +131,35 @@ class CheckPaymentButton(discord.ui.Button):
         self.guild_id = guild_id  # Store for DM support (not strictly needed but for consistency)
 
     async def callback(self, interaction: discord.Interaction):
-        from database import get_membership_by_invoice
-        
         await interaction.response.defer(ephemeral=True)
         
-        status = check_qpay_payment_status(self.invoice_id)
+        try:
+            status = await asyncio.to_thread(check_qpay_payment_status, self.invoice_id)
+        except QPayUnavailable:
+            await interaction.followup.send(QPAY_BUSY_MESSAGE, ephemeral=True)
+            return
 
         if status == "PAID":
-            row = get_payment(self.invoice_id)
-            if not row:
+            # One transaction: pending -> paid (compare-and-set) + grant membership.
+            # Double clicks can't extend the membership twice.
+            result = confirm_payment(self.invoice_id)
+            if not result:
                 await interaction.followup.send("❌ Payment not found.", ephemeral=True)
                 return
 
-            # Get plan details
-            plan = get_plan(int(row[3]))
+            plan = result["plan"]
             if not plan:
                 await interaction.followup.send("❌ Plan not found.", ephemeral=True)
                 return
 
             # Already marked paid?
-            if row[5] == "paid":
-                # Get membership to show end date
-                membership = get_membership_by_invoice(self.invoice_id)
-                if membership:
-                    ends_at = membership[4]  # access_ends_at
-                    
+            if not result["confirmed"]:
+                if result["status"] != "paid":
+                    await interaction.followup.send(f"❌ Payment is {result['status']}.", ephemeral=True)
+                    return
+
+                ends_at = result["access_ends_at"]
+                if ends_at:
                     # Build description text
                     desc_text = ""
                     desc = plan.get('description', '')
@@ -145,17 +179,16 @@ class CheckPaymentButton(discord.ui.Button):
                     await interaction.followup.send("✅ Payment complete! Role already granted.", ephemeral=True)
                 return
 
-            # First time confirmation - grant membership
-            mark_payment_paid(self.invoice_id)
-            ends_at = grant_membership(row[1], row[2], row[3], plan["duration_days"], self.invoice_id)
+            # First time confirmation - membership was granted in confirm_payment
+            ends_at = result["access_ends_at"]
 
             # Add role with null safety
-            guild = interaction.client.get_guild(int(row[1]))
+            guild = interaction.client.get_guild(int(result["guild_id"]))
             if not guild:
                 await interaction.followup.send("❌ Server not found.", ephemeral=True)
                 return
                 
-            member = guild.get_member(int(row[2]))
+            member = await members.get(guild, int(result["user_id"]))
             role = guild.get_role(int(plan["role_id"]))
             
             if member and role:
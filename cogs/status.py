@@ -5,6 +5,7 @@ from discord import app_commands
 from discord.ext import commands
 from database import (has_active_subscription, total_guild_revenue, count_active_members, 
                      available_to_collect, get_plans_breakdown, create_payout_record, mark_payout_done, get_payout, get_subscription)
+from utils.admin_index import admin_index
 
 # Get owner Discord ID from environment variable
 OWNER_DISCORD_ID = int(os.getenv("OWNER_DISCORD_ID", "0"))
@@ -143,16 +144,11 @@ class DoneButton(discord.ui.Button):
         created_time = datetime.fromisoformat(payout['created_at']).strftime("%Y-%m-%d %H:%M:%S UTC")
         completed_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
         
-        # Find admin - check guild members for who has administrator permission
-        admin = None
+        # The owner, else any other admin
+        admin = await admin_index.first_admin(guild)
         
         # === 1. Send DM to Admin (Confirmation) ===
         try:
-            for member in guild.members:
-                if member.guild_permissions.administrator:
-                    admin = member
-                    break
-            
             if admin:
                 admin_embed = discord.Embed(
                     title="✅ Payout Completed!",
@@ -1,13 +1,17 @@
+import asyncio
 import discord
 from discord.ext import tasks, commands
 from datetime import datetime
-from database import (get_all_subscriptions, deactivate_subscription, list_expired, 
+from database import (get_all_subscriptions, deactivate_subscription, claim_expired_memberships, 
                       deactivate_membership, get_plan, get_subscriptions_expiring_soon,
                       available_to_collect, renew_subscription_with_balance, mark_subscription_paid, create_subscription)
 from datetime import timedelta
-
-# Store warned guilds to avoid spamming
-warned_guilds = set()
+from utils.sharding import owned_guild_ids, owns_guild
+from utils.cluster import NODE_ID, ROW_CLAIM_TTL_SECONDS, is_leader, still_leader
+from utils.metrics import EXPIRY_PROCESSED, DM_FAILURES
+from utils.admin_index import admin_index
+from utils.members import members
+from utils.notifications import notifications, SUBSCRIPTION_WARNING, SUBSCRIPTION_EXPIRED, MEMBERSHIP_EXPIRED
 
 class RenewalOptionsView(discord.ui.View):
     def __init__(self, guild_id: str, guild_name: str):
@@ -63,13 +67,18 @@ class SubscriptionPackageView(discord.ui.View):
         self.guild_name = guild_name
 
     async def create_qpay_renewal(self, interaction: discord.Interaction, plan_name: str, amount: int, days: int):
-        from utils.qpay import create_qpay_invoice
+        from utils.qpay import create_qpay_invoice, QPayUnavailable, QPAY_BUSY_MESSAGE
         from database import get_subscription
         
         await interaction.response.defer(ephemeral=True)
         
         # Create QPay invoice
-        invoice_id, qr_text, payment_url = create_qpay_invoice(amount, f"{plan_name} Subscription")
+        try:
+            invoice_id, qr_text, payment_url = await asyncio.to_thread(
+                create_qpay_invoice, amount, f"{plan_name} Subscription")
+        except QPayUnavailable:
+            await interaction.followup.send(QPAY_BUSY_MESSAGE, ephemeral=True)
+            return
         if not invoice_id:
             await interaction.followup.send("❌ Failed to create QPay invoice.", ephemeral=True)
             return
@@ -177,19 +186,29 @@ class SubscriptionChecker(commands.Cog):
     @tasks.loop(hours=12)  # check every 12 hours
     async def warn_expiring_soon(self):
         """Warn admins 3 days before subscription expires"""
-        expiring = get_subscriptions_expiring_soon(days=3)
+        # Singleton job - only the cluster leader sends warnings
+        if not is_leader(self.bot):
+            return
+
+        # Only this shard's guilds - other shards warn their own admins
+        expiring = get_subscriptions_expiring_soon(days=3, guild_ids=owned_guild_ids(self.bot))
         
         for guild_id, plan_name, expires_at, amount in expiring:
-            # Skip if already warned recently
-            if guild_id in warned_guilds:
+            # One warning per subscription period (keyed by its expiry), across restarts
+            if notifications.sent(SUBSCRIPTION_WARNING, guild_id, expires_at):
                 continue
             
             guild = self.bot.get_guild(int(guild_id))
             if not guild:
                 continue
+
+            # Fenced check - a paused ex-leader must not DM admins a second time
+            if not still_leader(self.bot):
+                return
+            if not notifications.claim(SUBSCRIPTION_WARNING, guild_id, expires_at):
+                continue
             
-            # Get all admins
-            admins = [m for m in guild.members if m.guild_permissions.administrator and not m.bot]
+            admins = await admin_index.admin_members(guild)
             
             for admin in admins:
                 try:
@@ -220,28 +239,34 @@ class SubscriptionChecker(commands.Cog):
                     await admin.send(embed=embed, view=view)
                     print(f"📨 Sent renewal warning to {admin.name} for {guild.name}")
                 except Exception as e:
+                    DM_FAILURES.inc(kind="subscription_warning")
                     print(f"❌ Failed to send renewal warning: {e}")
-            
-            # Mark as warned
-            warned_guilds.add(guild_id)
 
     @tasks.loop(hours=1)  # check every 1 hour
     async def check_expiry(self):
+        # Singleton job - only the cluster leader expires subscriptions
+        if not is_leader(self.bot):
+            return
+
         now = datetime.utcnow().isoformat()
         subs = get_all_subscriptions()
 
         for sub in subs:
             guild_id, expires_at = sub
+            # Filter by shard formula (not bot.guilds) so subscriptions of guilds
+            # the bot has left are still expired - by exactly one shard
+            if not owns_guild(self.bot, guild_id):
+                continue
             if expires_at < now:  # expired
+                if not still_leader(self.bot):
+                    return
                 deactivate_subscription(guild_id)
-                
-                # Remove from warned set
-                warned_guilds.discard(guild_id)
+                EXPIRY_PROCESSED.inc(loop="subscription_expiry")
 
                 guild = self.bot.get_guild(int(guild_id))
-                if guild:
+                if guild and notifications.claim(SUBSCRIPTION_EXPIRED, guild_id, expires_at):
                     # Message all admins
-                    admins = [m for m in guild.members if m.guild_permissions.administrator and not m.bot]
+                    admins = await admin_index.admin_members(guild)
                     for admin in admins:
                         try:
                             embed = discord.Embed(
@@ -253,33 +278,38 @@ class SubscriptionChecker(commands.Cog):
                             view = RenewalOptionsView(guild_id, guild.name)
                             await admin.send(embed=embed, view=view)
                         except:
-                            pass
+                            DM_FAILURES.inc(kind="subscription_expired")
 
     @tasks.loop(hours=1)  # check every 1 hour
     async def check_membership_expiry(self):
-        # Get all guilds the bot is in
-        for guild in self.bot.guilds:
-            expired = list_expired(str(guild.id))
+        # One batched query for every guild owned by this shard; rows are claimed
+        # so other processes (and expire_watcher) skip the ones we're handling
+        expired = claim_expired_memberships(owned_guild_ids(self.bot), NODE_ID, ROW_CLAIM_TTL_SECONDS)
+
+        for guild_id, user_id, plan_id, access_ends_at in expired:
+            guild = self.bot.get_guild(int(guild_id))
+            if not guild:
+                continue
+
+            # Get plan details
+            plan = get_plan(plan_id)
+            if not plan:
+                continue
             
-            for user_id, plan_id in expired:
-                # Get plan details
-                plan = get_plan(plan_id)
-                if not plan:
-                    continue
-                
-                # Get member and role
-                member = guild.get_member(int(user_id))
-                role = guild.get_role(int(plan["role_id"]))
+            # Get member and role
+            member = await members.get(guild, int(user_id))
+            role = guild.get_role(int(plan["role_id"]))
+            
+            # Remove role if member and role exist
+            if member and role:
+                try:
+                    await member.remove_roles(role, reason="Membership expired")
+                    print(f"🔴 Removed role {role.name} from {member.name} in {guild.name} (expired)")
+                except Exception as e:
+                    print(f"❌ Failed to remove role: {e}")
                 
-                # Remove role if member and role exist
-                if member and role:
-                    try:
-                        await member.remove_roles(role, reason="Membership expired")
-                        print(f"🔴 Removed role {role.name} from {member.name} in {guild.name} (expired)")
-                    except Exception as e:
-                        print(f"❌ Failed to remove role: {e}")
-                    
-                    # Send DM notification
+                # Send DM notification (once per membership period, whichever loop gets there)
+                if notifications.claim(MEMBERSHIP_EXPIRED, f"{guild_id}:{user_id}:{plan_id}", access_ends_at):
                     try:
                         await member.send(
                             f"⏰ **Membership Expired**\n\n"
@@ -288,10 +318,12 @@ class SubscriptionChecker(commands.Cog):
                         )
                         print(f"📨 Sent expiry DM to {member.name}")
                     except Exception as e:
+                        DM_FAILURES.inc(kind="membership_expired")
                         print(f"❌ Could not DM {member.name}: {e}")
-                
-                # Deactivate only THIS specific membership in database (supports multiple roles)
-                deactivate_membership(str(guild.id), str(user_id), plan_id)
+            
+            # Deactivate only THIS specific membership in database (supports multiple roles)
+            deactivate_membership(guild_id, str(user_id), plan_id)
+            EXPIRY_PROCESSED.inc(loop="membership_expiry")
 
     @warn_expiring_soon.before_loop
     async def before_warn_expiring(self):
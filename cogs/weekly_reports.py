@@ -1,13 +1,15 @@
+import asyncio
 import discord
 from discord.ext import commands, tasks
 from datetime import datetime, timedelta
 import os
-from openai import OpenAI
+from utils.sharding import owns_guild
+from utils.cluster import is_leader, still_leader
+from utils.admin_index import admin_index
 
 class WeeklyReportsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.openai = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
         self.weekly_report.start()
     
     async def cog_unload(self):
@@ -26,15 +28,29 @@ class WeeklyReportsCog(commands.Cog):
         if now.hour != 21:
             return
         
-        print(f"📊 Running weekly reports for {len(self.bot.guilds)} servers...")
+        # Singleton job - only the cluster leader sends reports
+        if not is_leader(self.bot):
+            return
+        
+        # Only the guilds owned by this process's shards
+        guilds = [g for g in self.bot.guilds if owns_guild(self.bot, g.id)]
+        print(f"📊 Running weekly reports for {len(guilds)} servers...")
+        
+        # MRR and forecasts for every guild in one vectorized pass
+        from utils.revenue import revenue_forecasts
+        forecasts = await asyncio.to_thread(revenue_forecasts, [g.id for g in guilds])
         
-        for guild in self.bot.guilds:
+        for guild in guilds:
+            # Fenced check per guild - stop if another node took over mid-run
+            if not still_leader(self.bot):
+                print("⚠️ Lost leadership during weekly reports - stopping")
+                return
             try:
-                await self.send_weekly_report(guild)
+                await self.send_weekly_report(guild, forecasts.get(str(guild.id)))
             except Exception as e:
                 print(f"❌ Failed to send weekly report for {guild.name}: {e}")
     
-    async def send_weekly_report(self, guild: discord.Guild):
+    async def send_weekly_report(self, guild: discord.Guild, forecast: dict = None):
         """Generate and send weekly report for a specific server"""
         from database import (
             total_guild_revenue, 
@@ -46,8 +62,14 @@ class WeeklyReportsCog(commands.Cog):
             get_revenue_by_day
         )
         from utils.charts import generate_revenue_growth_chart, generate_role_breakdown_chart
+        from utils.revenue import revenue_forecasts, format_forecast
+        from utils.cohorts import cohort_report, format_retention
         
         guild_id = str(guild.id)
+        if forecast is None:
+            forecast = (await asyncio.to_thread(revenue_forecasts, [guild_id]))[guild_id]
+        cohorts = await asyncio.to_thread(cohort_report, guild_id)
+        plan_names = {p[0]: p[2] for p in list_role_plans(guild_id, only_active=False, include_deleted=True)}
         
         # Get comprehensive server stats (same as /growth command)
         total_revenue = total_guild_revenue(guild_id)
@@ -144,6 +166,18 @@ class WeeklyReportsCog(commands.Cog):
             inline=False
         )
         
+        embed.add_field(
+            name="📊 MRR & Forecast",
+            value=format_forecast(forecast),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="🔁 Retention by First-Purchase Month",
+            value=format_retention(cohorts, plan_names),
+            inline=False
+        )
+        
         # Top performing plans
         if role_breakdown:
             role_revenue_text = "\n".join([
@@ -184,13 +218,12 @@ class WeeklyReportsCog(commands.Cog):
         
         # Send to all admins
         admin_count = 0
-        for member in guild.members:
-            if member.guild_permissions.administrator and not member.bot:
-                try:
-                    await member.send(embed=embed)
-                    admin_count += 1
-                except:
-                    pass  # Can't DM this admin
+        for member in await admin_index.admin_members(guild):
+            try:
+                await member.send(embed=embed)
+                admin_count += 1
+            except:
+                pass  # Can't DM this admin
         
         print(f"✅ Sent weekly report to {admin_count} admins in {guild.name}")
     
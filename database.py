@@ -1,21 +1,117 @@
 # database.py
 import sqlite3
 import os
+import re
 from datetime import datetime, timedelta
 
+import database_pg
+from database_writer import SQLiteWriter
+from utils.metrics import timed
+from utils import dbprofile
+
 # Get database name from environment variable (stored in Secrets)
 DB_NAME = os.getenv("DB_NAME", "database.db")
-print(f"🗄️ Using database: {DB_NAME}")
 
-def _conn():
-    return sqlite3.connect(DB_NAME)
+# Storage backend: SQLite file by default, PostgreSQL when DATABASE_URL is a postgres URL.
+# All helpers below use sqlite3-style SQL; database_pg adapts it for Postgres.
+DB_BACKEND = "postgres" if database_pg.is_postgres_url(database_pg.DATABASE_URL) else "sqlite"
+if DB_BACKEND == "postgres":
+    print("🗄️ Using database: PostgreSQL (DATABASE_URL)")
+else:
+    print(f"🗄️ Using database: {DB_NAME}")
 
-def init_db():
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER is 999 on older builds
+IN_CHUNK_SIZE = 500
+
+# How long a SQLite connection waits on a locked database before failing
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Route hot-path writes through one writer thread with group commit (SQLite only)
+WRITE_QUEUE_ENABLED = os.getenv("DB_WRITE_QUEUE", "1") == "1"
+WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", "64"))
+# Closed payments and ended memberships older than this move to monthly archive tables
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+
+_writer = SQLiteWriter(DB_NAME, BUSY_TIMEOUT_MS, WRITE_BATCH_MAX)
+
+def _conn():
+    if DB_BACKEND == "postgres":
+        conn = database_pg.connect()
+    else:
+        conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000)
+        # Safe with WAL: a crash can lose the last commits but never corrupts the file
+        conn.execute("PRAGMA synchronous = NORMAL")
+    if dbprofile.is_enabled():
+        conn = dbprofile.wrap_connection(conn)
+    return conn
+
+def _helper(fn):
+    """Instrumentation for public helpers: latency metrics + profiler attribution"""
+    return timed(dbprofile.profiled(fn))
+
+def _write(fn, *args, **kwargs):
+    """Run fn(cursor, *args, **kwargs) as a write and return its result.
+
+    SQLite: queued to the single writer thread and group-committed with other writes.
+    Postgres (or DB_WRITE_QUEUE=0): own connection and transaction.
+    """
+    if DB_BACKEND == "sqlite" and WRITE_QUEUE_ENABLED:
+        if dbprofile.is_enabled():
+            fn = dbprofile.wrap_job(fn)
+        return _writer.submit(fn, *args, **kwargs).result()
     conn = _conn()
-    c = conn.cursor()
+    try:
+        c = conn.cursor()
+        if DB_BACKEND == "sqlite":
+            # Take the write lock up front, like the writer thread does
+            conn.isolation_level = None
+            c.execute("BEGIN IMMEDIATE")
+        result = fn(c, *args, **kwargs)
+        conn.commit()
+        return result
+    finally:
+        conn.close()
 
-    # Enable foreign keys
-    c.execute("PRAGMA foreign_keys = ON")
+def _chunks(items, size: int = IN_CHUNK_SIZE):
+    """Split a list into chunks small enough for a `guild_id IN (...)` clause"""
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _placeholders(items):
+    return ",".join("?" * len(items))
+
+# ---------- SCHEMA MIGRATIONS ----------
+# Ordered and append-only: never edit a migration that has shipped, add a new one.
+# schema_version records what has been applied, so a warm boot is a single
+# SELECT instead of re-running every CREATE TABLE / PRAGMA table_info.
+
+# Arbitrary constant: Postgres advisory lock held while migrating
+MIGRATION_LOCK_ID = 72_301_001
+ARCHIVE_LOCK_ID = 72_301_002
+
+# {table: set(columns)} - filled on first look, kept current by _add_column
+_column_cache = {}
+
+def _table_columns(c, table: str):
+    columns = _column_cache.get(table)
+    if columns is None:
+        c.execute(f"PRAGMA table_info({table})")
+        columns = {row[1] for row in c.fetchall()}
+        if not columns:
+            return columns  # table doesn't exist yet - don't cache that
+        _column_cache[table] = columns
+    return columns
+
+def _add_column(c, table: str, column: str, decl: str):
+    if column not in _table_columns(c, table):
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        _column_cache[table].add(column)
+
+def _m001_baseline(c):
+    if DB_BACKEND == "postgres":
+        for stmt in database_pg.SCHEMA:
+            c.execute(stmt)
+        return
 
     c.execute("""
     CREATE TABLE IF NOT EXISTS subscriptions (
@@ -27,7 +123,6 @@ def init_db():
         status TEXT
     )
     """)
-
     # Guild configuration (per server)
     c.execute("""
     CREATE TABLE IF NOT EXISTS guild_config (
@@ -55,22 +150,15 @@ def init_db():
     """)
     
     # Add description column if it doesn't exist (for existing databases)
-    c.execute("PRAGMA table_info(role_plans)")
-    role_plan_columns = [row[1] for row in c.fetchall()]
-    if 'description' not in role_plan_columns:
-        c.execute("ALTER TABLE role_plans ADD COLUMN description TEXT DEFAULT ''")
+    _add_column(c, "role_plans", "description", "TEXT DEFAULT ''")
     
     # Add deleted_at column if it doesn't exist (for soft-delete support)
-    if 'deleted_at' not in role_plan_columns:
-        c.execute("ALTER TABLE role_plans ADD COLUMN deleted_at TEXT DEFAULT NULL")
+    _add_column(c, "role_plans", "deleted_at", "TEXT DEFAULT NULL")
 
     # Check if users table exists and has the correct schema
-    c.execute("PRAGMA table_info(users)")
-    columns = [row[1] for row in c.fetchall()]
-
-    if 'guild_id' not in columns and columns:
+    if _table_columns(c, "users"):
         # Old schema detected, migrate data
-        c.execute("ALTER TABLE users ADD COLUMN guild_id TEXT DEFAULT 'default'")
+        _add_column(c, "users", "guild_id", "TEXT DEFAULT 'default'")
 
     # Users with new schema
     c.execute("""
@@ -161,10 +249,248 @@ def init_db():
     )
     """)
 
-    conn.commit()
-    conn.close()
+def _m002_cluster_leases(c):
+    # Cluster leases (leader election between bot processes sharing this DB)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS cluster_leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT,
+        token INTEGER DEFAULT 0,
+        expires_at TEXT
+    )
+    """)
+
+    # Row-level claims so only one process works on an expired membership
+    _add_column(c, "memberships", "claimed_by", "TEXT DEFAULT NULL")
+    _add_column(c, "memberships", "claim_expires_at", "TEXT DEFAULT NULL")
+
+def _m003_bot_meta(c):
+    # Small key/value store for bot state (e.g. hash of the synced slash command tree)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS bot_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TEXT
+    )
+    """)
+
+def _m004_leaders_current_schema(c):
+    # Very old databases have leaders(leader_id, leader_name, commission_rate, balance).
+    # Bring them to the current columns once, so the legacy helpers don't have to
+    # inspect the table on every call.
+    columns = _table_columns(c, "leaders")
+    _add_column(c, "leaders", "guild_id", "TEXT DEFAULT 'default'")
+    if "balance_mnt" not in columns:
+        _add_column(c, "leaders", "balance_mnt", "INTEGER DEFAULT 0")
+        if "balance" in columns:
+            c.execute("UPDATE leaders SET balance_mnt = COALESCE(balance, 0)")
+
+def _m005_payments_user_plan_index(c):
+    # Pending-invoice reuse and /verifypayment look up a user's latest payments
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_payments_user_plan
+                 ON payments (guild_id, user_id, plan_id, created_at)""")
+
+def _m006_payments_sender_invoice_no(c):
+    # Our own invoice number sent to QPay (utils.ids snowflake), for reconciliation
+    _add_column(c, "payments", "sender_invoice_no", "TEXT DEFAULT NULL")
+
+def _m007_archive(c):
+    # Registry of monthly archive tables (payments_archive_YYYYMM, memberships_archive_YYYYMM)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS archive_partitions (
+        table_name TEXT PRIMARY KEY,
+        source TEXT,
+        month TEXT,
+        row_count INTEGER DEFAULT 0,
+        archived_at TEXT
+    )
+    """)
+    # All-time paid totals of archived payments, so all-time stats never scan the archives
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS payments_archive_totals (
+        guild_id TEXT,
+        plan_id INTEGER,
+        user_id TEXT,
+        payments INTEGER DEFAULT 0,
+        amount_mnt INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, plan_id, user_id)
+    )
+    """)
+
+def _m008_unique_memberships(c):
+    # One row per (guild, user, plan) so grants can upsert. Rebuild the table keeping,
+    # per key, the active row that runs longest (else the latest-ending inactive one).
+    c.execute("""
+    CREATE TABLE memberships_new (
+        guild_id TEXT,
+        user_id TEXT,
+        plan_id INTEGER,
+        active INTEGER,
+        access_ends_at TEXT,
+        last_payment_id TEXT,
+        claimed_by TEXT DEFAULT NULL,
+        claim_expires_at TEXT DEFAULT NULL,
+        UNIQUE (guild_id, user_id, plan_id)
+    )
+    """)
+    cols = "guild_id, user_id, plan_id, active, access_ends_at, last_payment_id, claimed_by, claim_expires_at"
+    c.execute(f"""INSERT INTO memberships_new ({cols})
+                  SELECT {cols} FROM memberships
+                  WHERE 1=1
+                  ORDER BY active DESC, access_ends_at DESC
+                  ON CONFLICT (guild_id, user_id, plan_id) DO NOTHING""")
+    c.execute("SELECT (SELECT COUNT(*) FROM memberships) - (SELECT COUNT(*) FROM memberships_new)")
+    dropped = c.fetchone()[0]
+    if dropped:
+        print(f"🗄️ Merged {dropped} duplicate membership rows")
+    c.execute("DROP TABLE memberships")
+    c.execute("ALTER TABLE memberships_new RENAME TO memberships")
+    _column_cache.pop("memberships", None)
+
+def _m009_membership_events(c):
+    # Append-only history of grants and expiries (memberships only keeps the latest state)
+    key = "id BIGSERIAL PRIMARY KEY" if DB_BACKEND == "postgres" else "id INTEGER PRIMARY KEY AUTOINCREMENT"
+    c.execute(f"""
+    CREATE TABLE IF NOT EXISTS membership_events (
+        {key},
+        guild_id TEXT,
+        user_id TEXT,
+        plan_id INTEGER,
+        kind TEXT,
+        occurred_at TEXT,
+        access_ends_at TEXT,
+        payment_id TEXT
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_membership_events_guild ON membership_events (guild_id, id)")
+
+    # Backfill from paid payments. A payment is a renewal when it lands before the
+    # previous one's period ran out; stacked periods are not replayed, so this is
+    # approximate for members who paid far ahead.
+    ends = _add_days_sql("p.paid_at", "rp.duration_days")
+    c.execute(f"""
+    INSERT INTO membership_events (guild_id, user_id, plan_id, kind, occurred_at, access_ends_at, payment_id)
+    SELECT guild_id, user_id, plan_id,
+           CASE WHEN prev_ends IS NULL THEN 'new' WHEN prev_ends >= paid_at THEN 'renewal' ELSE 'return' END,
+           paid_at, ends, payment_id
+    FROM (
+        SELECT p.guild_id, p.user_id, p.plan_id, p.paid_at, p.payment_id, {ends} AS ends,
+               LAG({ends}) OVER (PARTITION BY p.guild_id, p.user_id, p.plan_id ORDER BY p.paid_at) AS prev_ends
+        FROM {_with_archives(c, "payments")} p
+        JOIN role_plans rp ON rp.plan_id = p.plan_id
+        WHERE p.status = 'paid' AND p.paid_at IS NOT NULL
+    ) grants
+    ORDER BY paid_at
+    """)
+    c.execute("""
+    INSERT INTO membership_events (guild_id, user_id, plan_id, kind, occurred_at, access_ends_at, payment_id)
+    SELECT guild_id, user_id, plan_id, 'expire', access_ends_at, access_ends_at, last_payment_id
+    FROM memberships WHERE active = 0 AND access_ends_at IS NOT NULL
+    ORDER BY access_ends_at
+    """)
+
+def _m010_notifications_sent(c):
+    # One row per notification sent, so restarts and other processes don't send it again.
+    # window_key scopes it, e.g. the expiry date it warned about ("window" is reserved in Postgres)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS notifications_sent (
+        kind TEXT,
+        target TEXT,
+        window_key TEXT,
+        sent_at TEXT,
+        PRIMARY KEY (kind, target, window_key)
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notifications_sent_at ON notifications_sent (sent_at)")
+
+def _m011_membership_events_member_index(c):
+    # Grants look up a member's history once the live row has been archived
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_membership_events_member
+                 ON membership_events (guild_id, user_id, plan_id)""")
+
+def _m012_memberships_last_grant_kind(c):
+    # Set by the grant upsert from the row's previous state and read back with RETURNING,
+    # so a grant is one statement instead of select-upsert-select
+    _add_column(c, "memberships", "last_grant_kind", "TEXT")
+
+MIGRATIONS = [
+    (1, "baseline", _m001_baseline),
+    (2, "cluster_leases", _m002_cluster_leases),
+    (3, "bot_meta", _m003_bot_meta),
+    (4, "leaders_current_schema", _m004_leaders_current_schema),
+    (5, "payments_user_plan_index", _m005_payments_user_plan_index),
+    (6, "payments_sender_invoice_no", _m006_payments_sender_invoice_no),
+    (7, "archive", _m007_archive),
+    (8, "unique_memberships", _m008_unique_memberships),
+    (9, "membership_events", _m009_membership_events),
+    (10, "notifications_sent", _m010_notifications_sent),
+    (11, "membership_events_member_index", _m011_membership_events_member_index),
+    (12, "memberships_last_grant_kind", _m012_memberships_last_grant_kind),
+]
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def _schema_version(conn):
+    c = conn.cursor()
+    try:
+        c.execute("SELECT MAX(version) FROM schema_version")
+        row = c.fetchone()
+    except Exception:
+        # schema_version doesn't exist yet: brand-new database or pre-migrations install
+        conn.rollback()
+        return 0
+    return (row[0] or 0) if row else 0
+
+def _migrate(conn):
+    c = conn.cursor()
+    if DB_BACKEND == "sqlite":
+        # WAL: readers no longer block the writer (and vice versa). Persistent, and
+        # can't be switched inside a transaction, so set before BEGIN.
+        c.execute("PRAGMA journal_mode = WAL")
+        c.execute("PRAGMA foreign_keys = ON")
+        # Take the write lock so two processes booting together migrate one at a time
+        conn.isolation_level = None
+        c.execute("BEGIN IMMEDIATE")
+    else:
+        c.execute("SELECT pg_advisory_xact_lock(?)", (MIGRATION_LOCK_ID,))
+
+    try:
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TEXT
+        )
+        """)
+        # Re-read under the lock - another process may have just migrated
+        c.execute("SELECT version FROM schema_version")
+        applied = {row[0] for row in c.fetchall()}
+
+        for version, name, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+            migrate(c)
+            c.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?,?,?)",
+                      (version, name, datetime.utcnow().isoformat()))
+            print(f"🗄️ Applied migration {version:03d}_{name}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        _column_cache.clear()
+        raise
+
+@_helper
+def init_db():
+    """Bring the schema up to date. On a warm boot this is one version query."""
+    conn = _conn()
+    try:
+        if _schema_version(conn) >= LATEST_SCHEMA_VERSION:
+            return
+        _migrate(conn)
+    finally:
+        conn.close()
 
 # ---------- GUILD CONFIG ----------
+@_helper
 def set_guild_config(guild_id: str, sales_channel_id: str|None, commission_rate: float|None = None):
     now = datetime.utcnow().isoformat()
     conn = _conn(); c = conn.cursor()
@@ -182,6 +508,7 @@ def set_guild_config(guild_id: str, sales_channel_id: str|None, commission_rate:
                   (guild_id, sales_channel_id, commission_rate or 0.10, now, now))
     conn.commit(); conn.close()
 
+@_helper
 def get_guild_config(guild_id: str):
     conn = _conn(); c = conn.cursor()
     c.execute("SELECT guild_id, sales_channel_id, commission_rate FROM guild_config WHERE guild_id=?", (guild_id,))
@@ -190,6 +517,7 @@ def get_guild_config(guild_id: str):
     return {"guild_id": row[0], "sales_channel_id": row[1], "commission_rate": row[2]}
 
 # ---------- ROLE PLANS ----------
+@_helper
 def add_role_plan(guild_id: str, role_id: str, role_name: str, price_mnt: int, duration_days: int, description: str = ""):
     conn = _conn(); c = conn.cursor()
     c.execute("""INSERT INTO role_plans (guild_id, role_id, role_name, price_mnt, duration_days, active, description)
@@ -199,6 +527,7 @@ def add_role_plan(guild_id: str, role_id: str, role_name: str, price_mnt: int, d
     conn.commit(); conn.close()
     return plan_id
 
+@_helper
 def list_role_plans(guild_id: str, only_active=True, include_deleted=False):
     """List role plans for a guild
     
@@ -234,17 +563,20 @@ def list_role_plans(guild_id: str, only_active=True, include_deleted=False):
     rows = c.fetchall(); conn.close()
     return rows
 
+@_helper
 def update_plan_description(plan_id: int, description: str):
     """Update the description of a role plan"""
     conn = _conn(); c = conn.cursor()
     c.execute("UPDATE role_plans SET description=? WHERE plan_id=?", (description, plan_id))
     conn.commit(); conn.close()
 
+@_helper
 def toggle_role_plan(plan_id: int, active: int):
     conn = _conn(); c = conn.cursor()
     c.execute("UPDATE role_plans SET active=? WHERE plan_id=?", (active, plan_id))
     conn.commit(); conn.close()
 
+@_helper
 def delete_role_plan(plan_id: int):
     """Soft-delete a role plan (mark as deleted but preserve historical data)"""
     conn = _conn(); c = conn.cursor()
@@ -267,6 +599,7 @@ def delete_role_plan(plan_id: int):
     conn.close()
     return True  # Successfully soft-deleted
 
+@_helper
 def get_plan(plan_id: int):
     conn = _conn(); c = conn.cursor()
     c.execute("""SELECT plan_id, guild_id, role_id, role_name, price_mnt, duration_days, active, description, deleted_at
@@ -278,28 +611,42 @@ def get_plan(plan_id: int):
             "deleted_at": row[8]}
 
 # ---------- USERS ----------
-def upsert_user(guild_id: str, user_id: str, username: str):
-    conn = _conn(); c = conn.cursor()
-    c.execute("""INSERT OR REPLACE INTO users (user_id, guild_id, username) VALUES (?,?,?)""",
+def _upsert_user(c, guild_id: str, user_id: str, username: str):
+    c.execute("""INSERT INTO users (user_id, guild_id, username) VALUES (?,?,?)
+                 ON CONFLICT(user_id, guild_id) DO UPDATE SET username=excluded.username""",
               (user_id, guild_id, username))
-    conn.commit(); conn.close()
+
+@_helper
+def upsert_user(guild_id: str, user_id: str, username: str):
+    _write(_upsert_user, guild_id, user_id, username)
 
 # ---------- PAYMENTS (REAL QPAY) ----------
-def create_payment(payment_id: str, guild_id: str, user_id: str, plan_id: int, amount_mnt: int, short_url: str):
+def _create_payment(c, payment_id: str, guild_id: str, user_id: str, plan_id: int, amount_mnt: int, short_url: str,
+                    sender_invoice_no: str = None):
     now = datetime.utcnow().isoformat()
-    conn = _conn(); c = conn.cursor()
-    c.execute("""INSERT OR REPLACE INTO payments
-                 (payment_id, guild_id, user_id, plan_id, amount_mnt, status, short_url, created_at)
-                 VALUES (?,?,?,?,?,'pending',?,?)""",
-              (payment_id, guild_id, user_id, plan_id, amount_mnt, short_url, now))
-    conn.commit(); conn.close()
-
-def mark_payment_paid(payment_id: str):
+    c.execute("""INSERT INTO payments
+                 (payment_id, guild_id, user_id, plan_id, amount_mnt, status, short_url, created_at, sender_invoice_no)
+                 VALUES (?,?,?,?,?,'pending',?,?,?)
+                 ON CONFLICT(payment_id) DO UPDATE SET
+                     guild_id=excluded.guild_id, user_id=excluded.user_id, plan_id=excluded.plan_id,
+                     amount_mnt=excluded.amount_mnt, status='pending', short_url=excluded.short_url,
+                     created_at=excluded.created_at, paid_at=NULL, sender_invoice_no=excluded.sender_invoice_no""",
+              (payment_id, guild_id, user_id, plan_id, amount_mnt, short_url, now, sender_invoice_no))
+
+@_helper
+def create_payment(payment_id: str, guild_id: str, user_id: str, plan_id: int, amount_mnt: int, short_url: str,
+                   sender_invoice_no: str = None):
+    _write(_create_payment, payment_id, guild_id, user_id, plan_id, amount_mnt, short_url, sender_invoice_no)
+
+def _mark_payment_paid(c, payment_id: str):
     now = datetime.utcnow().isoformat()
-    conn = _conn(); c = conn.cursor()
     c.execute("UPDATE payments SET status='paid', paid_at=? WHERE payment_id=?", (now, payment_id))
-    conn.commit(); conn.close()
 
+@_helper
+def mark_payment_paid(payment_id: str):
+    _write(_mark_payment_paid, payment_id)
+
+@_helper
 def get_payment(payment_id: str):
     conn = _conn(); c = conn.cursor()
     c.execute("""SELECT payment_id, guild_id, user_id, plan_id, amount_mnt, status, short_url, created_at, paid_at
@@ -307,6 +654,7 @@ def get_payment(payment_id: str):
     row = c.fetchone(); conn.close()
     return row
 
+@_helper
 def get_payment_by_user(guild_id: str, user_id: str):
     """Get user's most recent payment (for verify payment command)"""
     conn = _conn(); c = conn.cursor()
@@ -318,47 +666,173 @@ def get_payment_by_user(guild_id: str, user_id: str):
     row = c.fetchone(); conn.close()
     return row
 
+@_helper
+def get_reusable_payment(guild_id: str, user_id: str, plan_id: int, amount_mnt: int, max_age_minutes: int):
+    """Newest pending payment for this user+plan created within max_age_minutes at the
+    current price, so a repeat click can reuse its invoice instead of creating another"""
+    since = (datetime.utcnow() - timedelta(minutes=max_age_minutes)).isoformat()
+    conn = _conn(); c = conn.cursor()
+    c.execute("""SELECT payment_id, short_url, created_at
+                 FROM payments
+                 WHERE guild_id=? AND user_id=? AND plan_id=? AND status='pending'
+                   AND amount_mnt=? AND created_at >= ?
+                 ORDER BY created_at DESC
+                 LIMIT 1""", (guild_id, user_id, plan_id, amount_mnt, since))
+    row = c.fetchone(); conn.close()
+    return row
+
 # ---------- MEMBERSHIPS ----------
+def _ts(dt: datetime) -> str:
+    """access_ends_at and friends as stored: ISO text, always with microseconds, so
+    string comparisons never mix formats (isoformat() drops a zero fraction)"""
+    return dt.isoformat(timespec="microseconds")
+
+def _add_days_sql(column: str, days: str = "?") -> str:
+    """SQL for `column` (ISO text) plus `days` (a parameter by default), as ISO text
+    in the _ts format"""
+    if DB_BACKEND == "postgres":
+        return f"""to_char({column}::timestamp + make_interval(days => {days}), 'YYYY-MM-DD"T"HH24:MI:SS.US')"""
+    # strftime's %f is milliseconds: add whole days to the seconds and carry the
+    # fraction over as text, padded to 6 digits
+    return (f"strftime('%Y-%m-%dT%H:%M:%S', {column}, '+' || {days} || ' days') || '.' || "
+            f"substr(substr({column}, 21) || '000000', 1, 6)")
+
+# One upsert on (guild_id, user_id, plan_id): a running membership is extended from
+# its current end, a new/expired/deactivated one starts from now. last_grant_kind says
+# which, from the row as it was: renewal (still running), return (lapsed, or archived
+# but in membership_events) or new.
+# Params: guild_id, user_id, plan_id, now + days, last_payment_id, guild_id, user_id, plan_id,
+#         now, now, days
+_GRANT_SQL = f"""INSERT INTO memberships (guild_id, user_id, plan_id, active, access_ends_at, last_payment_id,
+                                         last_grant_kind)
+                 VALUES (?,?,?,1,?,?, CASE WHEN EXISTS (SELECT 1 FROM membership_events
+                                                        WHERE guild_id=? AND user_id=? AND plan_id=?)
+                                           THEN 'return' ELSE 'new' END)
+                 ON CONFLICT (guild_id, user_id, plan_id) DO UPDATE SET
+                     last_grant_kind = CASE
+                         WHEN memberships.active = 1 AND memberships.access_ends_at > ?
+                         THEN 'renewal' ELSE 'return' END,
+                     access_ends_at = CASE
+                         WHEN memberships.active = 1 AND memberships.access_ends_at > ?
+                         THEN {_add_days_sql("memberships.access_ends_at")}
+                         ELSE excluded.access_ends_at END,
+                     active = 1,
+                     last_payment_id = excluded.last_payment_id,
+                     claimed_by = NULL,
+                     claim_expires_at = NULL"""
+
+# Imports from other bots carry an exact end date instead of a duration
+_SET_ENDS_SQL = """INSERT INTO memberships (guild_id, user_id, plan_id, active, access_ends_at, last_payment_id)
+                   VALUES (?,?,?,1,?,?)
+                   ON CONFLICT (guild_id, user_id, plan_id) DO UPDATE SET
+                       access_ends_at = excluded.access_ends_at,
+                       active = 1,
+                       last_payment_id = excluded.last_payment_id,
+                       claimed_by = NULL,
+                       claim_expires_at = NULL"""
+
+# History row for a membership as it is right now (run after the upsert)
+# Params: kind, now, guild_id, user_id, plan_id
+_EVENT_SQL = """INSERT INTO membership_events (guild_id, user_id, plan_id, kind, occurred_at, access_ends_at, payment_id)
+                SELECT guild_id, user_id, plan_id, ?, ?, access_ends_at, last_payment_id
+                FROM memberships WHERE guild_id=? AND user_id=? AND plan_id=?"""
+
+def _grant_params(guild_id: str, user_id: str, plan_id: int, days: int, last_payment_id: str, now: datetime):
+    return (guild_id, user_id, plan_id, _ts(now + timedelta(days=days)), last_payment_id,
+            guild_id, user_id, plan_id, _ts(now), _ts(now), days)
+
+def _grant_membership(c, guild_id: str, user_id: str, plan_id: int, duration_days: int, last_payment_id: str):
+    now = datetime.utcnow()
+    c.execute(_GRANT_SQL + " RETURNING access_ends_at, last_grant_kind",
+              _grant_params(guild_id, user_id, plan_id, duration_days, last_payment_id, now))
+    ends, kind = c.fetchone()
+    c.execute("""INSERT INTO membership_events
+                 (guild_id, user_id, plan_id, kind, occurred_at, access_ends_at, payment_id)
+                 VALUES (?,?,?,?,?,?,?)""",
+              (guild_id, user_id, plan_id, kind, _ts(now), ends, last_payment_id))
+    return ends
+
+@_helper
 def grant_membership(guild_id: str, user_id: str, plan_id: int, duration_days: int, last_payment_id: str):
-    conn = _conn(); c = conn.cursor()
-    
-    # Check if user has existing active membership for this plan
-    c.execute("""SELECT access_ends_at FROM memberships
-                 WHERE guild_id=? AND user_id=? AND plan_id=? AND active=1""",
-              (guild_id, user_id, plan_id))
-    existing = c.fetchone()
-    
+    return _write(_grant_membership, guild_id, user_id, plan_id, duration_days, last_payment_id)
+
+def _bulk_memberships(c, guild_id: str, rows, source: str):
     now = datetime.utcnow()
-    
-    if existing:
-        # User has active membership - extend it from existing end date
-        existing_end = datetime.fromisoformat(existing[0])
-        
-        # If existing membership hasn't expired yet, add to it
-        if existing_end > now:
-            new_end = existing_end + timedelta(days=duration_days)
+    grants, imports = [], []
+    for user_id, plan_id, days, ends_at in rows:
+        if ends_at:
+            imports.append((guild_id, user_id, plan_id, _ts(datetime.fromisoformat(ends_at)), source))
         else:
-            # Expired membership - start from now
-            new_end = now + timedelta(days=duration_days)
-        
-        ends = new_end.isoformat()
-        
-        # Update existing membership
-        c.execute("""UPDATE memberships 
-                     SET access_ends_at=?, last_payment_id=?
-                     WHERE guild_id=? AND user_id=? AND plan_id=? AND active=1""",
-                  (ends, last_payment_id, guild_id, user_id, plan_id))
+            grants.append(_grant_params(guild_id, user_id, plan_id, days, source, now))
+    if grants:
+        c.executemany(_GRANT_SQL, grants)
+    if imports:
+        c.executemany(_SET_ENDS_SQL, imports)
+    # Imports are history from elsewhere, not purchases: recorded, but they start no cohort
+    c.executemany(_EVENT_SQL, [("import", _ts(now), guild_id, row[0], row[1]) for row in rows])
+    return len(grants) + len(imports)
+
+@_helper
+def bulk_upsert_memberships(guild_id: str, rows, source: str, chunk_size: int = IN_CHUNK_SIZE):
+    """Apply (user_id, plan_id, days, ends_at) rows: with ends_at the membership ends
+    exactly then, otherwise `days` are added like a purchase. One transaction per
+    chunk, so a big import never holds the writer for long. Returns rows applied."""
+    applied = 0
+    for chunk in _chunks(rows, chunk_size):
+        applied += _write(_bulk_memberships, guild_id, chunk, source)
+    return applied
+
+def _confirm_payment(c, invoice_id: str):
+    # Payment + plan in one read (the writer holds the write lock, so this can't go stale)
+    c.execute("""SELECT p.guild_id, p.user_id, p.plan_id, p.status,
+                        rp.plan_id, rp.guild_id, rp.role_id, rp.role_name, rp.price_mnt,
+                        rp.duration_days, rp.active, rp.description, rp.deleted_at
+                 FROM payments p LEFT JOIN role_plans rp ON rp.plan_id = p.plan_id
+                 WHERE p.payment_id=?""", (invoice_id,))
+    row = c.fetchone()
+    if not row:
+        return None
+
+    guild_id, user_id, plan_id, status = row[:4]
+    plan = None
+    if row[4] is not None:
+        plan = {"plan_id": row[4], "guild_id": row[5], "role_id": row[6], "role_name": row[7],
+                "price_mnt": row[8], "duration_days": row[9], "active": row[10], "description": row[11] or "",
+                "deleted_at": row[12]}
+    result = {"guild_id": guild_id, "user_id": user_id, "plan_id": plan_id, "plan": plan,
+              "status": status, "confirmed": False, "access_ends_at": None}
+    if not plan:
+        return result
+
+    # Compare-and-set: only the first confirmation flips pending -> paid
+    now = datetime.utcnow().isoformat()
+    c.execute("UPDATE payments SET status='paid', paid_at=? WHERE payment_id=? AND status='pending'",
+              (now, invoice_id))
+    if c.rowcount == 1:
+        result["confirmed"] = True
+        result["status"] = "paid"
+        result["access_ends_at"] = _grant_membership(c, guild_id, user_id, plan_id, plan["duration_days"], invoice_id)
     else:
-        # No existing membership for this plan - create new one from now
-        ends = (now + timedelta(days=duration_days)).isoformat()
-        
-        # Insert new membership (keep other active memberships)
-        c.execute("""INSERT INTO memberships (guild_id, user_id, plan_id, active, access_ends_at, last_payment_id)
-                     VALUES (?,?,?,?,?,?)""", (guild_id, user_id, plan_id, 1, ends, last_payment_id))
-    
-    conn.commit(); conn.close()
-    return ends
+        # Already confirmed earlier (another click, /verifypayment, ...) - report, don't extend again.
+        # By membership key, not last_payment_id: a later renewal replaces that.
+        c.execute("SELECT access_ends_at FROM memberships WHERE guild_id=? AND user_id=? AND plan_id=?",
+                  (guild_id, user_id, plan_id))
+        membership = c.fetchone()
+        result["access_ends_at"] = membership[0] if membership else None
+    return result
+
+@_helper
+def confirm_payment(invoice_id: str):
+    """Mark a QPay-paid invoice as paid and grant its membership in ONE transaction.
+
+    Idempotent: concurrent or repeated calls extend the membership only once.
+    Returns None if the payment doesn't exist, else a dict with
+    guild_id, user_id, plan_id, plan (get_plan-style dict or None), status,
+    confirmed (True only for the call that flipped pending -> paid) and access_ends_at.
+    """
+    return _write(_confirm_payment, invoice_id)
 
+@_helper
 def list_expired(guild_id: str):
     now = datetime.utcnow().isoformat()
     conn = _conn(); c = conn.cursor()
@@ -367,10 +841,58 @@ def list_expired(guild_id: str):
     rows = c.fetchall(); conn.close()
     return rows
 
-def deactivate_membership(guild_id: str, user_id: str, plan_id: int = None):
-    """Deactivate specific membership or all memberships for a user"""
+@_helper
+def list_expired_for_guilds(guild_ids):
+    """Expired-but-active memberships for many guilds at once (one query per chunk).
+
+    Used by the shard-aware expiry loops: guild_ids are the guilds owned by this shard.
+    Returns list of (guild_id, user_id, plan_id) tuples.
+    """
+    now = datetime.utcnow().isoformat()
+    rows = []
     conn = _conn(); c = conn.cursor()
-    
+    for chunk in _chunks(guild_ids):
+        c.execute(f"""SELECT guild_id, user_id, plan_id FROM memberships
+                     WHERE guild_id IN ({_placeholders(chunk)}) AND active=1 AND access_ends_at < ?""",
+                  (*chunk, now))
+        rows.extend(c.fetchall())
+    conn.close()
+    return rows
+
+@_helper
+def claim_expired_memberships(guild_ids, holder: str, ttl_seconds: int = 300):
+    """Claim expired memberships with a row-level lease, then return only OUR claims.
+
+    Several processes (or two loops in one process) can call this at the same time;
+    a row is handed out again only after its claim expires, e.g. if the holder crashed.
+    Returns list of (guild_id, user_id, plan_id, access_ends_at) tuples.
+    """
+    now = datetime.utcnow()
+    now_iso = now.isoformat()
+    # Unique per call, so the SELECT below only sees this batch
+    claim_until = (now + timedelta(seconds=ttl_seconds)).isoformat()
+    rows = []
+    conn = _conn(); c = conn.cursor()
+    for chunk in _chunks(guild_ids):
+        c.execute(f"""UPDATE memberships SET claimed_by=?, claim_expires_at=?
+                     WHERE guild_id IN ({_placeholders(chunk)}) AND active=1 AND access_ends_at < ?
+                     AND (claim_expires_at IS NULL OR claim_expires_at < ?)""",
+                  (holder, claim_until, *chunk, now_iso, now_iso))
+        conn.commit()
+        c.execute(f"""SELECT guild_id, user_id, plan_id, access_ends_at FROM memberships
+                     WHERE guild_id IN ({_placeholders(chunk)}) AND active=1
+                     AND claimed_by=? AND claim_expires_at=?""",
+                  (*chunk, holder, claim_until))
+        rows.extend(c.fetchall())
+    conn.close()
+    return rows
+
+def _deactivate_membership(c, guild_id: str, user_id: str, plan_id: int = None):
+    where, params = ("AND plan_id=?", (guild_id, user_id, plan_id)) if plan_id is not None else ("", (guild_id, user_id))
+    c.execute(f"""INSERT INTO membership_events (guild_id, user_id, plan_id, kind, occurred_at, access_ends_at, payment_id)
+                  SELECT guild_id, user_id, plan_id, 'expire', ?, access_ends_at, last_payment_id
+                  FROM memberships WHERE guild_id=? AND user_id=? AND active=1 {where}""",
+              (datetime.utcnow().isoformat(), *params))
     if plan_id is not None:
         # Deactivate only specific membership (for multiple role support)
         c.execute("""UPDATE memberships SET active=0 WHERE guild_id=? AND user_id=? AND plan_id=?""", 
@@ -378,9 +900,23 @@ def deactivate_membership(guild_id: str, user_id: str, plan_id: int = None):
     else:
         # Deactivate all memberships (legacy behavior)
         c.execute("""UPDATE memberships SET active=0 WHERE guild_id=? AND user_id=?""", (guild_id, user_id))
-    
-    conn.commit(); conn.close()
 
+@_helper
+def deactivate_membership(guild_id: str, user_id: str, plan_id: int = None):
+    """Deactivate specific membership or all memberships for a user"""
+    _write(_deactivate_membership, guild_id, user_id, plan_id)
+
+@_helper
+def get_membership_events(guild_id: str, after_id: int = 0, limit: int = 50000):
+    """(id, user_id, plan_id, kind, occurred_at, access_ends_at) events after after_id, oldest first"""
+    conn = _conn(); c = conn.cursor()
+    c.execute("""SELECT id, user_id, plan_id, kind, occurred_at, access_ends_at
+                 FROM membership_events WHERE guild_id=? AND id > ?
+                 ORDER BY id LIMIT ?""", (guild_id, after_id, limit))
+    rows = c.fetchall(); conn.close()
+    return rows
+
+@_helper
 def get_membership_by_invoice(invoice_id: str):
     conn = _conn(); c = conn.cursor()
     c.execute("""SELECT guild_id, user_id, plan_id, active, access_ends_at, last_payment_id
@@ -388,6 +924,7 @@ def get_membership_by_invoice(invoice_id: str):
     row = c.fetchone(); conn.close()
     return row
 
+@_helper
 def get_user_active_membership(guild_id: str, user_id: str):
     """Get ALL active memberships for a user (supports multiple roles)"""
     conn = _conn(); c = conn.cursor()
@@ -397,14 +934,16 @@ def get_user_active_membership(guild_id: str, user_id: str):
     return rows  # Returns list of (plan_id, access_ends_at) tuples
 
 # ---------- STATS ----------
+@_helper
 def guild_revenue_mnt(guild_id: str, days: int = 30):
     since = (datetime.utcnow() - timedelta(days=days)).isoformat()
     conn = _conn(); c = conn.cursor()
-    c.execute("""SELECT COALESCE(SUM(amount_mnt),0) FROM payments
-                 WHERE guild_id=? AND status='paid' AND created_at>=?""", (guild_id, since))
+    c.execute(f"""SELECT COALESCE(SUM(amount_mnt),0) FROM {_payments_from(c, since)}
+                  WHERE guild_id=? AND status='paid' AND created_at>=?""", (guild_id, since))
     amt = c.fetchone()[0] or 0
     conn.close(); return int(amt)
 
+@_helper
 def count_active_members(guild_id: str):
     """Count UNIQUE active members (not total memberships)"""
     conn = _conn(); c = conn.cursor()
@@ -414,107 +953,114 @@ def count_active_members(guild_id: str):
     conn.close(); return int(n)
 
 # ---------- SIMPLE LEGACY FUNCTIONS (for backward compatibility) ----------
+@_helper
 def add_user(user_id, username, leader_id=None, role_given=None):
     # Legacy function for simple bot commands
     conn = _conn(); c = conn.cursor()
     joined_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     # For legacy compatibility, use a default guild_id if not provided
-    c.execute("INSERT OR IGNORE INTO users (user_id, guild_id, username) VALUES (?, ?, ?)",
+    c.execute("INSERT INTO users (user_id, guild_id, username) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
               (user_id, "default", username))
     conn.commit(); conn.close()
 
+@_helper
 def add_leader(leader_id, leader_name, commission_rate=0.1):
     # Legacy function for simple bot commands
     conn = _conn(); c = conn.cursor()
-    # Check if the new schema exists
-    c.execute("PRAGMA table_info(leaders)")
-    columns = [row[1] for row in c.fetchall()]
-
-    if 'guild_id' in columns:
-        # New schema with guild_id
-        c.execute("INSERT OR IGNORE INTO leaders (leader_id, guild_id, leader_name, commission_rate, balance_mnt) VALUES (?, ?, ?, ?, ?)",
-                  (leader_id, "default", leader_name, commission_rate, 0))
-    else:
-        # Old schema without guild_id - use balance instead of balance_mnt
-        c.execute("INSERT OR IGNORE INTO leaders (leader_id, leader_name, commission_rate, balance) VALUES (?, ?, ?, ?)",
-                  (leader_id, leader_name, commission_rate, 0))
+    c.execute("INSERT INTO leaders (leader_id, guild_id, leader_name, commission_rate, balance_mnt) VALUES (?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+              (leader_id, "default", leader_name, commission_rate, 0))
     conn.commit(); conn.close()
 
+@_helper
 def add_payment(payment_id, user_id, amount, status="pending", leader_id=None):
     # Legacy function for simple bot commands
     conn = _conn(); c = conn.cursor()
     created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("INSERT OR IGNORE INTO payments (payment_id, guild_id, user_id, plan_id, amount_mnt, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    c.execute("INSERT INTO payments (payment_id, guild_id, user_id, plan_id, amount_mnt, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
               (payment_id, "default", user_id, 1, int(amount), status, created_at))
     conn.commit(); conn.close()
 
+@_helper
 def update_leader_balance(leader_id, amount):
     # Legacy function for simple bot commands
     conn = _conn(); c = conn.cursor()
-    # Check if the new schema exists
-    c.execute("PRAGMA table_info(leaders)")
-    columns = [row[1] for row in c.fetchall()]
-
-    if 'balance_mnt' in columns:
-        c.execute("UPDATE leaders SET balance_mnt = balance_mnt + ? WHERE leader_id = ?", (int(amount), leader_id))
-    else:
-        c.execute("UPDATE leaders SET balance = balance + ? WHERE leader_id = ?", (int(amount), leader_id))
+    c.execute("UPDATE leaders SET balance_mnt = balance_mnt + ? WHERE leader_id = ?", (int(amount), leader_id))
     conn.commit(); conn.close()
 
+@_helper
 def get_leader_balance(leader_id):
     # Legacy function for simple bot commands
     conn = _conn(); c = conn.cursor()
-    # Check if the new schema exists
-    c.execute("PRAGMA table_info(leaders)")
-    columns = [row[1] for row in c.fetchall()]
-
-    if 'balance_mnt' in columns:
-        c.execute("SELECT balance_mnt FROM leaders WHERE leader_id = ?", (leader_id,))
-    else:
-        c.execute("SELECT balance FROM leaders WHERE leader_id = ?", (leader_id,))
+    c.execute("SELECT balance_mnt FROM leaders WHERE leader_id = ?", (leader_id,))
     result = c.fetchone(); conn.close()
     return result[0] if result else 0
 
+@_helper
 def create_subscription(guild_id: str, plan_name: str, amount: int, invoice_id: str, expires_at: str):
     conn = _conn(); c = conn.cursor()
-    c.execute("""INSERT OR REPLACE INTO subscriptions
+    c.execute("""INSERT INTO subscriptions
                  (guild_id, plan_name, amount_mnt, invoice_id, expires_at, status)
-                 VALUES (?,?,?,?,?, 'pending')""",
+                 VALUES (?,?,?,?,?, 'pending')
+                 ON CONFLICT(guild_id) DO UPDATE SET
+                     plan_name=excluded.plan_name, amount_mnt=excluded.amount_mnt,
+                     invoice_id=excluded.invoice_id, expires_at=excluded.expires_at, status='pending'""",
               (guild_id, plan_name, amount, invoice_id, expires_at))
     conn.commit(); conn.close()
 
+@_helper
 def mark_subscription_paid(invoice_id: str):
     conn = _conn(); c = conn.cursor()
     c.execute("UPDATE subscriptions SET status='active' WHERE invoice_id=?", (invoice_id,))
     conn.commit(); conn.close()
 
+@_helper
 def get_subscription(guild_id: str):
     conn = _conn(); c = conn.cursor()
     c.execute("SELECT plan_name, amount_mnt, expires_at, status FROM subscriptions WHERE guild_id=?", (guild_id,))
     row = c.fetchone(); conn.close()
     return row
 
-def get_all_subscriptions():
+@_helper
+def get_all_subscriptions(guild_ids=None):
+    """Active subscriptions. Pass guild_ids to restrict to one shard's guilds."""
     conn = _conn(); c = conn.cursor()
-    c.execute("SELECT guild_id, expires_at FROM subscriptions WHERE status='active'")
-    rows = c.fetchall(); conn.close()
+    if guild_ids is None:
+        c.execute("SELECT guild_id, expires_at FROM subscriptions WHERE status='active'")
+        rows = c.fetchall()
+    else:
+        rows = []
+        for chunk in _chunks(guild_ids):
+            c.execute(f"""SELECT guild_id, expires_at FROM subscriptions
+                         WHERE guild_id IN ({_placeholders(chunk)}) AND status='active'""", chunk)
+            rows.extend(c.fetchall())
+    conn.close()
     return rows
 
-def get_subscriptions_expiring_soon(days: int = 3):
-    """Get subscriptions expiring within specified days"""
+@_helper
+def get_subscriptions_expiring_soon(days: int = 3, guild_ids=None):
+    """Get subscriptions expiring within specified days (optionally only for guild_ids)"""
     from datetime import datetime, timedelta
     now = datetime.utcnow()
     warning_time = (now + timedelta(days=days)).isoformat()
     conn = _conn(); c = conn.cursor()
-    c.execute("""
+    query = """
         SELECT guild_id, plan_name, expires_at, amount_mnt 
         FROM subscriptions 
         WHERE status='active' AND expires_at <= ? AND expires_at > ?
-    """, (warning_time, now.isoformat()))
-    rows = c.fetchall()
+    """
+    if guild_ids is None:
+        c.execute(query, (warning_time, now.isoformat()))
+        rows = c.fetchall()
+    else:
+        rows = []
+        for chunk in _chunks(guild_ids):
+            c.execute(query + f" AND guild_id IN ({_placeholders(chunk)})",
+                      (warning_time, now.isoformat(), *chunk))
+            rows.extend(c.fetchall())
     conn.close()
     return rows
 
+@_helper
 def renew_subscription_with_balance(guild_id: str, plan_name: str, duration_days: int, amount: int):
     """Renew subscription by deducting from collected balance. Returns (success, new_expiry, message)"""
     from datetime import datetime, timedelta
@@ -572,11 +1118,13 @@ def renew_subscription_with_balance(guild_id: str, plan_name: str, duration_days
     # because database.py doesn't have access to Discord bot instance
     return (True, new_expiry_str, f"Successfully renewed with collected balance. New expiry: {new_expiry_str[:10]}")
 
+@_helper
 def deactivate_subscription(guild_id: str):
     conn = _conn(); c = conn.cursor()
     c.execute("UPDATE subscriptions SET status='expired' WHERE guild_id=?", (guild_id,))
     conn.commit(); conn.close()
 
+@_helper
 def has_active_subscription(guild_id: str):
     """Check if guild has an active (paid and not expired) subscription"""
     from datetime import datetime
@@ -591,14 +1139,19 @@ def has_active_subscription(guild_id: str):
     conn.close()
     return bool(row)
 
+@_helper
 def total_guild_revenue(guild_id: str):
     """Get total all-time revenue for a guild"""
     conn = _conn(); c = conn.cursor()
-    c.execute("""SELECT COALESCE(SUM(amount_mnt),0) FROM payments
-                 WHERE guild_id=? AND status='paid'""", (guild_id,))
+    # Archived payments only count through their totals
+    c.execute("""SELECT (SELECT COALESCE(SUM(amount_mnt),0) FROM payments
+                         WHERE guild_id=? AND status='paid')
+                      + (SELECT COALESCE(SUM(amount_mnt),0) FROM payments_archive_totals
+                         WHERE guild_id=?)""", (guild_id, guild_id))
     amt = c.fetchone()[0] or 0
     conn.close(); return int(amt)
 
+@_helper
 def available_to_collect(guild_id: str):
     """Get available amount after deducting 3% fee and previous payouts"""
     gross = total_guild_revenue(guild_id)
@@ -613,6 +1166,7 @@ def available_to_collect(guild_id: str):
     
     return max(0, gross - fee - paid_out)
 
+@_helper
 def get_plans_breakdown(guild_id: str):
     """Get revenue breakdown by plan - shows all plans with active members (including deleted plans)"""
     conn = _conn(); c = conn.cursor()
@@ -622,7 +1176,9 @@ def get_plans_breakdown(guild_id: str):
             (SELECT COUNT(*) FROM memberships m 
              WHERE m.plan_id = rp.plan_id AND m.active = 1 AND m.guild_id = rp.guild_id) as members,
             (SELECT COALESCE(SUM(p.amount_mnt), 0) FROM payments p 
-             WHERE p.plan_id = rp.plan_id AND p.status = 'paid' AND p.guild_id = rp.guild_id) as revenue
+             WHERE p.plan_id = rp.plan_id AND p.status = 'paid' AND p.guild_id = rp.guild_id)
+            + (SELECT COALESCE(SUM(a.amount_mnt), 0) FROM payments_archive_totals a
+               WHERE a.plan_id = rp.plan_id AND a.guild_id = rp.guild_id) as revenue
         FROM role_plans rp
         WHERE rp.guild_id = ?
         AND (SELECT COUNT(*) FROM memberships m 
@@ -633,6 +1189,7 @@ def get_plans_breakdown(guild_id: str):
     conn.close()
     return rows
 
+@_helper
 def create_payout_record(guild_id: str, gross_mnt: int, fee_mnt: int, net_mnt: int, 
                         account_number: str, account_name: str, note: str = ""):
     """Create a new payout request"""
@@ -646,6 +1203,7 @@ def create_payout_record(guild_id: str, gross_mnt: int, fee_mnt: int, net_mnt: i
     conn.commit(); conn.close()
     return payout_id
 
+@_helper
 def get_payout(payout_id: int):
     """Get payout details by ID"""
     conn = _conn(); c = conn.cursor()
@@ -669,12 +1227,14 @@ def get_payout(payout_id: int):
         }
     return None
 
+@_helper
 def mark_payout_done(payout_id: int):
     """Mark a payout as completed"""
     conn = _conn(); c = conn.cursor()
     c.execute("UPDATE payouts SET status='done' WHERE id=?", (payout_id,))
     conn.commit(); conn.close()
 
+@_helper
 def get_top_members(guild_id: str, limit: int = 10):
     """Get top members by total amount spent across all plans"""
     conn = _conn(); c = conn.cursor()
@@ -682,29 +1242,37 @@ def get_top_members(guild_id: str, limit: int = 10):
         SELECT 
             p.user_id,
             u.username,
-            COUNT(DISTINCT p.payment_id) as total_payments,
+            SUM(p.payments) as total_payments,
             SUM(p.amount_mnt) as total_spent
-        FROM payments p
+        FROM (SELECT guild_id, user_id, COUNT(*) as payments, SUM(amount_mnt) as amount_mnt
+              FROM payments WHERE guild_id = ? AND status = 'paid'
+              GROUP BY guild_id, user_id
+              UNION ALL
+              SELECT guild_id, user_id, payments, amount_mnt
+              FROM payments_archive_totals WHERE guild_id = ?) p
         LEFT JOIN users u ON p.user_id = u.user_id AND p.guild_id = u.guild_id
-        WHERE p.guild_id = ? AND p.status = 'paid'
         GROUP BY p.user_id, u.username
         ORDER BY total_spent DESC
         LIMIT ?
-    """, (guild_id, limit))
+    """, (guild_id, guild_id, limit))
     rows = c.fetchall()
     conn.close()
     return rows
 
+@_helper
 def set_manager_role(guild_id: str, role_id: str, role_name: str):
     """Set the manager role for a guild (allows plan management without admin)"""
     now = datetime.utcnow().isoformat()
     conn = _conn(); c = conn.cursor()
-    c.execute("""INSERT OR REPLACE INTO manager_roles 
+    c.execute("""INSERT INTO manager_roles 
                  (guild_id, role_id, role_name, created_at)
-                 VALUES (?,?,?,?)""",
+                 VALUES (?,?,?,?)
+                 ON CONFLICT(guild_id) DO UPDATE SET
+                     role_id=excluded.role_id, role_name=excluded.role_name, created_at=excluded.created_at""",
               (guild_id, role_id, role_name, now))
     conn.commit(); conn.close()
 
+@_helper
 def get_manager_role(guild_id: str):
     """Get the manager role for a guild"""
     conn = _conn(); c = conn.cursor()
@@ -715,12 +1283,14 @@ def get_manager_role(guild_id: str):
         return {"role_id": row[0], "role_name": row[1]}
     return None
 
+@_helper
 def remove_manager_role(guild_id: str):
     """Remove the manager role for a guild"""
     conn = _conn(); c = conn.cursor()
     c.execute("DELETE FROM manager_roles WHERE guild_id=?", (guild_id,))
     conn.commit(); conn.close()
 
+@_helper
 def get_top_members_by_plan(guild_id: str, plan_id: int, limit: int = 5):
     """Get top members for a specific plan"""
     conn = _conn(); c = conn.cursor()
@@ -728,37 +1298,46 @@ def get_top_members_by_plan(guild_id: str, plan_id: int, limit: int = 5):
         SELECT 
             p.user_id,
             u.username,
-            COUNT(DISTINCT p.payment_id) as purchases,
+            SUM(p.payments) as purchases,
             SUM(p.amount_mnt) as total_spent
-        FROM payments p
+        FROM (SELECT guild_id, user_id, COUNT(*) as payments, SUM(amount_mnt) as amount_mnt
+              FROM payments WHERE guild_id = ? AND plan_id = ? AND status = 'paid'
+              GROUP BY guild_id, user_id
+              UNION ALL
+              SELECT guild_id, user_id, payments, amount_mnt
+              FROM payments_archive_totals WHERE guild_id = ? AND plan_id = ?) p
         LEFT JOIN users u ON p.user_id = u.user_id AND p.guild_id = u.guild_id
-        WHERE p.guild_id = ? AND p.plan_id = ? AND p.status = 'paid'
         GROUP BY p.user_id, u.username
         ORDER BY total_spent DESC
         LIMIT ?
-    """, (guild_id, plan_id, limit))
+    """, (guild_id, plan_id, guild_id, plan_id, limit))
     rows = c.fetchall()
     conn.close()
     return rows
 
+@_helper
 def get_revenue_by_day(guild_id: str, days: int = 30):
     """Get daily revenue for the last N days"""
+    # Day boundaries computed here (not DATE('now', ...)) so the SQL runs on any backend;
+    # paid_at is ISO text, so its first 10 chars are the day
+    since_day = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
     conn = _conn(); c = conn.cursor()
-    c.execute("""
+    c.execute(f"""
         SELECT 
-            DATE(paid_at) as day,
+            SUBSTR(paid_at, 1, 10) as day,
             COALESCE(SUM(amount_mnt), 0) as revenue
-        FROM payments
+        FROM {_payments_from(c, since_day)}
         WHERE guild_id = ? AND status = 'paid'
         AND paid_at IS NOT NULL
-        AND DATE(paid_at) >= DATE('now', '-' || ? || ' days')
-        GROUP BY DATE(paid_at)
+        AND paid_at >= ?
+        GROUP BY SUBSTR(paid_at, 1, 10)
         ORDER BY day ASC
-    """, (guild_id, days))
+    """, (guild_id, since_day))
     rows = c.fetchall()
     conn.close()
     return rows
 
+@_helper
 def get_role_revenue_breakdown(guild_id: str):
     """Get total revenue breakdown by role plan (includes deleted plans for historical accuracy)"""
     conn = _conn(); c = conn.cursor()
@@ -766,41 +1345,50 @@ def get_role_revenue_breakdown(guild_id: str):
         SELECT 
             rp.role_name,
             COALESCE(SUM(p.amount_mnt), 0) as revenue,
-            COUNT(DISTINCT p.payment_id) as payment_count
+            COALESCE(SUM(p.payments), 0) as payment_count
         FROM role_plans rp
-        LEFT JOIN payments p ON rp.plan_id = p.plan_id 
-            AND rp.guild_id = p.guild_id 
-            AND p.status = 'paid'
+        LEFT JOIN (SELECT guild_id, plan_id, COUNT(*) as payments, SUM(amount_mnt) as amount_mnt
+                   FROM payments WHERE guild_id = ? AND status = 'paid'
+                   GROUP BY guild_id, plan_id
+                   UNION ALL
+                   SELECT guild_id, plan_id, payments, amount_mnt
+                   FROM payments_archive_totals WHERE guild_id = ?) p
+            ON rp.plan_id = p.plan_id AND rp.guild_id = p.guild_id
         WHERE rp.guild_id = ?
         GROUP BY rp.plan_id, rp.role_name
-        HAVING revenue > 0
+        HAVING COALESCE(SUM(p.amount_mnt), 0) > 0
         ORDER BY revenue DESC
-    """, (guild_id,))
+    """, (guild_id, guild_id, guild_id))
     rows = c.fetchall()
     conn.close()
     return rows
 
+@_helper
 def get_growth_stats(guild_id: str):
     """Get growth statistics comparing last 30 days vs previous 30 days"""
+    today = datetime.utcnow().date()
+    day_30 = (today - timedelta(days=30)).isoformat()
+    day_60 = (today - timedelta(days=60)).isoformat()
     conn = _conn(); c = conn.cursor()
+    payments = _payments_from(c, day_60)
     
     # Revenue last 30 days
-    c.execute("""
+    c.execute(f"""
         SELECT COALESCE(SUM(amount_mnt), 0)
-        FROM payments
+        FROM {payments}
         WHERE guild_id = ? AND status = 'paid'
-        AND paid_at >= DATE('now', '-30 days')
-    """, (guild_id,))
+        AND paid_at >= ?
+    """, (guild_id, day_30))
     last_30_days = c.fetchone()[0] or 0
     
     # Revenue previous 30 days (30-60 days ago)
-    c.execute("""
+    c.execute(f"""
         SELECT COALESCE(SUM(amount_mnt), 0)
-        FROM payments
+        FROM {payments}
         WHERE guild_id = ? AND status = 'paid'
-        AND paid_at >= DATE('now', '-60 days')
-        AND paid_at < DATE('now', '-30 days')
-    """, (guild_id,))
+        AND paid_at >= ?
+        AND paid_at < ?
+    """, (guild_id, day_60, day_30))
     prev_30_days = c.fetchone()[0] or 0
     
     # Calculate growth percentage
@@ -826,4 +1414,318 @@ def get_growth_stats(guild_id: str):
         'prev_30_days': prev_30_days,
         'growth_percent': growth_percent,
         'active_members': active_members
-    }
\ No newline at end of file
+    }
+
+@_helper
+def get_daily_revenue(since_day: str, guild_ids):
+    """(guild_id, day, revenue) per guild and day from since_day on, for the given guilds
+    (one query per chunk, so a shard only reads its own guilds)"""
+    rows = []
+    conn = _conn(); c = conn.cursor()
+    source = _payments_from(c, since_day)
+    for chunk in _chunks(guild_ids):
+        c.execute(f"""
+            SELECT guild_id, SUBSTR(paid_at, 1, 10) as day, SUM(amount_mnt)
+            FROM {source}
+            WHERE status = 'paid' AND paid_at >= ? AND guild_id IN ({_placeholders(chunk)})
+            GROUP BY guild_id, SUBSTR(paid_at, 1, 10)
+        """, (since_day, *chunk))
+        rows.extend(c.fetchall())
+    conn.close()
+    return rows
+
+@_helper
+def get_active_plan_members(guild_ids):
+    """(guild_id, price_mnt, duration_days, active members) per plan of the given guilds"""
+    rows = []
+    conn = _conn(); c = conn.cursor()
+    for chunk in _chunks(guild_ids):
+        c.execute(f"""
+            SELECT rp.guild_id, rp.price_mnt, rp.duration_days, COUNT(*)
+            FROM memberships m
+            JOIN role_plans rp ON rp.plan_id = m.plan_id
+            WHERE m.active = 1 AND m.guild_id IN ({_placeholders(chunk)})
+            GROUP BY rp.plan_id, rp.guild_id, rp.price_mnt, rp.duration_days
+        """, chunk)
+        rows.extend(c.fetchall())
+    conn.close()
+    return rows
+
+# ---------- PLATFORM ANALYTICS (owner /analytics) ----------
+@_helper
+def get_platform_analytics():
+    conn = _conn(); c = conn.cursor()
+    stats = {}
+
+    def scalar(key, sql):
+        c.execute(sql)
+        stats[key] = c.fetchone()[0] or 0
+
+    # Servers & subscriptions
+    scalar("total_servers", "SELECT COUNT(DISTINCT guild_id) FROM subscriptions")
+    scalar("active_subs", "SELECT COUNT(*) FROM subscriptions WHERE status='active'")
+    scalar("expired_subs", "SELECT COUNT(*) FROM subscriptions WHERE status='expired'")
+    scalar("pending_subs", "SELECT COUNT(*) FROM subscriptions WHERE status='pending'")
+    scalar("subscription_revenue", "SELECT COALESCE(SUM(amount_mnt), 0) FROM subscriptions WHERE status='active'")
+
+    # Role plans
+    scalar("total_plans", "SELECT COUNT(*) FROM role_plans")
+    scalar("active_plans", "SELECT COUNT(*) FROM role_plans WHERE active=1")
+
+    # Memberships
+    scalar("active_memberships", "SELECT COUNT(*) FROM memberships WHERE active=1")
+    scalar("unique_members", "SELECT COUNT(DISTINCT user_id) FROM memberships WHERE active=1")
+
+    # Payments & revenue
+    scalar("total_payments", """SELECT (SELECT COUNT(*) FROM payments WHERE status='paid')
+                                     + (SELECT COALESCE(SUM(payments), 0) FROM payments_archive_totals)""")
+    scalar("total_role_revenue", """SELECT (SELECT COALESCE(SUM(amount_mnt), 0) FROM payments WHERE status='paid')
+                                         + (SELECT COALESCE(SUM(amount_mnt), 0) FROM payments_archive_totals)""")
+
+    # Payouts (each completed /collect costs a bank transfer fee)
+    scalar("total_collected", "SELECT COALESCE(SUM(net_mnt), 0) FROM payouts WHERE status='done'")
+    scalar("completed_payouts", "SELECT COUNT(*) FROM payouts WHERE status='done'")
+
+    # Top performing servers
+    c.execute("""SELECT s.guild_id, s.plan_name, 
+                        COALESCE(SUM(p.amount_mnt), 0) as revenue
+                 FROM subscriptions s
+                 LEFT JOIN (SELECT guild_id, SUM(amount_mnt) as amount_mnt
+                            FROM payments WHERE status='paid' GROUP BY guild_id
+                            UNION ALL
+                            SELECT guild_id, SUM(amount_mnt) FROM payments_archive_totals
+                            GROUP BY guild_id) p ON s.guild_id = p.guild_id
+                 WHERE s.status='active'
+                 GROUP BY s.guild_id, s.plan_name
+                 ORDER BY revenue DESC
+                 LIMIT 5""")
+    stats["top_servers"] = c.fetchall()
+
+    conn.close()
+    return stats
+
+# ---------- ARCHIVE ----------
+PAYMENT_COLUMNS = ("payment_id", "guild_id", "user_id", "plan_id", "amount_mnt", "status",
+                   "short_url", "created_at", "paid_at", "sender_invoice_no")
+MEMBERSHIP_COLUMNS = ("guild_id", "user_id", "plan_id", "active", "access_ends_at", "last_payment_id")
+
+# source -> (columns, date the row is archived by, which rows are closed)
+_ARCHIVE_SOURCES = {
+    "payments": (PAYMENT_COLUMNS, "COALESCE(paid_at, created_at)", "1=1"),
+    "memberships": (MEMBERSHIP_COLUMNS, "access_ends_at", "active=0"),
+}
+
+# Archive months come from row data and end up in table names, so they must be YYYY-MM
+_ARCHIVE_MONTH = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+def _next_month(month: str) -> str:
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+
+def _with_archives(c, source: str, since: str = "") -> str:
+    """FROM source for a query that only needs rows dated on/after `since` ("" = all).
+
+    The live table, unioned with archive partitions only when the range reaches an
+    archived month. Aliased as the live table, so queries don't change shape.
+    """
+    c.execute("SELECT table_name FROM archive_partitions WHERE source=? AND month >= ? ORDER BY month",
+              (source, since[:7]))
+    tables = [row[0] for row in c.fetchall()]
+    if not tables:
+        return source
+    cols = ", ".join(_ARCHIVE_SOURCES[source][0])
+    union = " UNION ALL ".join(f"SELECT {cols} FROM {t}" for t in [source] + tables)
+    return f"({union}) AS {source}"
+
+def _payments_from(c, since: str) -> str:
+    return _with_archives(c, "payments", since)
+
+def _archive_month(c, source: str, month: str, cutoff: str):
+    """Move one month of closed `source` rows older than cutoff into its archive table"""
+    if source not in _ARCHIVE_SOURCES or not _ARCHIVE_MONTH.match(month):
+        raise ValueError(f"bad archive partition {source!r} {month!r}")
+    if DB_BACKEND == "postgres":
+        # Two leaders archiving at once would copy the same rows twice
+        c.execute("SELECT pg_advisory_xact_lock(?)", (ARCHIVE_LOCK_ID,))
+    columns, key, closed = _ARCHIVE_SOURCES[source]
+    table = f"{source}_archive_{month.replace('-', '')}"
+    cols = ", ".join(columns)
+    where = f"{closed} AND {key} >= ? AND {key} < ? AND {key} < ?"
+    params = (month, _next_month(month), cutoff)
+
+    c.execute(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT {cols} FROM {source} WHERE 1=0")
+    c.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {source} WHERE {where}", params)
+    moved = c.rowcount
+    if moved <= 0:
+        return 0
+    if source == "payments":
+        c.execute(f"""INSERT INTO payments_archive_totals (guild_id, plan_id, user_id, payments, amount_mnt)
+                      SELECT COALESCE(guild_id, ''), COALESCE(plan_id, 0), COALESCE(user_id, ''),
+                             COUNT(*), COALESCE(SUM(amount_mnt), 0)
+                      FROM payments WHERE status='paid' AND {where}
+                      GROUP BY COALESCE(guild_id, ''), COALESCE(plan_id, 0), COALESCE(user_id, '')
+                      ON CONFLICT (guild_id, plan_id, user_id) DO UPDATE SET
+                          payments = payments_archive_totals.payments + excluded.payments,
+                          amount_mnt = payments_archive_totals.amount_mnt + excluded.amount_mnt""", params)
+    c.execute(f"DELETE FROM {source} WHERE {where}", params)
+    c.execute("""INSERT INTO archive_partitions (table_name, source, month, row_count, archived_at)
+                 VALUES (?,?,?,?,?)
+                 ON CONFLICT(table_name) DO UPDATE SET
+                     row_count = archive_partitions.row_count + excluded.row_count,
+                     archived_at = excluded.archived_at""",
+              (table, source, month, moved, datetime.utcnow().isoformat()))
+    return moved
+
+@_helper
+def archive_old_records(days: int = ARCHIVE_AFTER_DAYS):
+    """Move closed payments and ended memberships older than `days` into monthly
+    archive tables. One write transaction per month, so other writes interleave.
+    Returns {archive table: rows moved}."""
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    moved = {}
+    for source, (_, key, closed) in _ARCHIVE_SOURCES.items():
+        conn = _conn(); c = conn.cursor()
+        c.execute(f"SELECT DISTINCT SUBSTR({key}, 1, 7) FROM {source} WHERE {closed} AND {key} < ? ORDER BY 1",
+                  (cutoff,))
+        months = [row[0] for row in c.fetchall() if row[0]]
+        conn.close()
+        bad = [m for m in months if not _ARCHIVE_MONTH.match(m)]
+        if bad:
+            print(f"⚠️ Not archiving {source} rows with malformed dates: {bad[:5]}")
+            months = [m for m in months if _ARCHIVE_MONTH.match(m)]
+        for month in months:
+            n = _write(_archive_month, source, month, cutoff)
+            if n:
+                moved[f"{source}_archive_{month.replace('-', '')}"] = n
+    return moved
+
+@_helper
+def list_archive_partitions():
+    conn = _conn(); c = conn.cursor()
+    c.execute("SELECT table_name, source, month, row_count, archived_at FROM archive_partitions ORDER BY source, month")
+    rows = c.fetchall(); conn.close()
+    return rows
+
+# ---------- EXPORT ----------
+PAYOUT_COLUMNS = ("id", "guild_id", "gross_mnt", "fee_mnt", "net_mnt", "account_number", "account_name",
+                  "note", "created_at", "status")
+EXPORT_TABLES = {
+    "payments": PAYMENT_COLUMNS,
+    "memberships": MEMBERSHIP_COLUMNS,
+    "payouts": PAYOUT_COLUMNS,
+}
+EXPORT_CHUNK_SIZE = 5000
+
+def export_rows(table: str, guild_id: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Yield lists of up to chunk_size rows (columns as EXPORT_TABLES[table]) for one
+    guild, archives included. Streams: SQLite steps its cursor lazily and Postgres
+    uses a server-side (named) cursor, so memory stays flat however big the guild is.
+
+    A generator, so it isn't wrapped in _helper (that would only time its creation).
+    """
+    columns = EXPORT_TABLES[table]
+    conn = _conn()
+    try:
+        c = conn.cursor()
+        source = _with_archives(c, table) if table in _ARCHIVE_SOURCES else table
+        if DB_BACKEND == "postgres":
+            c = conn.cursor(name=f"export_{table}")
+        c.execute(f"SELECT {', '.join(columns)} FROM {source} WHERE guild_id=?", (guild_id,))
+        while True:
+            rows = c.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+# ---------- CLUSTER LEASES ----------
+@_helper
+def acquire_lease(name: str, holder: str, ttl_seconds: int):
+    """Acquire or renew a named lease. Returns the fencing token if we hold it, else None.
+
+    The token only increases when the lease changes hands, so a stale leader that
+    wakes up after a pause can detect it was replaced (see lease_is_held).
+    """
+    now = datetime.utcnow()
+    expires_at = (now + timedelta(seconds=ttl_seconds)).isoformat()
+    conn = _conn(); c = conn.cursor()
+    c.execute("""INSERT INTO cluster_leases (name, holder, token, expires_at) VALUES (?,?,1,?)
+                 ON CONFLICT(name) DO UPDATE SET
+                     token = CASE WHEN cluster_leases.holder = excluded.holder
+                                  THEN cluster_leases.token ELSE cluster_leases.token + 1 END,
+                     holder = excluded.holder,
+                     expires_at = excluded.expires_at
+                 WHERE cluster_leases.holder = excluded.holder OR cluster_leases.expires_at < ?""",
+              (name, holder, expires_at, now.isoformat()))
+    conn.commit()
+    c.execute("SELECT holder, token FROM cluster_leases WHERE name=?", (name,))
+    row = c.fetchone(); conn.close()
+    if row and row[0] == holder:
+        return row[1]
+    return None
+
+@_helper
+def lease_is_held(name: str, holder: str, token: int):
+    """Fencing check: True only if holder still owns the lease with this exact token"""
+    now = datetime.utcnow().isoformat()
+    conn = _conn(); c = conn.cursor()
+    c.execute("""SELECT 1 FROM cluster_leases
+                 WHERE name=? AND holder=? AND token=? AND expires_at > ?""",
+              (name, holder, token, now))
+    row = c.fetchone(); conn.close()
+    return bool(row)
+
+@_helper
+def release_lease(name: str, holder: str):
+    """Give up a lease on shutdown so another process can take over immediately"""
+    now = datetime.utcnow().isoformat()
+    conn = _conn(); c = conn.cursor()
+    c.execute("UPDATE cluster_leases SET expires_at=? WHERE name=? AND holder=?", (now, name, holder))
+    conn.commit(); conn.close()
+
+# ---------- NOTIFICATIONS ----------
+def _record_notification(c, kind: str, target: str, window_key: str):
+    c.execute("""INSERT INTO notifications_sent (kind, target, window_key, sent_at) VALUES (?,?,?,?)
+                 ON CONFLICT (kind, target, window_key) DO NOTHING""",
+              (kind, target, window_key, datetime.utcnow().isoformat()))
+    return c.rowcount == 1
+
+@_helper
+def record_notification(kind: str, target: str, window_key: str) -> bool:
+    """Claim a notification: True if it wasn't sent before (by any process)"""
+    return _write(_record_notification, kind, target, window_key)
+
+@_helper
+def list_notifications_sent(since: str):
+    """(kind, target, window_key) sent on/after since"""
+    conn = _conn(); c = conn.cursor()
+    c.execute("SELECT kind, target, window_key FROM notifications_sent WHERE sent_at >= ?", (since,))
+    rows = c.fetchall(); conn.close()
+    return rows
+
+def _prune_notifications(c, before: str):
+    c.execute("DELETE FROM notifications_sent WHERE sent_at < ?", (before,))
+    return c.rowcount
+
+@_helper
+def prune_notifications(before: str):
+    """Forget notifications sent before `before`; returns rows deleted"""
+    return _write(_prune_notifications, before)
+
+# ---------- BOT META ----------
+@_helper
+def get_meta(key: str):
+    conn = _conn(); c = conn.cursor()
+    c.execute("SELECT value FROM bot_meta WHERE key=?", (key,))
+    row = c.fetchone(); conn.close()
+    return row[0] if row else None
+
+@_helper
+def set_meta(key: str, value: str):
+    now = datetime.utcnow().isoformat()
+    conn = _conn(); c = conn.cursor()
+    c.execute("""INSERT INTO bot_meta (key, value, updated_at) VALUES (?,?,?)
+                 ON CONFLICT(key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at""",
+              (key, value, now))
+    conn.commit(); conn.close()
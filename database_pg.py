@@ -0,0 +1,244 @@
+# database_pg.py
+# PostgreSQL backend for database.py (enabled by DATABASE_URL=postgres://...)
+#
+# database.py is written against the sqlite3 DB-API (`?` placeholders,
+# cursor.lastrowid, PRAGMA table_info). The thin wrappers below give a pooled
+# psycopg2 connection the same surface, so every helper in database.py runs
+# unchanged on either backend.
+import os
+import re
+import threading
+
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+
+# Tables whose primary key is generated - INSERTs get RETURNING so lastrowid works
+_SERIAL_KEYS = {
+    "role_plans": "plan_id",
+    "leaders": "leader_id",
+    "ledger": "id",
+    "payouts": "id",
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_INSERT_TABLE = re.compile(r"^\s*INSERT\s+INTO\s+(\w+)", re.IGNORECASE)
+_PRAGMA_TABLE_INFO = re.compile(r"^\s*PRAGMA\s+table_info\((\w+)\)\s*$", re.IGNORECASE)
+_PRAGMA = re.compile(r"^\s*PRAGMA\b", re.IGNORECASE)
+# '...' string literals ('' escapes a quote) and "..." identifiers
+_QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+
+
+def is_postgres_url(url: str) -> bool:
+    return url.startswith("postgres://") or url.startswith("postgresql://")
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+                _pool = ThreadedConnectionPool(POOL_MIN, POOL_MAX, DATABASE_URL)
+    return _pool
+
+
+def translate(sql: str) -> str:
+    """sqlite3 paramstyle -> psycopg2 paramstyle.
+
+    `?` outside quotes -> `%s`; a `?` inside a string literal (LIKE '%?%') is text.
+    Every `%` -> `%%`, quoted or not: psycopg2 %-formats the whole statement.
+    """
+    out = []
+    pos = 0
+    for m in _QUOTED.finditer(sql):
+        out.append(sql[pos:m.start()].replace("%", "%%").replace("?", "%s"))
+        out.append(m.group(0).replace("%", "%%"))
+        pos = m.end()
+    out.append(sql[pos:].replace("%", "%%").replace("?", "%s"))
+    return "".join(out)
+
+
+class PgCursor:
+    def __init__(self, raw):
+        self._raw = raw
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        self.lastrowid = None
+
+        # PRAGMA table_info(x) -> same (cid, name) column layout from information_schema
+        m = _PRAGMA_TABLE_INFO.match(sql)
+        if m:
+            self._raw.execute(
+                """SELECT ordinal_position - 1, column_name FROM information_schema.columns
+                   WHERE table_name = %s ORDER BY ordinal_position""", (m.group(1),))
+            return self
+        if _PRAGMA.match(sql):
+            # Other PRAGMAs (foreign_keys, journal_mode, ...) have no Postgres meaning
+            self._raw.execute("SELECT NULL WHERE FALSE")
+            return self
+
+        m = _INSERT_TABLE.match(sql)
+        key = _SERIAL_KEYS.get(m.group(1).lower()) if m else None
+        if key and "RETURNING" not in sql.upper():
+            self._raw.execute(translate(sql) + f" RETURNING {key}", tuple(params))
+            row = self._raw.fetchone()
+            self.lastrowid = row[0] if row else None
+            return self
+
+        self._raw.execute(translate(sql), tuple(params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._raw.executemany(translate(sql), [tuple(p) for p in seq_of_params])
+        return self
+
+    def fetchone(self):
+        return self._raw.fetchone()
+
+    def fetchall(self):
+        return self._raw.fetchall()
+
+    def fetchmany(self, size=None):
+        return self._raw.fetchmany(size) if size else self._raw.fetchmany()
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def close(self):
+        self._raw.close()
+
+
+class PgConnection:
+    """Pooled connection; close() hands it back to the pool instead of disconnecting"""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def cursor(self, name=None):
+        # A name makes it a server-side cursor: rows arrive as they are fetched
+        return PgCursor(self._raw.cursor(name=name) if name else self._raw.cursor())
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        if self._raw is None:
+            return
+        # Never return a connection with an open transaction to the pool
+        self._raw.rollback()
+        _get_pool().putconn(self._raw)
+        self._raw = None
+
+
+def connect():
+    return PgConnection(_get_pool().getconn())
+
+
+# Baseline tables (migration 1 in database.py), in Postgres types.
+# Later schema changes are migrations in database.MIGRATIONS, not edits here.
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS subscriptions (
+        guild_id TEXT PRIMARY KEY,
+        plan_name TEXT,
+        amount_mnt INTEGER,
+        invoice_id TEXT,
+        expires_at TEXT,
+        status TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS guild_config (
+        guild_id TEXT PRIMARY KEY,
+        sales_channel_id TEXT,
+        commission_rate REAL DEFAULT 0.10,
+        created_at TEXT,
+        updated_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS role_plans (
+        plan_id BIGSERIAL PRIMARY KEY,
+        guild_id TEXT,
+        role_id TEXT,
+        role_name TEXT,
+        price_mnt INTEGER,
+        duration_days INTEGER,
+        active INTEGER DEFAULT 1,
+        description TEXT DEFAULT '',
+        deleted_at TEXT DEFAULT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS users (
+        user_id TEXT,
+        guild_id TEXT,
+        username TEXT,
+        PRIMARY KEY (user_id, guild_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS memberships (
+        guild_id TEXT,
+        user_id TEXT,
+        plan_id INTEGER,
+        active INTEGER,
+        access_ends_at TEXT,
+        last_payment_id TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS payments (
+        payment_id TEXT PRIMARY KEY,
+        guild_id TEXT,
+        user_id TEXT,
+        plan_id INTEGER,
+        amount_mnt INTEGER,
+        status TEXT,
+        short_url TEXT,
+        created_at TEXT,
+        paid_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS leaders (
+        leader_id BIGSERIAL PRIMARY KEY,
+        guild_id TEXT,
+        leader_name TEXT,
+        commission_rate REAL DEFAULT 0.10,
+        balance_mnt INTEGER DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS ledger (
+        id BIGSERIAL PRIMARY KEY,
+        guild_id TEXT,
+        leader_id INTEGER,
+        payment_id TEXT,
+        type TEXT,
+        amount_mnt INTEGER,
+        created_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS payouts (
+        id BIGSERIAL PRIMARY KEY,
+        guild_id TEXT,
+        gross_mnt INTEGER,
+        fee_mnt INTEGER,
+        net_mnt INTEGER,
+        account_number TEXT,
+        account_name TEXT,
+        note TEXT,
+        created_at TEXT,
+        status TEXT DEFAULT 'pending'
+    )""",
+    """CREATE TABLE IF NOT EXISTS manager_roles (
+        guild_id TEXT PRIMARY KEY,
+        role_id TEXT,
+        role_name TEXT,
+        created_at TEXT
+    )""",
+]
+
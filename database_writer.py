@@ -0,0 +1,88 @@
+# database_writer.py
+# Single-writer queue for SQLite.
+#
+# SQLite allows one writer at a time. When every helper opens its own connection
+# and commits on its own, concurrent writes queue up on the file lock and fail
+# with "database is locked" once the busy timeout runs out. Here every queued write
+# runs on ONE dedicated thread and connection. Writes that arrive together are
+# grouped into a single BEGIN IMMEDIATE ... COMMIT (group commit), so a burst of
+# 200 payment confirmations costs a handful of fsyncs instead of 200.
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+
+class SQLiteWriter:
+    def __init__(self, db_name: str, busy_timeout_ms: int = 5000, max_batch: int = 64):
+        self.db_name = db_name
+        self.busy_timeout_ms = busy_timeout_ms
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue fn(cursor, *args, **kwargs); the Future resolves after COMMIT"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Nested write submitted from the writer thread (would deadlock)")
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _run(self):
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout_ms / 1000,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._run_batch(conn, batch)
+
+    def _run_batch(self, conn, batch):
+        c = conn.cursor()
+        results = []
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            for future, fn, args, kwargs in batch:
+                # A savepoint per job: one failing write doesn't roll back its neighbours
+                c.execute("SAVEPOINT job")
+                try:
+                    results.append((future, fn(c, *args, **kwargs), None))
+                    c.execute("RELEASE job")
+                except Exception as e:
+                    c.execute("ROLLBACK TO job")
+                    c.execute("RELEASE job")
+                    results.append((future, None, e))
+            c.execute("COMMIT")
+        except Exception as e:
+            # BEGIN or COMMIT itself failed - nothing from this batch was written
+            try:
+                c.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            for future, *_ in batch:
+                future.set_exception(e)
+            return
+
+        # Only report success once the data is durable
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -1,10 +1,17 @@
+import asyncio
 import os
+import time
 import discord
+from discord import app_commands
 from discord.ext import commands
 
 from database import init_db
 
 from utils.qpay import validate_qpay_credentials
+from utils.sharding import get_shard_config
+from utils.startup import sync_commands_if_changed
+from utils.metrics import COMMAND_SECONDS, METRICS_PORT, start_metrics_server
+from utils.members import SLIM_MEMBER_CACHE, member_cache_options
 
 TOKEN = os.getenv("DISCORD_TOKEN")
 if not TOKEN:
@@ -22,11 +29,6 @@ intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-# Init DB
-init_db()
-
 # List of all cogs
 initial_extensions = [
     "cogs.admin",
@@ -37,24 +39,96 @@ initial_extensions = [
     "cogs.owner",
     "cogs.analytics",
     "cogs.weekly_reports",
-    "cogs.devchat"
+    "cogs.devchat",
+    "cogs.cluster",
+    "cogs.archive",
+    "cogs.bulk_import",
+    "cogs.export",
+    "cogs.admin_index"
 ]
 
-async def load_cogs():
-    for ext in initial_extensions:
+
+def observe_command(interaction: discord.Interaction, status: str):
+    # Measured from the interaction's creation, so gateway lag and our own queueing count too
+    name = interaction.command.qualified_name if interaction.command else "unknown"
+    elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    COMMAND_SECONDS.observe(elapsed, command=name, status=status)
+
+
+class MetricsCommandTree(app_commands.CommandTree):
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        observe_command(interaction, "error")
+        await super().on_error(interaction, error)
+
+
+class SubscriptionBot(commands.AutoShardedBot):
+    """Runs one-time startup work in setup_hook.
+
+    on_ready fires again after every gateway reconnect/resume, so anything done
+    there (loading extensions, global command sync) gets repeated. setup_hook runs
+    exactly once, after login and before the gateway connects.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.startup_timings = {}
+
+    async def _load_extension_timed(self, ext):
+        started = time.perf_counter()
         try:
-            await bot.load_extension(ext)   # ✅ must use await
-            print(f"✅ Loaded {ext}")
+            await self.load_extension(ext)
+            ok = True
         except Exception as e:
             print(f"❌ Failed to load {ext}: {e}")
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        if ok:
+            print(f"✅ Loaded {ext} ({elapsed:.0f} ms)")
+        return ext, elapsed
+
+    async def on_app_command_completion(self, interaction, command):
+        observe_command(interaction, "ok")
+
+    async def setup_hook(self):
+        total = time.perf_counter()
+
+        if METRICS_PORT:
+            await start_metrics_server(METRICS_PORT)
+
+        started = time.perf_counter()
+        await asyncio.to_thread(init_db)
+        self.startup_timings["init_db"] = (time.perf_counter() - started) * 1000
+
+        # Extensions don't depend on each other, so load them side by side
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._load_extension_timed(ext) for ext in initial_extensions))
+        self.startup_timings["load_cogs"] = (time.perf_counter() - started) * 1000
+        self.startup_timings["cogs"] = dict(results)
+
+        started = time.perf_counter()
+        try:
+            synced = await sync_commands_if_changed(self)
+            print("✅ Slash commands synced" if synced else "⏭️ Slash commands unchanged, sync skipped")
+        except Exception as e:
+            print("Slash sync error:", e)
+        self.startup_timings["command_sync"] = (time.perf_counter() - started) * 1000
+
+        self.startup_timings["total"] = (time.perf_counter() - total) * 1000
+        print("⏱️ Startup: " + " | ".join(
+            f"{phase} {ms:.0f} ms" for phase, ms in self.startup_timings.items() if phase != "cogs"))
+
+
+# Sharding: one process can run all shards (AutoShardedBot default) or only a
+# range of them (SHARD_COUNT + SHARD_IDS) so several processes split the gateway load
+shard_count, shard_ids = get_shard_config()
+bot = SubscriptionBot(command_prefix="!", intents=intents, tree_cls=MetricsCommandTree,
+                      shard_count=shard_count, shard_ids=shard_ids, **member_cache_options(intents))
 
 @bot.event
 async def on_ready():
-    await load_cogs()
-    try:
-        await bot.tree.sync()
-    except Exception as e:
-        print("Slash sync error:", e)
-    print(f"✅ Logged in as {bot.user} | Slash commands synced.")
-
-bot.run(TOKEN)
\ No newline at end of file
+    # May fire several times (reconnects) - startup work lives in setup_hook
+    print(f"✅ Logged in as {bot.user} | Shards: {bot.shard_ids or 'all'} of {bot.shard_count}")
+    if SLIM_MEMBER_CACHE:
+        print("🪶 Slim member cache: members are fetched on demand")
+
+bot.run(TOKEN)
@@ -0,0 +1,105 @@
+"""utils.admin_index on a guild without a member cache (SLIM_MEMBER_CACHE)"""
+import asyncio
+
+import discord
+import pytest
+from discord.state import ConnectionState
+
+from utils import admin_index as admin_index_module
+from utils.admin_index import AdminIndex
+from utils.members import MemberResolver
+
+GUILD_ID = 10
+OWNER, ADMIN, MANAGER, MEMBER = 1, 2, 3, 4
+ADMIN_ROLE, MANAGE_ROLE, PLAIN_ROLE = 101, 102, 103
+
+
+def _role(role_id, permissions):
+    return {"id": str(role_id), "name": f"role{role_id}", "permissions": str(permissions), "position": 1,
+            "color": 0, "hoist": False, "managed": False, "mentionable": False}
+
+
+@pytest.fixture
+def guild():
+    intents = discord.Intents.default()
+    intents.members = True
+    state = ConnectionState(dispatch=lambda *args, **kwargs: None, handlers={}, hooks={}, http=None,
+                            intents=intents, member_cache_flags=discord.MemberCacheFlags.none())
+    roles = [_role(GUILD_ID, 0), _role(ADMIN_ROLE, discord.Permissions(administrator=True).value),
+             _role(MANAGE_ROLE, discord.Permissions(manage_guild=True).value), _role(PLAIN_ROLE, 0)]
+    return discord.Guild(data={"id": str(GUILD_ID), "name": "g", "roles": roles, "owner_id": str(OWNER),
+                               "emojis": [], "stickers": [], "features": []}, state=state)
+
+
+def _member(guild, user_id, *role_ids):
+    return discord.Member(data={"user": {"id": str(user_id), "username": f"u{user_id}", "discriminator": "0",
+                                         "avatar": None},
+                                "roles": [str(r) for r in role_ids], "joined_at": "2024-01-01T00:00:00+00:00",
+                                "deaf": False, "mute": False, "flags": 0},
+                          guild=guild, state=guild._state)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    resolver = MemberResolver()
+    monkeypatch.setattr(admin_index_module, "member_resolver", resolver)
+    return AdminIndex(), resolver
+
+
+def _fetch_from(monkeypatch, people):
+    """guild.fetch_member answers from `people`"""
+    async def fetch_member(self, user_id):
+        if user_id not in people:
+            raise discord.NotFound(type("Resp", (), {"status": 404, "reason": "Not Found"})(), "Unknown Member")
+        return people[user_id]
+
+    monkeypatch.setattr(discord.Guild, "fetch_member", fetch_member)
+
+
+def test_built_without_chunking_from_owner_and_known_admins(guild, index, monkeypatch):
+    idx, resolver = index
+    chunk_calls = []
+    monkeypatch.setattr(discord.Guild, "chunk", lambda self, **kwargs: chunk_calls.append(kwargs))
+    resolver.put(_member(guild, ADMIN, ADMIN_ROLE))
+    resolver.put(_member(guild, MANAGER, MANAGE_ROLE))
+    resolver.put(_member(guild, MEMBER, PLAIN_ROLE))
+    _fetch_from(monkeypatch, {OWNER: _member(guild, OWNER)})
+
+    admins = asyncio.run(idx.admin_members(guild))
+
+    # manage_guild alone isn't admin: admins get revenue DMs
+    assert [m.id for m in admins] == [OWNER, ADMIN]
+    assert chunk_calls == []
+
+
+def test_interactions_add_admins_and_stale_admins_are_dropped(guild, index, monkeypatch):
+    idx, resolver = index
+    # An admin uses the bot before the index exists, another one after
+    idx.member_seen(_member(guild, ADMIN, ADMIN_ROLE))
+    idx.member_seen(_member(guild, MEMBER, PLAIN_ROLE))
+    idx.member_seen(_member(guild, MANAGER, MANAGE_ROLE))
+    assert idx._get(guild).admins == {OWNER, ADMIN}
+    idx.member_seen(_member(guild, MEMBER, ADMIN_ROLE))
+    assert idx._get(guild).admins == {OWNER, ADMIN, MEMBER}
+
+    # MEMBER lost the role without us seeing an update
+    resolver.forget(GUILD_ID, MEMBER)
+    _fetch_from(monkeypatch, {OWNER: _member(guild, OWNER), MEMBER: _member(guild, MEMBER, PLAIN_ROLE)})
+    admins = asyncio.run(idx.admin_members(guild))
+
+    assert [m.id for m in admins] == [OWNER, ADMIN]
+    assert idx._get(guild).admins == {OWNER, ADMIN}
+
+
+def test_member_and_role_events(guild, index):
+    idx, _ = index
+    idx.member_seen(_member(guild, ADMIN, ADMIN_ROLE))
+    idx._get(guild)
+
+    idx.member_removed(GUILD_ID, ADMIN)
+    assert idx._get(guild).admins == {OWNER}
+
+    assert MANAGE_ROLE not in idx._get(guild).admin_roles
+    guild.get_role(PLAIN_ROLE)._permissions = discord.Permissions(administrator=True).value  # as on_guild_role_update
+    idx.role_changed(guild.get_role(PLAIN_ROLE))
+    assert PLAIN_ROLE in idx._get(guild).admin_roles
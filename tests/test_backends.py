@@ -0,0 +1,143 @@
+"""database.py end to end, once on SQLite and once on PostgreSQL (see conftest.db)"""
+from datetime import datetime, timedelta
+
+import pytest
+
+GUILD = "g1"
+
+
+def _set(db, sql, params=()):
+    db._write(lambda c: c.execute(sql, params))
+
+
+def _days_ago(days):
+    return (datetime.utcnow() - timedelta(days=days)).isoformat()
+
+
+def _kinds(db, guild_id=GUILD):
+    return [row[3] for row in db.get_membership_events(guild_id)]
+
+
+def test_grant_extends_a_running_membership(db):
+    plan_id = db.add_role_plan(GUILD, "r1", "Gold", 10_000, 30)
+    first = db.grant_membership(GUILD, "u1", plan_id, 30, "P1")
+    second = db.grant_membership(GUILD, "u1", plan_id, 30, "P2")
+
+    # New rows (Python) and extensions (SQL) write the same microsecond ISO format
+    assert len(first) == len(second) == len("2026-01-01T00:00:00.000000")
+    assert datetime.fromisoformat(second) - datetime.fromisoformat(first) == timedelta(days=30)
+    assert db.get_user_active_membership(GUILD, "u1") is not None
+    assert _kinds(db) == ["new", "renewal"]
+
+
+def test_confirm_payment_grants_once(db):
+    plan_id = db.add_role_plan(GUILD, "r1", "Gold", 10_000, 30)
+    db.create_payment("INV1", GUILD, "u1", plan_id, 10_000, "https://pay/INV1")
+
+    first = db.confirm_payment("INV1")
+    again = db.confirm_payment("INV1")
+
+    assert first["confirmed"] and first["plan"]["plan_id"] == plan_id
+    assert not again["confirmed"]
+    assert again["status"] == "paid"
+    assert again["access_ends_at"] == first["access_ends_at"]
+    assert db.get_payment("INV1")[5] == "paid"
+    assert _kinds(db) == ["new"]
+    assert db.confirm_payment("MISSING") is None
+
+
+def test_archive_moves_old_rows_and_export_still_sees_them(db):
+    plan_id = db.add_role_plan(GUILD, "r1", "Gold", 10_000, 30)
+    for invoice in ("INV_OLD", "INV_NEW"):
+        db.create_payment(invoice, GUILD, "u1", plan_id, 10_000, f"https://pay/{invoice}")
+        db.confirm_payment(invoice)
+    _set(db, "UPDATE payments SET created_at=?, paid_at=? WHERE payment_id='INV_OLD'", (_days_ago(400), _days_ago(400)))
+    db.grant_membership(GUILD, "u2", plan_id, 30, "IMPORT")
+    db.deactivate_membership(GUILD, "u2", plan_id)
+    _set(db, "UPDATE memberships SET access_ends_at=? WHERE user_id='u2'", (_days_ago(300),))
+    revenue = db.total_guild_revenue(GUILD)
+
+    moved = db.archive_old_records(days=180)
+
+    assert sorted(name.split("_archive_")[0] for name in moved) == ["memberships", "payments"]
+    assert sum(moved.values()) == 2
+    assert db.get_payment("INV_OLD") is None
+    assert db.total_guild_revenue(GUILD) == revenue
+    assert db.archive_old_records(days=180) == {}
+
+    payments = [row for chunk in db.export_rows("payments", GUILD, chunk_size=1) for row in chunk]
+    assert sorted(row[0] for row in payments) == ["INV_NEW", "INV_OLD"]
+    memberships = [row for chunk in db.export_rows("memberships", GUILD) for row in chunk]
+    assert sorted(row[1] for row in memberships) == ["u1", "u2"]
+
+
+def test_export_payouts(db):
+    payout_id = db.create_payout_record(GUILD, 100_000, 1_000, 99_000, "123", "Owner", "Oct")
+    db.create_payout_record("other", 5, 0, 5, "9", "Other")
+
+    rows = [row for chunk in db.export_rows("payouts", GUILD) for row in chunk]
+
+    assert [(row[0], row[4], row[9]) for row in rows] == [(payout_id, 99_000, "pending")]
+
+
+def test_question_mark_inside_a_literal_is_not_a_parameter(db):
+    db.add_role_plan(GUILD, "r1", "Who?", 10_000, 30)
+    db.add_role_plan(GUILD, "r2", "100% off", 0, 30)
+    conn = db._conn()
+    try:
+        c = conn.cursor()
+        c.execute("SELECT role_name FROM role_plans WHERE role_name LIKE '%?' AND guild_id=?", (GUILD,))
+        assert c.fetchall() == [("Who?",)]
+        c.execute("SELECT role_name FROM role_plans WHERE role_name LIKE '%\\%%' ESCAPE '\\' AND guild_id=?", (GUILD,))
+        assert c.fetchall() == [("100% off",)]
+    finally:
+        conn.close()
+
+
+def test_confirm_payment_after_a_renewal_reports_the_membership(db):
+    plan_id = db.add_role_plan(GUILD, "r1", "Gold", 10_000, 30)
+    for invoice in ("INV1", "INV2"):
+        db.create_payment(invoice, GUILD, "u1", plan_id, 10_000, f"https://pay/{invoice}")
+    db.confirm_payment("INV1")
+    renewed = db.confirm_payment("INV2")
+
+    again = db.confirm_payment("INV1")
+
+    assert not again["confirmed"]
+    assert again["access_ends_at"] == renewed["access_ends_at"]
+
+
+def test_a_purchase_after_the_membership_was_archived_is_a_return(db):
+    plan_id = db.add_role_plan(GUILD, "r1", "Gold", 10_000, 30)
+    db.grant_membership(GUILD, "u1", plan_id, 30, "P1")
+    db.deactivate_membership(GUILD, "u1", plan_id)
+    _set(db, "UPDATE memberships SET access_ends_at=? WHERE user_id='u1'", (_days_ago(300),))
+    db.archive_old_records(days=180)
+    assert db.get_user_active_membership(GUILD, "u1") == []
+
+    db.grant_membership(GUILD, "u1", plan_id, 30, "P2")
+
+    assert _kinds(db) == ["new", "expire", "return"]
+
+
+def test_archive_skips_malformed_months(db):
+    plan_id = db.add_role_plan(GUILD, "r1", "Gold", 10_000, 30)
+    db.create_payment("INV1", GUILD, "u1", plan_id, 10_000, "https://pay/INV1")
+    _set(db, "UPDATE payments SET created_at=? WHERE payment_id='INV1'", ("2020-x1; DROP TABLE users",))
+
+    assert db.archive_old_records(days=180) == {}
+    assert db.get_payment("INV1") is not None
+    with pytest.raises(ValueError):
+        db._archive_month(None, "payments", "2020-x1; DROP TABLE users", _days_ago(180))
+
+
+def test_revenue_queries_read_only_the_given_guilds(db):
+    for guild_id in ("g1", "g2", "g3"):
+        plan_id = db.add_role_plan(guild_id, "r1", "Gold", 10_000, 30)
+        db.create_payment(f"INV_{guild_id}", guild_id, "u1", plan_id, 10_000, f"https://pay/{guild_id}")
+        db.confirm_payment(f"INV_{guild_id}")
+    since = (datetime.utcnow() - timedelta(days=1)).date().isoformat()
+
+    assert sorted(row[0] for row in db.get_daily_revenue(since, ["g1", "g3"])) == ["g1", "g3"]
+    assert [row[0] for row in db.get_active_plan_members(["g2"])] == ["g2"]
+    assert db.get_daily_revenue(since, []) == []
@@ -0,0 +1,56 @@
+from utils import circuit
+from utils.circuit import CircuitBreaker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(circuit.time, "monotonic", clock)
+    return CircuitBreaker("test", window=30, min_calls=2, error_rate=0.5, open_seconds=10), clock
+
+
+def _trip(breaker):
+    for _ in range(2):
+        breaker.record(breaker.allow(), False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_probe_success_closes_and_failure_reopens(monkeypatch):
+    breaker, clock = _breaker(monkeypatch)
+    _trip(breaker)
+    assert breaker.allow() is None
+
+    clock.now += 10
+    probe = breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() is None  # one probe at a time
+    breaker.record(probe, False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 10
+    breaker.record(breaker.allow(), True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_late_results_from_before_the_trip_decide_nothing(monkeypatch):
+    breaker, clock = _breaker(monkeypatch)
+    slow_ok, slow_fail = breaker.allow(), breaker.allow()
+    _trip(breaker)
+    clock.now += 10
+    probe = breaker.allow()
+
+    breaker.record(slow_ok, True)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record(slow_fail, False)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() is None  # the probe slot is still taken
+
+    breaker.record(probe, True)
+    assert breaker.state == CircuitBreaker.CLOSED
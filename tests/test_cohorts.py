@@ -0,0 +1,28 @@
+from utils.cohorts import FIELD_LIMIT, format_retention
+
+
+def _report(cohorts, plans):
+    return {
+        "cohorts": [(f"2026-{m:02d}", 100 + m, [100.0, 80.0, None, None]) for m in range(1, cohorts + 1)],
+        "plans": {plan_id: {"renewal": 10 + plan_id, "expire": 5, "return": 1, "renewal_rate": 66.7}
+                  for plan_id in range(1, plans + 1)},
+    }
+
+
+def test_short_report_is_untouched():
+    text = format_retention(_report(3, 2), {1: "Gold", 2: "Silver"})
+
+    assert text.count("```") == 2
+    assert "2026-01" in text and "**Gold**: 67% renew" in text
+
+
+def test_long_report_drops_whole_lines_and_keeps_the_fence_closed():
+    names = {plan_id: "Extremely Long Premium Plan Name " * 4 for plan_id in range(1, 6)}
+
+    text = format_retention(_report(6, 5), names)
+
+    assert len(text) <= FIELD_LIMIT
+    assert text.count("```") == 2
+    assert "2026-01" in text and "2026-06" in text  # the table is kept whole
+    # Only complete rate lines survive
+    assert all(line.endswith("came back)") for line in text.split("```")[-1].strip().splitlines())
@@ -0,0 +1,20 @@
+from database_pg import translate
+
+
+def test_placeholders_become_pyformat():
+    assert translate("SELECT a FROM t WHERE b=? AND c IN (?,?)") == "SELECT a FROM t WHERE b=%s AND c IN (%s,%s)"
+
+
+def test_percent_is_escaped_everywhere():
+    # psycopg2 %-formats the whole statement, string literals included
+    assert translate("SELECT 1 WHERE a LIKE 'x%' AND b=?") == "SELECT 1 WHERE a LIKE 'x%%' AND b=%s"
+
+
+def test_question_marks_in_quotes_are_kept():
+    sql = """SELECT "odd?col" FROM t WHERE a LIKE '%?%' AND b=? AND c='it''s ?' AND d=?"""
+    assert translate(sql) == """SELECT "odd?col" FROM t WHERE a LIKE '%%?%%' AND b=%s AND c='it''s ?' AND d=%s"""
+
+
+def test_double_quotes_inside_a_literal():
+    sql = """SELECT to_char(x, 'YYYY-MM-DD"T"HH24') WHERE y=?"""
+    assert translate(sql) == """SELECT to_char(x, 'YYYY-MM-DD"T"HH24') WHERE y=%s"""
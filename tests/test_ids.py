@@ -0,0 +1,74 @@
+import threading
+
+from utils import ids
+from utils.ids import MAX_SEQUENCE, SnowflakeGenerator, parse_id
+
+
+class _Clock:
+    """Stands in for time.time; `ms` is milliseconds since ids.EPOCH_MS"""
+
+    def __init__(self, ms=1_000):
+        self.ms = ms
+
+    def __call__(self):
+        return (ids.EPOCH_MS + self.ms) / 1000
+
+
+def test_one_million_ids_across_threads_are_unique():
+    gen = SnowflakeGenerator(node=7)
+    threads, per_thread = 8, 125_000
+    results = [None] * threads
+
+    def work(slot):
+        out = [gen.next_id() for _ in range(per_thread)]
+        # Each thread sees its own IDs strictly increasing
+        assert all(a < b for a, b in zip(out, out[1:]))
+        results[slot] = out
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    everything = [value for out in results for value in out]
+    assert len(everything) == 1_000_000
+    assert len(set(everything)) == len(everything)
+    assert {parse_id(value)[1] for value in everything[::1000]} == {7}
+
+
+def test_clock_rollback_keeps_ids_increasing(monkeypatch):
+    clock = _Clock(ms=50_000)
+    monkeypatch.setattr(ids.time, "time", clock)
+    gen = SnowflakeGenerator(node=1)
+    before = [gen.next_id() for _ in range(3)]
+
+    clock.ms -= 10_000  # NTP steps the wall clock back 10s
+    during = [gen.next_id() for _ in range(3)]
+    clock.ms = 50_001   # and it catches up again
+    after = gen.next_id()
+
+    sequence = before + during + [after]
+    assert sequence == sorted(set(sequence))
+    # No ID is stamped with the rolled-back time
+    assert all(parse_id(value)[0] - ids.EPOCH_MS >= 50_000 for value in during)
+    assert parse_id(after)[0] - ids.EPOCH_MS == 50_001
+
+
+def test_sequence_overflow_borrows_the_next_millisecond(monkeypatch):
+    clock = _Clock(ms=2_000)
+    monkeypatch.setattr(ids.time, "time", clock)
+    gen = SnowflakeGenerator(node=3)
+
+    burst = [gen.next_id() for _ in range(MAX_SEQUENCE + 1 + 10)]  # all in one frozen millisecond
+
+    assert burst == sorted(set(burst))
+    stamps = [parse_id(value) for value in burst]
+    assert stamps[MAX_SEQUENCE][0] - ids.EPOCH_MS == 2_000
+    assert stamps[MAX_SEQUENCE][2] == MAX_SEQUENCE
+    assert stamps[MAX_SEQUENCE + 1][0] - ids.EPOCH_MS == 2_001
+    assert stamps[MAX_SEQUENCE + 1][2] == 0
+
+    # When the real clock reaches the borrowed millisecond, numbering continues in it
+    clock.ms = 2_001
+    assert gen.next_id() > burst[-1]
@@ -0,0 +1,47 @@
+"""utils.notifications.NotificationLog against a real notifications_sent table"""
+import importlib
+from datetime import datetime, timedelta
+
+import pytest
+
+KIND = "membership_expired"
+
+
+@pytest.fixture
+def log(db):
+    from utils import notifications
+    importlib.reload(notifications)  # bind to the freshly reloaded database module
+    return notifications, notifications.NotificationLog()
+
+
+def test_a_failed_insert_is_not_cached(log, monkeypatch):
+    module, notifications = log
+    real = module.record_notification
+
+    def down(*key):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(module, "record_notification", down)
+    with pytest.raises(RuntimeError):
+        notifications.claim(KIND, "g:u:1", "2026-01-01T00:00:00")
+    assert not notifications.sent(KIND, "g:u:1", "2026-01-01T00:00:00")
+
+    monkeypatch.setattr(module, "record_notification", real)
+    assert notifications.claim(KIND, "g:u:1", "2026-01-01T00:00:00")
+    assert not notifications.claim(KIND, "g:u:1", "2026-01-01T00:00:00")
+
+
+def test_prune_drops_windows_past_retention(log):
+    _, notifications = log
+    old = (datetime.utcnow() - timedelta(days=400)).isoformat()
+    recent = datetime.utcnow().isoformat()
+    notifications.claim(KIND, "old", old)
+    notifications.claim(KIND, "recent", recent)
+
+    notifications.prune()  # warmed just now: not due yet
+    assert notifications.sent(KIND, "old", old)
+
+    notifications._pruned_at -= timedelta(days=2)
+    notifications.prune()
+    assert not notifications.sent(KIND, "old", old)
+    assert notifications.sent(KIND, "recent", recent)
@@ -0,0 +1,130 @@
+import discord
+
+from utils.members import members as member_resolver
+
+
+def is_admin_role(role: discord.Role) -> bool:
+    """Roles whose members count as the guild's admins (administrator only: admins
+    get revenue DMs, which manage_guild staff must not see)"""
+    return role.permissions.administrator
+
+
+class _GuildIndex:
+    __slots__ = ("admin_roles", "admins", "owner_id")
+
+    def __init__(self):
+        self.admin_roles = set()
+        self.admins = set()
+        self.owner_id = None
+
+
+class AdminIndex:
+    """Admin user IDs per guild, so finding a guild's admins doesn't compute
+    permissions for every member.
+
+    Built per guild on first use from the roles with administrator (plus the owner), then kept current by AdminIndexCog's member, role and
+    interaction events. Only role changes touch it; a member update is O(their roles).
+
+    Nothing here downloads the member list. A chunked guild is built from its member
+    cache. Without one (SLIM_MEMBER_CACHE) it starts from what is already known: the
+    owner, members cached on the admin roles and admins in the member LRU. Admins
+    who use the bot are added from their interactions, and admin_members drops
+    anyone whose fetched roles say they no longer qualify.
+    """
+
+    def __init__(self):
+        self._guilds = {}
+
+    def _get(self, guild: discord.Guild) -> _GuildIndex:
+        index = self._guilds.get(guild.id)
+        if index is not None:
+            return index
+        index = _GuildIndex()
+        index.owner_id = guild.owner_id
+        admin_roles = [r for r in guild.roles if is_admin_role(r)]
+        index.admin_roles = {r.id for r in admin_roles}
+        if guild.chunked:
+            known = guild.members
+        else:
+            known = [m for r in admin_roles for m in r.members] + member_resolver.cached_members(guild)
+        for member in known:
+            if {r.id for r in member.roles} & index.admin_roles:
+                index.admins.add(member.id)
+        if index.owner_id:
+            index.admins.add(index.owner_id)
+        self._guilds[guild.id] = index
+        return index
+
+    def _qualifies(self, index: _GuildIndex, member: discord.Member) -> bool:
+        return member.id == index.owner_id or bool({r.id for r in member.roles} & index.admin_roles)
+
+    async def admin_members(self, guild: discord.Guild) -> list:
+        """Non-bot admins, the owner first"""
+        index = self._get(guild)
+        ordered = sorted(index.admins, key=lambda user_id: user_id != index.owner_id)
+        found = []
+        for user_id in ordered:
+            member = await member_resolver.get(guild, user_id)
+            if member is None:
+                continue
+            if not self._qualifies(index, member):
+                # Lost the role while we weren't getting their updates
+                index.admins.discard(member.id)
+                continue
+            if not member.bot:
+                found.append(member)
+        return found
+
+    async def first_admin(self, guild: discord.Guild):
+        """The owner, else another admin; the index is only built if the owner is gone"""
+        if guild.owner_id:
+            owner = await member_resolver.get(guild, guild.owner_id)
+            if owner is not None and not owner.bot:
+                return owner
+        admins = await self.admin_members(guild)
+        return admins[0] if admins else None
+
+    # ---- event hooks (AdminIndexCog) ----
+    def forget(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def member_changed(self, member: discord.Member):
+        index = self._guilds.get(member.guild.id)
+        if index is None:
+            return
+        if self._qualifies(index, member):
+            index.admins.add(member.id)
+        else:
+            index.admins.discard(member.id)
+
+    def member_seen(self, member: discord.Member):
+        """A member with up-to-date roles (from an interaction), cached or not"""
+        if member.guild.id in self._guilds:
+            self.member_changed(member)
+        elif not member.guild.chunked and (member.id == member.guild.owner_id
+                                           or any(is_admin_role(r) for r in member.roles)):
+            # Not built yet: leave them in the LRU, where the build looks
+            member_resolver.put(member)
+
+    def member_removed(self, guild_id: int, user_id: int):
+        index = self._guilds.get(guild_id)
+        if index is not None:
+            index.admins.discard(user_id)
+
+    def role_changed(self, role: discord.Role):
+        """A role was created, deleted or had its permissions edited"""
+        index = self._guilds.get(role.guild.id)
+        if index is None:
+            return
+        admin_role = is_admin_role(role) and role.guild.get_role(role.id) is not None
+        if admin_role != (role.id in index.admin_roles):
+            # Rare (permission edits), so just rebuild this guild
+            self.forget(role.guild.id)
+
+    def owner_changed(self, guild: discord.Guild):
+        index = self._guilds.get(guild.id)
+        if index is not None and index.owner_id != guild.owner_id:
+            self.forget(guild.id)
+
+
+admin_index = AdminIndex()
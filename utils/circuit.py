@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """Closed -> open -> half-open breaker over a rolling time window.
+
+    Closed: calls go through; once the window holds at least `min_calls` results
+    and the share of failures reaches `error_rate`, the breaker opens.
+    Open: calls are refused for `open_seconds`.
+    Half-open: up to `half_open_calls` probes go through; a success closes the
+    breaker, a failure opens it again.
+    allow() hands out a ticket for record(), so only results of calls admitted in
+    the current state count: a slow call from before a trip can't close or
+    re-open the breaker, and only probes decide a half-open one.
+    Thread-safe: the QPay client runs on worker threads.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, window: float = 30, min_calls: int = 10, error_rate: float = 0.5,
+                 open_seconds: float = 15, half_open_calls: int = 1, on_change=None):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.on_change = on_change
+        self._results = deque()  # (monotonic time, ok)
+        self._failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._generation = 0  # bumped on every state change; tickets carry it
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _set_state(self, state: str):
+        if state == self._state:
+            return
+        self._state = state
+        self._generation += 1
+        print(f"⚡ Circuit {self.name}: {state}")
+        if self.on_change:
+            self.on_change(self, state)
+
+    def _maybe_half_open(self, now: float):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._probes = 0
+            self._set_state(self.HALF_OPEN)
+
+    def _trim(self, now: float):
+        while self._results and now - self._results[0][0] > self.window:
+            _, ok = self._results.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def allow(self):
+        """A ticket if a call may go ahead (pass it to record() with the result), else None"""
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            if self._state == self.CLOSED:
+                return (self.CLOSED, self._generation)
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return (self.HALF_OPEN, self._generation)
+            return None
+
+    def record(self, ticket, ok: bool):
+        with self._lock:
+            now = time.monotonic()
+            admitted_in, generation = ticket
+            if generation != self._generation:
+                # Admitted before the last state change (e.g. a slow call from before
+                # the trip): it says nothing about the current state
+                return
+            if admitted_in == self.HALF_OPEN:
+                self._probes -= 1
+                if ok:
+                    self._results.clear()
+                    self._failures = 0
+                    self._set_state(self.CLOSED)
+                else:
+                    self._opened_at = now
+                    self._set_state(self.OPEN)
+                return
+
+            self._results.append((now, ok))
+            if not ok:
+                self._failures += 1
+            self._trim(now)
+            calls = len(self._results)
+            if calls >= self.min_calls and self._failures / calls >= self.error_rate:
+                self._opened_at = now
+                self._set_state(self.OPEN)
+
+
+class AIMDLimiter:
+    """Concurrency limit that adapts like TCP congestion control.
+
+    Each success under `latency_target` grows the limit by 1/limit (about +1 per
+    limit's worth of calls); a failure or slow call multiplies it by `backoff`.
+    try_acquire() never waits: when the limit is reached the caller fails fast
+    instead of queueing behind a degraded upstream.
+    """
+
+    def __init__(self, name: str, initial: float = 8, minimum: float = 1, maximum: float = 64,
+                 latency_target: float = 2.0, backoff: float = 0.5, on_change=None):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.on_change = on_change
+        self._limit = float(initial)
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._inflight >= int(self._limit):
+                return False
+            self._inflight += 1
+            self._changed()
+            return True
+
+    def release(self, ok=None, elapsed: float = 0.0):
+        """ok=None gives the slot back without counting it as a sample"""
+        with self._lock:
+            self._inflight -= 1
+            if ok is not None:
+                if ok and elapsed <= self.latency_target:
+                    self._limit = min(self.maximum, self._limit + 1 / self._limit)
+                else:
+                    self._limit = max(self.minimum, self._limit * self.backoff)
+            self._changed()
@@ -0,0 +1,44 @@
+import os
+import socket
+import uuid
+
+# Cluster mode: several bot processes share one database. One process per shard
+# range is elected leader (lease + fencing token in `cluster_leases`) and runs the
+# singleton jobs; per-row work (membership expiry) is claimed with row leases.
+CLUSTER_MODE = os.getenv("CLUSTER_MODE", "0") == "1"
+
+# Unique per process - a restarted process is a new holder
+NODE_ID = os.getenv("NODE_ID") or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+LEASE_TTL_SECONDS = int(os.getenv("CLUSTER_LEASE_TTL", "30"))
+HEARTBEAT_SECONDS = max(1, LEASE_TTL_SECONDS // 3)
+
+# How long a claimed expired membership stays reserved for one process
+ROW_CLAIM_TTL_SECONDS = int(os.getenv("CLUSTER_ROW_CLAIM_TTL", "300"))
+
+
+def lease_name(bot) -> str:
+    """Leader lease scoped to this process's shards.
+
+    Processes running the same shard range are replicas and compete for one lease;
+    processes with different ranges each get their own leader.
+    """
+    shard_ids = getattr(bot, "shard_ids", None)
+    scope = ",".join(str(s) for s in sorted(shard_ids)) if shard_ids else "all"
+    return f"leader:{scope}"
+
+
+def is_leader(bot) -> bool:
+    """Cheap in-memory check used at the top of singleton jobs"""
+    if not CLUSTER_MODE:
+        return True
+    cog = bot.get_cog("ClusterCog")
+    return bool(cog and cog.is_leader())
+
+
+def still_leader(bot) -> bool:
+    """Fenced check against the DB - call before side effects (DMs, writes)"""
+    if not CLUSTER_MODE:
+        return True
+    cog = bot.get_cog("ClusterCog")
+    return bool(cog and cog.still_leader())
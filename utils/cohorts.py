@@ -0,0 +1,173 @@
+"""Cohort retention and renewal rates from membership_events.
+
+Each guild's history is folded once into compact per-user state and kept in
+memory; later calls only fold the events added since (by event id), so /growth
+and the weekly report don't re-read the whole history every time.
+"""
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from database import get_membership_events
+
+PURCHASE_KINDS = ("new", "renewal", "return")
+# Retention columns: the cohort's first month plus this many after it
+MAX_OFFSET = 12
+SHOWN_COHORTS = 6
+SHOWN_OFFSETS = 4
+# Discord embed field value limit
+FIELD_LIMIT = 1024
+EVENTS_PER_FETCH = 50000
+_MONTH_BITS = 16
+
+
+def _month(iso: str) -> int:
+    return int(iso[:4]) * 12 + int(iso[5:7]) - 1
+
+
+def _label(month: int) -> str:
+    return f"{month // 12}-{month % 12 + 1:02d}"
+
+
+class GuildCohorts:
+    """Folded membership history of one guild"""
+
+    def __init__(self, guild_id: str):
+        self.guild_id = guild_id
+        self.last_id = 0
+        self._users = {}        # user_id -> index into _first
+        self._first = []        # first purchase month per user
+        self._active = set()    # (user index << _MONTH_BITS) | month, for every month with paid access
+        self.plans = {}         # plan_id -> {"new", "renewal", "return", "expire"} counts
+        self._report = None
+        self.lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Fold events added since the last refresh; True if there were any"""
+        changed = False
+        while True:
+            events = get_membership_events(self.guild_id, self.last_id, EVENTS_PER_FETCH)
+            for event in events:
+                self._fold(*event)
+            if events:
+                self.last_id = events[-1][0]
+                changed = True
+            if len(events) < EVENTS_PER_FETCH:
+                break
+        if changed:
+            self._report = None
+        return changed
+
+    def _fold(self, event_id, user_id, plan_id, kind, occurred_at, access_ends_at):
+        counts = self.plans.setdefault(plan_id, {"new": 0, "renewal": 0, "return": 0, "expire": 0})
+        if kind in counts:
+            counts[kind] += 1
+        if kind not in PURCHASE_KINDS or not occurred_at:
+            return
+
+        start = _month(occurred_at)
+        index = self._users.get(user_id)
+        if index is None:
+            index = self._users[user_id] = len(self._first)
+            self._first.append(start)
+        elif start < self._first[index]:
+            self._first[index] = start
+        # Months with access: from the purchase up to the month the period ends in
+        # (that month only counts if it is renewed), at least the purchase month
+        end = _month(access_ends_at) if access_ends_at else start + 1
+        for month in range(start, max(end, start + 1)):
+            self._active.add((index << _MONTH_BITS) | month)
+
+    def report(self) -> dict:
+        if self._report is None:
+            self._report = self._build_report()
+        return self._report
+
+    def _build_report(self) -> dict:
+        first = np.array(self._first, dtype=np.int64)
+        plans = {}
+        for plan_id, c in self.plans.items():
+            decided = c["renewal"] + c["expire"]
+            plans[plan_id] = dict(c, renewal_rate=(c["renewal"] / decided * 100) if decided else None)
+        if not len(first):
+            return {"members": 0, "cohorts": [], "plans": plans}
+
+        keys = np.fromiter(self._active, dtype=np.int64, count=len(self._active))
+        users = keys >> _MONTH_BITS
+        offset = (keys & ((1 << _MONTH_BITS) - 1)) - first[users]
+        keep = (offset >= 0) & (offset <= MAX_OFFSET)
+
+        # Group by cohort month with array ops: position of each user's cohort among the cohorts
+        cohort_months, cohort_of_user = np.unique(first, return_inverse=True)
+        sizes = np.bincount(cohort_of_user)
+        cells = cohort_of_user[users[keep]] * (MAX_OFFSET + 1) + offset[keep]
+        retained = np.bincount(cells, minlength=len(cohort_months) * (MAX_OFFSET + 1))
+        retention = retained.reshape(len(cohort_months), MAX_OFFSET + 1) / sizes[:, None] * 100
+
+        # Offsets that haven't happened yet are unknown, not 0%
+        now = _month(datetime.utcnow().isoformat())
+        elapsed = now - cohort_months
+        retention[np.arange(MAX_OFFSET + 1)[None, :] > elapsed[:, None]] = np.nan
+
+        cohorts = [(_label(int(m)), int(size), [None if np.isnan(v) else float(v) for v in row])
+                   for m, size, row in zip(cohort_months, sizes, retention)]
+        return {"members": int(len(first)), "cohorts": cohorts, "plans": plans}
+
+
+_guilds = {}
+_guilds_lock = threading.Lock()
+
+
+def cohort_report(guild_id: str) -> dict:
+    """Retention matrix by first-purchase month and per-plan renewal rates.
+
+    Blocking (reads new events); run it in a thread from async code. Returns
+    {"members", "cohorts": [(month, size, [% retained at offset 0..MAX_OFFSET])],
+     "plans": {plan_id: {"new", "renewal", "return", "expire", "renewal_rate"}}}
+    """
+    guild_id = str(guild_id)
+    with _guilds_lock:
+        cohorts = _guilds.get(guild_id)
+        if cohorts is None:
+            cohorts = _guilds[guild_id] = GuildCohorts(guild_id)
+    with cohorts.lock:
+        cohorts.refresh()
+        return cohorts.report()
+
+
+def format_retention(report: dict, plan_names: dict) -> str:
+    """Embed field text: the latest cohorts' retention and each plan's renewal rate.
+
+    Trimmed by whole lines to FIELD_LIMIT, so the code block is always closed:
+    the least-used plans' rates go first, then the oldest cohorts.
+    """
+    if not report["cohorts"]:
+        return "_No purchases yet_"
+    header = "Cohort   Users " + "".join(f"  M{i:<3}" for i in range(SHOWN_OFFSETS))
+    rows = []
+    for label, size, row in report["cohorts"][-SHOWN_COHORTS:]:
+        cells = "".join(f"{'':>6}" if v is None else f"{v:>5.0f}%" for v in row[:SHOWN_OFFSETS])
+        rows.append(f"{label}  {size:>5} {cells}")
+
+    rates = []
+    for plan_id, stats in sorted(report["plans"].items(), key=lambda kv: -(kv[1]["renewal"] + kv[1]["expire"])):
+        if stats["renewal_rate"] is None:
+            continue
+        name = plan_names.get(plan_id, f"Plan {plan_id}")
+        rates.append(f"**{name}**: {stats['renewal_rate']:.0f}% renew "
+                     f"({stats['renewal']} renewed, {stats['expire']} lapsed, {stats['return']} came back)")
+    rates = rates[:5]
+
+    def render():
+        text = "```\n" + "\n".join([header] + rows) + "\n```"
+        return text + "\n" + "\n".join(rates) if rates else text
+
+    text = render()
+    while len(text) > FIELD_LIMIT and rates:
+        rates.pop()
+        text = render()
+    while len(text) > FIELD_LIMIT and len(rows) > 1:
+        rows.pop(0)
+        text = render()
+    return text
@@ -0,0 +1,209 @@
+import functools
+import os
+import re
+import threading
+import time
+from collections import deque
+
+# DB_PROFILE=1 turns the profiler on at boot; the owner can also toggle it with /dbprofile
+DB_PROFILE = os.getenv("DB_PROFILE", "0") == "1"
+# Queries slower than this are logged together with their EXPLAIN QUERY PLAN
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+SLOW_LOG_SIZE = 50
+
+_enabled = DB_PROFILE
+_lock = threading.Lock()
+_local = threading.local()
+
+# name -> [calls, total_s, max_s, rows]
+_function_stats = {}
+# (function, normalized sql) -> [calls, total_s, max_s, rows]
+_statement_stats = {}
+# (when, ms, function, sql, plan lines)
+_slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"IN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(value: bool):
+    global _enabled
+    _enabled = value
+
+
+def reset():
+    with _lock:
+        _function_stats.clear()
+        _statement_stats.clear()
+        _slow_queries.clear()
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse literals and IN (...) lists so the same query groups together"""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def _current_function() -> str:
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else "<direct>"
+
+
+def _record(table, key, elapsed: float = 0.0, rows: int = 0, calls: int = 0):
+    with _lock:
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = [0, 0.0, 0.0, 0]
+        stats[0] += calls
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+        stats[3] += rows
+
+
+def profiled(fn):
+    """Attribute the statements fn runs (and the rows they return) to fn's name"""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(name)
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stack.pop()
+            _record(_function_stats, name, time.perf_counter() - started, calls=1)
+    return wrapper
+
+
+class ProfiledCursor:
+    """Cursor proxy timing each statement and counting the rows fetched from it"""
+
+    def __init__(self, raw, connection=None, function=None):
+        self._raw = raw
+        self._connection = connection
+        self._function = function
+        self._key = None
+
+    def _function_name(self):
+        return self._function or _current_function()
+
+    def _explain(self, sql, params):
+        # Only SQLite: a Postgres EXPLAIN on this cursor would replace its result set
+        if self._connection is None or not hasattr(self._connection, "set_trace_callback"):
+            return []
+        try:
+            rows = self._connection.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            return [row[-1] for row in rows]
+        except Exception as e:
+            return [f"(no plan: {e})"]
+
+    def _timed(self, method, sql, params):
+        function = self._function_name()
+        self._key = (function, normalize_sql(sql))
+        started = time.perf_counter()
+        method(sql, params)
+        elapsed = time.perf_counter() - started
+        _record(_statement_stats, self._key, elapsed, calls=1)
+
+        ms = elapsed * 1000
+        if ms >= SLOW_QUERY_MS:
+            plan = self._explain(sql, params) if method == self._raw.execute else []
+            _slow_queries.append((time.time(), ms, function, self._key[1], plan))
+            print(f"🐢 Slow query ({ms:.0f} ms) in {function}: {self._key[1]}")
+            for line in plan:
+                print(f"   └─ {line}")
+        return self
+
+    def execute(self, sql, params=()):
+        return self._timed(self._raw.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(self._raw.executemany, sql, seq_of_params)
+
+    def _fetched(self, rows, elapsed):
+        if self._key is not None:
+            _record(_statement_stats, self._key, elapsed, rows=rows)
+            _record(_function_stats, self._key[0], rows=rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._raw.fetchone()
+        self._fetched(1 if row is not None else 0, time.perf_counter() - started)
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._raw.fetchall()
+        self._fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._raw.fetchmany(size) if size else self._raw.fetchmany()
+        self._fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+    def __iter__(self):
+        for row in self._raw:
+            self._fetched(1, 0.0)
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class ProfiledConnection:
+    """Connection proxy handing out ProfiledCursors; everything else passes through"""
+
+    def __init__(self, raw):
+        object.__setattr__(self, "_raw", raw)
+
+    def cursor(self, *args, **kwargs):
+        return ProfiledCursor(self._raw.cursor(*args, **kwargs), self._raw)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)
+
+
+def wrap_connection(conn):
+    return ProfiledConnection(conn)
+
+
+def wrap_job(fn):
+    """Wrap a write job so it profiles on the writer thread under the caller's function name"""
+    function = _current_function()
+
+    @functools.wraps(fn)
+    def job(c, *args, **kwargs):
+        return fn(ProfiledCursor(c, getattr(c, "connection", None), function), *args, **kwargs)
+    return job
+
+
+def snapshot(top: int = 10):
+    """(functions, statements, slow) sorted by total time, for /dbprofile"""
+    with _lock:
+        functions = sorted(_function_stats.items(), key=lambda kv: kv[1][1], reverse=True)[:top]
+        statements = sorted(_statement_stats.items(), key=lambda kv: kv[1][1], reverse=True)[:top]
+        slow = list(_slow_queries)[-top:]
+    return functions, statements, slow
@@ -0,0 +1,120 @@
+"""Streaming export of a guild's payments, memberships and payouts.
+
+Rows come from database.export_rows in fixed-size chunks and go straight to disk,
+so memory stays flat whatever the row count. Used by /export and runnable directly:
+
+    python -m utils.export --guild 123456789 --table payments
+    python -m utils.export --guild 123456789 --table memberships --format parquet --out exports/
+"""
+import argparse
+import csv
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from database import EXPORT_TABLES, EXPORT_CHUNK_SIZE, export_rows
+
+# CSV files bigger than this are gzipped (Parquet is already compressed)
+EXPORT_GZIP_OVER_BYTES = int(os.getenv("EXPORT_GZIP_OVER_BYTES", str(1024 * 1024)))
+FORMATS = ("csv", "parquet")
+
+# Integer columns, for the Parquet schema; everything else is text
+_INT_COLUMNS = {"plan_id", "amount_mnt", "active", "id", "gross_mnt", "fee_mnt", "net_mnt"}
+
+
+class ExportUnavailable(Exception):
+    """The requested format needs a package that isn't installed"""
+
+
+def _write_csv(chunks, columns, path):
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def _write_parquet(chunks, columns, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportUnavailable("Parquet export needs pyarrow (`pip install pyarrow`); use CSV instead")
+
+    schema = pa.schema([(col, pa.int64() if col in _INT_COLUMNS else pa.string()) for col in columns])
+    rows = 0
+    # One row group per chunk: only the current chunk is ever held in memory
+    with pq.ParquetWriter(path, schema, compression="snappy") as writer:
+        for chunk in chunks:
+            arrays = [pa.array([row[i] for row in chunk], type=schema.field(i).type) for i in range(len(columns))]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            rows += len(chunk)
+        if rows == 0:
+            writer.write_table(schema.empty_table())
+    return rows
+
+
+def gzip_file(path: str) -> str:
+    """Compress path to path.gz in streaming blocks, remove the original, return the new path"""
+    target = path + ".gz"
+    with open(path, "rb") as src, gzip.open(target, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.remove(path)
+    return target
+
+
+def export_guild(guild_id: str, table: str, fmt: str = "csv", out_dir: str = None,
+                 chunk_size: int = EXPORT_CHUNK_SIZE, gzip_over: int = EXPORT_GZIP_OVER_BYTES):
+    """Write one table of one guild to out_dir (a new temp dir by default).
+
+    Returns (path, rows). Blocking; run it in a thread from async code.
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table {table!r}, expected one of {', '.join(EXPORT_TABLES)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+    out_dir = out_dir or tempfile.mkdtemp(prefix="export_")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{table}_{guild_id}_{time.strftime('%Y%m%d')}.{fmt}")
+    columns = EXPORT_TABLES[table]
+    writer = _write_parquet if fmt == "parquet" else _write_csv
+    rows = writer(export_rows(table, guild_id, chunk_size), columns, path)
+
+    if fmt == "csv" and gzip_over is not None and os.path.getsize(path) > gzip_over:
+        path = gzip_file(path)
+    return path, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guild", required=True, help="Guild ID")
+    parser.add_argument("--table", choices=[*EXPORT_TABLES, "all"], default="all")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out", default=".", help="Output directory")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument("--gzip", action="store_true", help="Always gzip CSV output")
+    parser.add_argument("--no-gzip", action="store_true", help="Never gzip CSV output")
+    args = parser.parse_args()
+
+    gzip_over = 0 if args.gzip else None if args.no_gzip else EXPORT_GZIP_OVER_BYTES
+    tables = list(EXPORT_TABLES) if args.table == "all" else [args.table]
+    for table in tables:
+        started = time.perf_counter()
+        try:
+            path, rows = export_guild(args.guild, table, args.format, args.out, args.chunk_size, gzip_over)
+        except ExportUnavailable as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"📦 {table}: {rows:,} rows -> {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB, "
+              f"{time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
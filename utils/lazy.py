@@ -0,0 +1,49 @@
+import importlib
+import os
+import threading
+
+
+class LazyModule:
+    """Module stand-in that imports the real module on first attribute access.
+
+    Lets a cog say `requests = lazy_import("requests")` at the top of the file
+    without paying for the import at startup on shards that never use it.
+    """
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+openai = lazy_import("openai")
+
+_openai_client = None
+_openai_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Shared OpenAI client, built the first time something actually calls the API"""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_lock:
+            if _openai_client is None:
+                _openai_client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return _openai_client
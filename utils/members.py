@@ -0,0 +1,103 @@
+import os
+import time
+from collections import OrderedDict
+
+import discord
+
+from utils.singleflight import KeyedLock
+
+# Memory-lean mode for very large guilds: no member chunking at startup and no member
+# cache; the few members the bot acts on (expiring, paying, admins) are fetched on demand
+SLIM_MEMBER_CACHE = os.getenv("SLIM_MEMBER_CACHE", "0") == "1"
+MEMBER_LRU_SIZE = int(os.getenv("MEMBER_LRU_SIZE", "10000"))
+# Fetched members don't get gateway updates, so their roles go stale; refetch after this
+MEMBER_LRU_TTL_SECONDS = int(os.getenv("MEMBER_LRU_TTL_SECONDS", "600"))
+
+
+def member_cache_options(intents: discord.Intents) -> dict:
+    """Client kwargs for the configured member cache mode"""
+    if not SLIM_MEMBER_CACHE:
+        return {"chunk_guilds_at_startup": True, "member_cache_flags": discord.MemberCacheFlags.from_intents(intents)}
+    return {"chunk_guilds_at_startup": False, "member_cache_flags": discord.MemberCacheFlags.none()}
+
+
+class MemberResolver:
+    """guild.get_member, then an LRU of fetched members, then one fetch_member.
+
+    Concurrent lookups of the same member share one API call. Members that aren't
+    in the guild are cached too (as None), so an expiry sweep over users who left
+    doesn't refetch them every run.
+    """
+
+    def __init__(self, maxsize: int = MEMBER_LRU_SIZE, ttl: float = MEMBER_LRU_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._members = OrderedDict()  # (guild_id, user_id) -> (fetched at, Member or None)
+        self._fetching = KeyedLock()
+        self.hits = 0
+        self.fetches = 0
+
+    def cached(self, guild: discord.Guild, user_id: int):
+        """The member if it is in discord.py's cache or our LRU, without an API call"""
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        entry = self._members.get((guild.id, user_id))
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        self._members.move_to_end((guild.id, user_id))
+        return entry[1]
+
+    def cached_members(self, guild: discord.Guild) -> list:
+        """This guild's members in the LRU that haven't gone stale"""
+        now = time.monotonic()
+        return [member for (guild_id, _), (fetched, member) in self._members.items()
+                if guild_id == guild.id and member is not None and now - fetched <= self.ttl]
+
+    def put(self, member: discord.Member):
+        self._store((member.guild.id, member.id), member)
+
+    def forget(self, guild_id: int, user_id: int):
+        self._members.pop((guild_id, user_id), None)
+
+    def _store(self, key, member):
+        self._members[key] = (time.monotonic(), member)
+        self._members.move_to_end(key)
+        while len(self._members) > self.maxsize:
+            self._members.popitem(last=False)
+
+    def _fresh(self, key) -> bool:
+        entry = self._members.get(key)
+        return entry is not None and time.monotonic() - entry[0] <= self.ttl
+
+    async def get(self, guild: discord.Guild, user_id: int):
+        """The member, fetching it if needed; None if they aren't in the guild
+        (or the fetch failed - callers' loops must not die on an API error)"""
+        user_id = int(user_id)
+        member = self.cached(guild, user_id)
+        key = (guild.id, user_id)
+        if member is not None or self._fresh(key):
+            self.hits += 1
+            return member
+
+        async with self._fetching.hold(key):
+            if self._fresh(key):
+                self.hits += 1
+                return self._members[key][1]
+            self.fetches += 1
+            try:
+                member = await guild.fetch_member(user_id)
+            except discord.NotFound:
+                member = None
+            except discord.HTTPException as e:
+                # Forbidden, 5xx, ...: not an answer about membership, so don't cache it
+                print(f"⚠️ Couldn't fetch member {user_id} in {guild.id}: {e}")
+                return None
+            self._store(key, member)
+            return member
+
+    def __len__(self):
+        return len(self._members)
+
+
+members = MemberResolver()
@@ -0,0 +1,188 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Serve /metrics (Prometheus text format) on this port; unset = no HTTP server
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Seconds; covers a fast SQLite read up to a slow OpenAI call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Every metric registers itself here on creation
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(labelnames, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., sum, count]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+# ---------- METRICS ----------
+COMMAND_SECONDS = Histogram("bot_command_seconds", "Slash command latency from interaction creation to completion",
+                            ["command", "status"])
+DB_SECONDS = Histogram("bot_db_seconds", "database.py helper latency", ["function", "status"])
+QPAY_SECONDS = Histogram("bot_qpay_request_seconds", "QPay API request latency", ["endpoint"])
+QPAY_RESPONSES = Counter("bot_qpay_responses_total", "QPay API responses by HTTP status", ["endpoint", "status"])
+QPAY_CIRCUIT_STATE = Gauge("bot_qpay_circuit_state", "QPay circuit breaker state (0 closed, 1 half-open, 2 open)")
+QPAY_CONCURRENCY_LIMIT = Gauge("bot_qpay_concurrency_limit", "Current adaptive limit on concurrent QPay requests")
+QPAY_INFLIGHT = Gauge("bot_qpay_inflight", "QPay requests currently in flight")
+QPAY_REJECTED = Counter("bot_qpay_rejected_total", "QPay calls refused without being sent", ["reason"])
+QPAY_INVOICES = Counter("bot_qpay_invoices_total", "Plan purchase clicks by invoice outcome", ["result"])
+OPENAI_SECONDS = Histogram("bot_openai_request_seconds", "OpenAI chat completion latency", ["caller", "status"])
+OPENAI_TOKENS = Counter("bot_openai_tokens_total", "OpenAI tokens used", ["caller", "kind"])
+EXPIRY_PROCESSED = Counter("bot_expiry_processed_total", "Rows handled by the expiry loops", ["loop"])
+DM_FAILURES = Counter("bot_dm_failures_total", "Direct messages that could not be delivered", ["kind"])
+
+
+def timed(fn):
+    """Record fn's latency in DB_SECONDS, labelled with its name"""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, function=name, status=status)
+    return wrapper
+
+
+def observe_openai(caller: str, create, **kwargs):
+    """Call an OpenAI create() function, recording latency, status and token usage"""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        response = create(**kwargs)
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        OPENAI_SECONDS.observe(time.perf_counter() - started, caller=caller, status=status)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        OPENAI_TOKENS.inc(usage.prompt_tokens or 0, caller=caller, kind="prompt")
+        OPENAI_TOKENS.inc(usage.completion_tokens or 0, caller=caller, kind="completion")
+    return response
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Serve GET /metrics from the bot's event loop. Returns the aiohttp runner."""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"📈 Metrics on http://{host}:{port}/metrics")
+    return runner
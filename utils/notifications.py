@@ -0,0 +1,76 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from database import record_notification, list_notifications_sent, prune_notifications
+
+# Older rows are dropped at warm-up and by prune(); windows are expiry dates, so nothing older is re-checked
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+PRUNE_INTERVAL = timedelta(days=1)
+
+SUBSCRIPTION_WARNING = "subscription_warning"
+SUBSCRIPTION_EXPIRED = "subscription_expired"
+MEMBERSHIP_EXPIRED = "membership_expired"
+
+
+class NotificationLog:
+    """Which notifications were already sent, backed by notifications_sent.
+
+    The in-memory set is warmed from the table on first use, so a repeat is
+    rejected with a set lookup before any Discord call. A new key is claimed
+    with an insert that only one process can win, and only cached once that
+    insert succeeded. prune() (from the expiry loop) keeps the set bounded.
+    """
+
+    def __init__(self):
+        self._sent = set()
+        self._warm = False
+        self._pruned_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cutoff() -> str:
+        return (datetime.utcnow() - timedelta(days=NOTIFICATION_RETENTION_DAYS)).isoformat()
+
+    def _warm_up(self):
+        with self._lock:
+            if self._warm:
+                return
+            cutoff = self._cutoff()
+            pruned = prune_notifications(cutoff)
+            self._sent.update(tuple(row) for row in list_notifications_sent(cutoff))
+            self._warm = True
+            self._pruned_at = datetime.utcnow()
+            print(f"📨 Notification log warmed: {len(self._sent)} sent, {pruned} pruned")
+
+    def sent(self, kind: str, target: str, window: str) -> bool:
+        """Already sent by this or (as of warm-up) any other process"""
+        if not self._warm:
+            self._warm_up()
+        return (kind, str(target), str(window)) in self._sent
+
+    def claim(self, kind: str, target: str, window: str) -> bool:
+        """Mark as sent; False if it was already (also by another process since warm-up)"""
+        key = (kind, str(target), str(window))
+        if self.sent(*key):
+            return False
+        if not record_notification(*key):
+            return False
+        self._sent.add(key)
+        return True
+
+    def prune(self):
+        """Drop keys whose window is past the retention (and their rows), at most once per PRUNE_INTERVAL"""
+        now = datetime.utcnow()
+        if not self._warm or now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        cutoff = self._cutoff()
+        pruned = prune_notifications(cutoff)
+        with self._lock:
+            before = len(self._sent)
+            self._sent = {key for key in self._sent if key[2] >= cutoff}
+            self._pruned_at = now
+        print(f"📨 Notification log pruned: {before - len(self._sent)} cached, {pruned} rows")
+
+
+notifications = NotificationLog()
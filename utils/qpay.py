@@ -1,12 +1,81 @@
 import os
-import requests
-from requests.auth import HTTPBasicAuth
-from datetime import datetime
+import time
+from utils.circuit import CircuitBreaker, AIMDLimiter
+from utils.ids import new_invoice_no
+from utils.lazy import lazy_import
+from utils.metrics import (QPAY_SECONDS, QPAY_RESPONSES, QPAY_CIRCUIT_STATE, QPAY_CONCURRENCY_LIMIT,
+                           QPAY_INFLIGHT, QPAY_REJECTED)
+
+# Only imported once a payment is actually made or checked
+requests = lazy_import("requests")
+
+# Point at a local simulator/stub for load tests, e.g. QPAY_BASE_URL=http://127.0.0.1:8099
+QPAY_BASE_URL = os.getenv("QPAY_BASE_URL", "https://merchant.qpay.mn").rstrip("/")
 
 QPAY_USERNAME = os.getenv("QPAY_USERNAME")
 QPAY_PASSWORD = os.getenv("QPAY_PASSWORD")
 QPAY_INVOICE_CODE = os.getenv("QPAY_INVOICE_CODE")
 
+# Shown instead of waiting out the 10s timeout while QPay is degraded
+QPAY_BUSY_MESSAGE = "⏳ QPay is slow right now, please try again shortly."
+
+
+class QPayUnavailable(Exception):
+    """Raised without calling QPay: the breaker is open or too many calls are in flight"""
+
+
+_CIRCUIT_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+# Opens when half of the last 30s of calls failed (min 10 calls); probes again after 15s
+breaker = CircuitBreaker(
+    "qpay",
+    window=float(os.getenv("QPAY_BREAKER_WINDOW", "30")),
+    min_calls=int(os.getenv("QPAY_BREAKER_MIN_CALLS", "10")),
+    error_rate=float(os.getenv("QPAY_BREAKER_ERROR_RATE", "0.5")),
+    open_seconds=float(os.getenv("QPAY_BREAKER_OPEN_SECONDS", "15")),
+    on_change=lambda b, state: QPAY_CIRCUIT_STATE.set(_CIRCUIT_STATES[state]),
+)
+# Calls slower than the latency target count as congestion and halve the limit
+limiter = AIMDLimiter(
+    "qpay",
+    initial=int(os.getenv("QPAY_MAX_CONCURRENCY", "16")),
+    maximum=int(os.getenv("QPAY_MAX_CONCURRENCY", "16")) * 4,
+    latency_target=float(os.getenv("QPAY_LATENCY_TARGET", "2.0")),
+    on_change=lambda l: (QPAY_CONCURRENCY_LIMIT.set(l.limit), QPAY_INFLIGHT.set(l.inflight)),
+)
+QPAY_CIRCUIT_STATE.set(0)
+QPAY_CONCURRENCY_LIMIT.set(limiter.limit)
+QPAY_INFLIGHT.set(0)
+
+
+def _post(endpoint: str, url: str, **kwargs):
+    """requests.post behind the breaker and concurrency limiter, with metrics per QPay endpoint"""
+    if not limiter.try_acquire():
+        QPAY_REJECTED.inc(reason="concurrency")
+        raise QPayUnavailable(f"QPay {endpoint}: too many requests in flight")
+    ticket = breaker.allow()
+    if ticket is None:
+        limiter.release()
+        QPAY_REJECTED.inc(reason="circuit_open")
+        raise QPayUnavailable(f"QPay {endpoint}: circuit open")
+
+    ok = False
+    started = time.perf_counter()
+    try:
+        with QPAY_SECONDS.time(endpoint=endpoint):
+            try:
+                response = requests.post(url, **kwargs)
+            except Exception:
+                QPAY_RESPONSES.inc(endpoint=endpoint, status="error")
+                raise
+        QPAY_RESPONSES.inc(endpoint=endpoint, status=response.status_code)
+        # 4xx other than 429 is our request's fault, not QPay's health
+        ok = response.status_code < 500 and response.status_code != 429
+        return response
+    finally:
+        limiter.release(ok, time.perf_counter() - started)
+        breaker.record(ticket, ok)
+
 def validate_qpay_credentials():
     """Validate that all QPay credentials are set"""
     if not QPAY_USERNAME or not QPAY_PASSWORD or not QPAY_INVOICE_CODE:
@@ -20,31 +89,40 @@ def get_qpay_token():
         return None
         
     try:
-        response = requests.post(
-            "https://merchant.qpay.mn/v2/auth/token",
-            auth=HTTPBasicAuth(QPAY_USERNAME, QPAY_PASSWORD),
+        response = _post(
+            "auth/token",
+            f"{QPAY_BASE_URL}/v2/auth/token",
+            auth=requests.auth.HTTPBasicAuth(QPAY_USERNAME, QPAY_PASSWORD),
             timeout=10
         )
         if response.status_code == 200:
             return response.json().get("access_token")
         print("QPay auth failed:", response.text)
         return None
+    except QPayUnavailable:
+        raise
     except Exception as e:
         print("QPay auth error:", e)
         return None
 
-def create_qpay_invoice(amount_mnt: int, plan_name: str):
+def create_qpay_invoice(amount_mnt: int, plan_name: str, sender_invoice_no: str = None):
+    """(invoice_id, qr_text, short_url), or Nones on failure.
+
+    Pass sender_invoice_no (utils.ids.new_invoice_no) to store it with the payment;
+    otherwise a fresh one is generated.
+    """
     token = get_qpay_token()
     if not token:
         return None, None, None
 
     try:
-        response = requests.post(
-            "https://merchant.qpay.mn/v2/invoice",
+        response = _post(
+            "invoice",
+            f"{QPAY_BASE_URL}/v2/invoice",
             headers={"Authorization": f"Bearer {token}"},
             json={
                 "invoice_code": QPAY_INVOICE_CODE,
-                "sender_invoice_no": f"DISC_{int(datetime.now().timestamp())}",
+                "sender_invoice_no": sender_invoice_no or new_invoice_no(),
                 "invoice_receiver_code": plan_name,
                 "invoice_description": f"Discord Role: {plan_name}",
                 "amount": amount_mnt,
@@ -56,6 +134,8 @@ def create_qpay_invoice(amount_mnt: int, plan_name: str):
             return data.get("invoice_id"), data.get("qr_text", ""), data.get("qPay_shortUrl")
         print("QPay invoice failed:", response.text)
         return None, None, None
+    except QPayUnavailable:
+        raise
     except Exception as e:
         print("QPay invoice error:", e)
         return None, None, None
@@ -70,8 +150,9 @@ def check_qpay_payment_status(invoice_id: str):
         payload = {"object_type": "INVOICE", "object_id": invoice_id}
         print(f"🔍 Checking QPay status for {invoice_id} with payload: {payload}")
         
-        response = requests.post(
-            "https://merchant.qpay.mn/v2/payment/check",
+        response = _post(
+            "payment/check",
+            f"{QPAY_BASE_URL}/v2/payment/check",
             headers={"Authorization": f"Bearer {token}"},
             json=payload,
             timeout=10
@@ -96,6 +177,8 @@ def check_qpay_payment_status(invoice_id: str):
         else:
             print(f"❌ QPay API Error {response.status_code}: {response.text}")
             return "unknown"
+    except QPayUnavailable:
+        raise
     except Exception as e:
         print(f"❌ QPay status error for {invoice_id}: {e}")
         return "unknown"
\ No newline at end of file
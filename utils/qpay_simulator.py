@@ -0,0 +1,247 @@
+"""Local QPay simulator for offline load tests and resilience checks.
+
+Implements the three endpoints utils/qpay.py uses - /v2/auth/token, /v2/invoice
+and /v2/payment/check - with the same response shapes as merchant.qpay.mn, plus:
+  - scripted payment states: each invoice walks through --script on successive
+    checks (e.g. "PENDING*2,PAID" = pending twice, then paid from then on)
+  - injected latency (fixed + jitter), 5xx errors and 429 throttling, all drawn
+    from a seeded RNG so a run can be replayed exactly
+  - an optional requests-per-second cap that answers 429 + Retry-After when exceeded
+  - control endpoints: POST /_sim/invoices/{id} {"status": "PAID"} forces a state,
+    GET /_sim/stats returns request counts
+
+    python -m utils.qpay_simulator --port 8099 --latency-ms 80 --error-rate 0.02
+    QPAY_BASE_URL=http://127.0.0.1:8099 python main.py
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+
+from aiohttp import web
+
+
+def parse_script(script: str):
+    """"PENDING*2,PAID" -> ["PENDING", "PENDING", "PAID"] (the last state sticks)"""
+    states = []
+    for part in script.split(","):
+        part = part.strip().upper()
+        if not part:
+            continue
+        name, _, times = part.partition("*")
+        states.extend([name] * (int(times) if times else 1))
+    return states or ["PAID"]
+
+
+class SimulatorConfig:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, rate_limit: float = 0.0, script: str = "PAID",
+                 seed: int = 1, endpoint_latency_ms: dict = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate          # share of requests answered with 5xx
+        self.throttle_rate = throttle_rate    # share of requests answered with 429
+        self.rate_limit = rate_limit          # max requests/second (0 = unlimited)
+        self.script = parse_script(script)
+        self.seed = seed
+        # Per-endpoint override, e.g. {"invoice": 300}
+        self.endpoint_latency_ms = endpoint_latency_ms or {}
+
+
+class QPaySimulator:
+    def __init__(self, config: SimulatorConfig = None):
+        self.config = config or SimulatorConfig()
+        self.rng = random.Random(self.config.seed)
+        self.invoices = {}  # invoice_id -> {"amount", "checks", "forced"}
+        self.stats = Counter()
+        self._ids = itertools.count(1)
+        self._tokens = itertools.count(1)
+        # Token bucket for --rate-limit
+        self._bucket = self.config.rate_limit
+        self._bucket_at = time.monotonic()
+
+    # ---------- fault injection ----------
+    def _over_rate_limit(self) -> bool:
+        limit = self.config.rate_limit
+        if not limit:
+            return False
+        now = time.monotonic()
+        self._bucket = min(limit, self._bucket + (now - self._bucket_at) * limit)
+        self._bucket_at = now
+        if self._bucket < 1:
+            return True
+        self._bucket -= 1
+        return False
+
+    async def _inject(self, endpoint: str):
+        """Sleep the configured latency; return an error response to send instead, or None"""
+        self.stats[f"{endpoint}.requests"] += 1
+        cfg = self.config
+        latency = cfg.endpoint_latency_ms.get(endpoint, cfg.latency_ms)
+        if cfg.jitter_ms:
+            latency += self.rng.uniform(0, cfg.jitter_ms)
+        # Draw both rolls every request so the sequence doesn't depend on earlier outcomes
+        error_roll, throttle_roll = self.rng.random(), self.rng.random()
+        if latency:
+            await asyncio.sleep(latency / 1000)
+
+        if self._over_rate_limit() or throttle_roll < cfg.throttle_rate:
+            self.stats[f"{endpoint}.429"] += 1
+            return web.json_response({"error": "TOO_MANY_REQUESTS", "message": "Rate limit exceeded"},
+                                     status=429, headers={"Retry-After": "1"})
+        if error_roll < cfg.error_rate:
+            status = self.rng.choice((500, 502, 503))
+            self.stats[f"{endpoint}.{status}"] += 1
+            return web.json_response({"error": "INTERNAL_SERVER_ERROR", "message": "Simulated failure"},
+                                     status=status)
+        return None
+
+    # ---------- QPay endpoints ----------
+    async def auth_token(self, request):
+        error = await self._inject("auth/token")
+        if error is not None:
+            return error
+        n = next(self._tokens)
+        self.stats["auth/token.200"] += 1
+        return web.json_response({
+            "token_type": "bearer",
+            "access_token": f"sim-access-{n}",
+            "refresh_token": f"sim-refresh-{n}",
+            "expires_in": int(time.time()) + 86400,
+            "refresh_expires_in": int(time.time()) + 172800,
+        })
+
+    async def create_invoice(self, request):
+        error = await self._inject("invoice")
+        if error is not None:
+            return error
+        try:
+            body = await request.json()
+        except Exception:
+            body = {}
+        invoice_id = f"SIM_{next(self._ids):08d}"
+        self.invoices[invoice_id] = {
+            "amount": body.get("amount", 0),
+            "sender_invoice_no": body.get("sender_invoice_no"),
+            "checks": 0,
+            "forced": None,
+        }
+        self.stats["invoice.200"] += 1
+        return web.json_response({
+            "invoice_id": invoice_id,
+            "qr_text": f"SIMQR{invoice_id}",
+            "qr_image": "",
+            "qPay_shortUrl": f"https://s.qpay.mn/sim/{invoice_id}",
+            "urls": [],
+        })
+
+    def _state(self, invoice) -> str:
+        if invoice["forced"]:
+            return invoice["forced"]
+        script = self.config.script
+        state = script[min(invoice["checks"], len(script) - 1)]
+        invoice["checks"] += 1
+        return state
+
+    async def check_payment(self, request):
+        error = await self._inject("payment/check")
+        if error is not None:
+            return error
+        try:
+            body = await request.json()
+        except Exception:
+            body = {}
+        invoice = self.invoices.get(body.get("object_id"))
+        self.stats["payment/check.200"] += 1
+        if invoice is None:
+            return web.json_response({"count": 0, "paid_amount": 0, "rows": []})
+
+        state = self._state(invoice)
+        if state == "PENDING":
+            # Real QPay lists no payment rows until the customer has paid
+            return web.json_response({"count": 0, "paid_amount": 0, "rows": []})
+        paid = invoice["amount"] if state == "PAID" else 0
+        return web.json_response({
+            "count": 1,
+            "paid_amount": paid,
+            "rows": [{
+                "payment_id": f"PAY_{body.get('object_id')}",
+                "payment_status": state,
+                "payment_amount": invoice["amount"],
+                "payment_currency": "MNT",
+                "payment_date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }],
+        })
+
+    # ---------- control endpoints ----------
+    async def force_state(self, request):
+        invoice = self.invoices.get(request.match_info["invoice_id"])
+        if invoice is None:
+            return web.json_response({"error": "not found"}, status=404)
+        body = await request.json()
+        invoice["forced"] = str(body.get("status", "PAID")).upper()
+        return web.json_response({"invoice_id": request.match_info["invoice_id"], "status": invoice["forced"]})
+
+    async def get_stats(self, request):
+        return web.json_response({"invoices": len(self.invoices), **self.stats})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v2/auth/token", self.auth_token)
+        app.router.add_post("/v2/invoice", self.create_invoice)
+        app.router.add_post("/v2/payment/check", self.check_payment)
+        app.router.add_post("/_sim/invoices/{invoice_id}", self.force_state)
+        app.router.add_get("/_sim/stats", self.get_stats)
+        return app
+
+
+def start_in_thread(config: SimulatorConfig = None, host: str = "127.0.0.1", port: int = 0):
+    """Run a simulator on its own thread and event loop; returns (simulator, base_url).
+
+    utils.qpay is synchronous, so a simulator sharing the caller's event loop
+    could never answer while a request is blocking it.
+    """
+    sim = QPaySimulator(config)
+    ready = threading.Event()
+    state = {}
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(sim.app(), access_log=None)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, host, port)
+        loop.run_until_complete(site.start())
+        state["url"] = f"http://{host}:{site._server.sockets[0].getsockname()[1]}"
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, name="qpay-simulator", daemon=True).start()
+    ready.wait()
+    return sim, state["url"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 5xx")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="max requests/second, 0 = unlimited")
+    parser.add_argument("--script", default="PAID", help='payment states per check, e.g. "PENDING*2,PAID"')
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    config = SimulatorConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate,
+                             args.rate_limit, args.script, args.seed)
+    print(f"🧪 QPay simulator on http://{args.host}:{args.port} (script: {','.join(config.script)})")
+    web.run_app(QPaySimulator(config).app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
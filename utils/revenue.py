@@ -0,0 +1,109 @@
+"""Revenue engine: MRR, rolling averages, week-over-week change and a trend forecast.
+
+Daily revenue for every guild is loaded into one (guilds x days) array, so the
+weekly report computes all guilds in a single vectorized pass instead of a query
+and a Python loop per guild.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database import get_daily_revenue, get_active_plan_members
+
+HISTORY_DAYS = 90
+FORECAST_DAYS = 30
+# MRR is a 30-day month, like the rest of /growth
+MONTH_DAYS = 30
+
+
+def _daily_matrix(rows, index: dict, start, days: int) -> np.ndarray:
+    """(guild_id, day, revenue) rows -> float array [guild, day offset from start]"""
+    matrix = np.zeros((len(index), days))
+    rows = [r for r in rows if r[0] in index]
+    if rows:
+        g = np.fromiter((index[r[0]] for r in rows), dtype=np.intp, count=len(rows))
+        d = (np.array([r[1] for r in rows], dtype="datetime64[D]") - np.datetime64(start, "D")).astype(np.intp)
+        revenue = np.fromiter((r[2] or 0 for r in rows), dtype=float, count=len(rows))
+        keep = (d >= 0) & (d < days)
+        np.add.at(matrix, (g[keep], d[keep]), revenue[keep])
+    return matrix
+
+
+def _mrr(rows, index: dict) -> np.ndarray:
+    """(guild_id, price_mnt, duration_days, members) rows -> MRR per guild"""
+    rows = [r for r in rows if r[0] in index and r[2]]
+    if not rows:
+        return np.zeros(len(index))
+    g = np.fromiter((index[r[0]] for r in rows), dtype=np.intp, count=len(rows))
+    plans = np.array([r[1:] for r in rows], dtype=float)
+    monthly = plans[:, 0] / plans[:, 1] * MONTH_DAYS * plans[:, 2]
+    return np.bincount(g, weights=monthly, minlength=len(index))
+
+
+def compute(matrix: np.ndarray, mrr: np.ndarray, forecast_days: int = FORECAST_DAYS) -> dict:
+    """All metrics for every row of matrix (the last column is the latest day) at once"""
+    guilds, days = matrix.shape
+    csum = np.concatenate([np.zeros((guilds, 1)), np.cumsum(matrix, axis=1)], axis=1)
+
+    def window(end_ago, length):
+        # Sum of the `length` days ending `end_ago` days before the last one
+        end = days - end_ago
+        return csum[:, end] - csum[:, max(end - length, 0)]
+
+    last_7, prev_7 = window(0, 7), window(7, 7)
+    last_30 = window(0, 30)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wow = np.where(prev_7 > 0, (last_7 - prev_7) / prev_7 * 100, np.nan)
+
+    # Least-squares line through every guild's history, then summed over the next days
+    x = np.arange(days, dtype=float)
+    xc = x - x.mean()
+    slope = (matrix - matrix.mean(axis=1, keepdims=True)) @ xc / (xc @ xc)
+    intercept = matrix.mean(axis=1) - slope * x.mean()
+    future = np.arange(days, days + forecast_days, dtype=float)
+    forecast = np.clip(intercept[:, None] + slope[:, None] * future, 0, None).sum(axis=1)
+
+    return {
+        "mrr": mrr,
+        "avg_7": last_7 / 7,
+        "avg_30": last_30 / 30,
+        "last_7": last_7,
+        "prev_7": prev_7,
+        "wow_percent": wow,
+        "trend_per_day": slope,
+        "forecast": forecast,
+    }
+
+
+def revenue_forecasts(guild_ids, history_days: int = HISTORY_DAYS) -> dict:
+    """{guild_id: metrics} for the given guilds. Blocking; run it in a thread from async code.
+
+    Only these guilds are read (guild_id IN (...), chunked), so a shard's weekly
+    report run never loads other shards' revenue.
+    """
+    guild_ids = [str(g) for g in guild_ids]
+    if not guild_ids:
+        return {}
+    index = {g: i for i, g in enumerate(guild_ids)}
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=history_days - 1)
+
+    matrix = _daily_matrix(get_daily_revenue(start.isoformat(), guild_ids), index, start, history_days)
+    metrics = compute(matrix, _mrr(get_active_plan_members(guild_ids), index))
+    return {
+        g: {name: (None if np.isnan(values[i]) else float(values[i])) for name, values in metrics.items()}
+        for g, i in index.items()
+    }
+
+
+def format_forecast(stats: dict) -> str:
+    """Embed field text for one guild's metrics"""
+    if stats["wow_percent"] is None:
+        wow = "new" if stats["last_7"] > 0 else "—"
+    else:
+        wow = f"{stats['wow_percent']:+.1f}%"
+    trend = "📈" if stats["trend_per_day"] > 0 else "📉" if stats["trend_per_day"] < 0 else "➖"
+    return (f"MRR: **{stats['mrr']:,.0f}₮**\n"
+            f"Daily avg: {stats['avg_7']:,.0f}₮ (7d) • {stats['avg_30']:,.0f}₮ (30d)\n"
+            f"Week over week: {wow}\n"
+            f"{trend} Next {FORECAST_DAYS}d forecast: ~{stats['forecast']:,.0f}₮")
@@ -0,0 +1,63 @@
+import os
+
+
+def _parse_shard_ids(raw: str):
+    """Parse SHARD_IDS like "0,1,2" or "0-3" (or a mix: "0-3,8") into a sorted list"""
+    ids = set()
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            ids.update(range(int(start), int(end) + 1))
+        else:
+            ids.add(int(part))
+    return sorted(ids)
+
+
+def get_shard_config():
+    """Read shard settings from the environment.
+
+    SHARD_COUNT - total shards across ALL processes (unset = let Discord recommend)
+    SHARD_IDS   - shards owned by THIS process, e.g. "0-3" (unset = all shards)
+
+    Returns (shard_count, shard_ids) - either value may be None.
+    """
+    count_raw = os.getenv("SHARD_COUNT")
+    ids_raw = os.getenv("SHARD_IDS")
+
+    shard_count = int(count_raw) if count_raw else None
+    shard_ids = _parse_shard_ids(ids_raw) if ids_raw else None
+
+    if shard_ids is not None and shard_count is None:
+        raise RuntimeError("SHARD_IDS requires SHARD_COUNT to be set as well.")
+    if shard_ids is not None and any(s >= shard_count for s in shard_ids):
+        raise RuntimeError(f"SHARD_IDS {shard_ids} out of range for SHARD_COUNT={shard_count}.")
+
+    return shard_count, shard_ids
+
+
+def shard_for_guild(guild_id, shard_count: int) -> int:
+    """Discord's sharding formula: (guild_id >> 22) % shard_count"""
+    return (int(guild_id) >> 22) % shard_count
+
+
+def owns_guild(bot, guild_id) -> bool:
+    """True if this process's shards are responsible for guild_id.
+
+    Works for guilds the bot is no longer in (e.g. stale subscription rows),
+    so only one process ever handles a given guild.
+    """
+    shard_count = getattr(bot, "shard_count", None) or 1
+    if shard_count == 1:
+        return True
+    shard_ids = getattr(bot, "shard_ids", None)
+    if shard_ids is None:
+        return True  # AutoShardedBot running every shard in this process
+    return shard_for_guild(guild_id, shard_count) in shard_ids
+
+
+def owned_guild_ids(bot):
+    """Guild IDs (as str, like the DB stores them) handled by this process's shards"""
+    return [str(g.id) for g in bot.guilds if owns_guild(bot, g.id)]
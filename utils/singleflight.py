@@ -0,0 +1,30 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class KeyedLock:
+    """One asyncio.Lock per key, dropped again once nobody holds or waits for it.
+
+    Used so concurrent clicks for the same (guild, user, plan) run one at a time:
+    the second click waits for the first and then sees the invoice it created.
+    """
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, users]
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from database import get_meta, set_meta
+
+# Set FORCE_COMMAND_SYNC=1 to push the command tree even if it looks unchanged
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "0") == "1"
+
+
+def command_tree_hash(tree) -> str:
+    """Stable hash of the global slash command payload (what tree.sync() would upload)"""
+    payload = [cmd.to_dict(tree) for cmd in tree.get_commands()]
+    payload.sort(key=lambda cmd: (cmd.get("type", 1), cmd["name"]))
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def _meta_key(bot) -> str:
+    return f"command_tree_hash:{bot.application_id}"
+
+
+def remember_synced_tree(bot):
+    """Record the tree that was just synced (also used by the owner /sync command)"""
+    set_meta(_meta_key(bot), command_tree_hash(bot.tree))
+
+
+async def sync_commands_if_changed(bot) -> bool:
+    """Run tree.sync() only when command definitions changed since the last sync.
+
+    Global syncs are slow and rate-limited, and Discord keeps the commands between
+    restarts, so a restart with identical commands doesn't need one.
+    Returns True if a sync was performed.
+    """
+    current = command_tree_hash(bot.tree)
+    if not FORCE_COMMAND_SYNC and get_meta(_meta_key(bot)) == current:
+        return False
+    await bot.tree.sync()
+    set_meta(_meta_key(bot), current)
+    return True
+
+
+def profile_imports(modules, top: int = 10, timeout: int = 60):
+    """Import `modules` in a fresh interpreter under `python -X importtime`.
+
+    Returns (total_ms, [(name, cumulative_ms), ...]) with one row per requested
+    module and per top-level package (discord, openai, ...), slowest first -
+    the packages worth deferring with utils.lazy.lazy_import.
+    """
+    # A cog that fails to import (e.g. missing env var) shouldn't hide the rest
+    code = (f"import importlib\nfor m in {list(modules)!r}:\n"
+            "    try: importlib.import_module(m)\n"
+            "    except Exception: pass")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, timeout=timeout,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    total = 0.0
+    costs = {}
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        raw_name = parts[2].rstrip()
+        name = raw_name.strip()
+        ms = int(parts[1]) / 1000
+        if len(raw_name) - len(raw_name.lstrip()) <= 1:
+            total += ms  # top-level entries add up to the whole import
+        key = name if name in modules else name.split(".")[0]
+        # The outermost import of a package carries its full cumulative cost
+        costs[key] = max(costs.get(key, 0.0), ms)
+    rows = sorted(costs.items(), key=lambda r: r[1], reverse=True)
+    return total, rows[:top]